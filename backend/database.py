@@ -1,30 +1,175 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from fastapi import Depends
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager, contextmanager
+import anyio
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Geliştirme kolaylığı için SQLite kullanalım. 
+# Geliştirme kolaylığı için SQLite kullanalım.
 # Eğer .env içinde başka bir URL tanımlıysa o kullanılır (Örn: PostgreSQL)
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
 os.makedirs(DATA_DIR, exist_ok=True)
 db_path = os.path.join(DATA_DIR, 'sql_app.db')
 DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{db_path}")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
 
-# SQLite için check_same_thread=False gereklidir
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(DATABASE_URL)
+# --- SQLITE ÜRETİM PROFİLİ ---
+# SQLITE_TUNED=0 ile eski (varsayılan pragma'lı) davranışa dönülür
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "1") != "0"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # negatif: KiB (64 MB)
+
+
+def apply_sqlite_pragmas(dbapi_conn, connection_record=None):
+    """
+    Her yeni bağlantıda çalışır. WAL ile okuyucular yazarı beklemez; synchronous=NORMAL WAL'da
+    commit başına fsync yerine checkpoint'te fsync yapar (elektrik kesintisinde son commit'ler
+    kaybolabilir ama veritabanı bozulmaz). busy_timeout başka süreçlerin kilidinde hemen
+    "database is locked" yerine bekletir.
+    """
+    cur = dbapi_conn.cursor()
+    try:
+        # :memory: veritabanında WAL yok sayılır ("memory" döner), sorun değil
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cur.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cur.close()
+
+
+def _autocommit_driver(dbapi_conn, connection_record=None):
+    # pysqlite kendi BEGIN'ini sadece DML'den önce verir, SAVEPOINT'ten önce hiç vermez: savepoint'li
+    # transaction'larda her RELEASE ayrı commit olur. Sürücünün transaction yönetimi kapatılır,
+    # BEGIN'i SQLAlchemy verir (SQLAlchemy'nin pysqlite tarifi).
+    dbapi_conn.isolation_level = None
+
+
+def _explicit_begin(conn):
+    # Yazan oturumlar (begin_write) yazma kilidini en başta ister: kilit başka süreçteyse busy_timeout
+    # kadar bekler. Okumayla başlayıp yazmaya yükselen transaction ise beklemeden SQLITE_BUSY alır.
+    conn.exec_driver_sql("BEGIN IMMEDIATE" if conn.get_execution_options().get("sqlite_write") else "BEGIN")
+
+
+def begin_write(db):
+    """Oturumun sıradaki transaction'ını yazma niyetiyle açar (SQLite'ta BEGIN IMMEDIATE, diğerlerinde etkisiz)"""
+    db.connection(execution_options={"sqlite_write": True})
+
+
+def make_engine(url: str = DATABASE_URL, tuned: bool = SQLITE_TUNED, **kwargs):
+    # SQLite için check_same_thread=False gereklidir
+    if not url.startswith("sqlite"):
+        return create_engine(url, **kwargs)
+    eng = create_engine(url, connect_args={"check_same_thread": False}, **kwargs)
+    event.listen(eng, "connect", _autocommit_driver)
+    event.listen(eng, "begin", _explicit_begin)
+    if tuned:
+        event.listen(eng, "connect", apply_sqlite_pragmas)
+    return eng
+
+
+engine = make_engine()
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+
+# --- ASYNC MOTOR ---
+# async endpoint'ler sorgu beklerken event loop'u bloklamasın diye aynı veritabanına async sürücüyle bağlanılır
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
+
+
+def async_url(url: str = DATABASE_URL) -> str:
+    scheme, rest = url.split("://", 1)
+    if "+" in scheme:
+        scheme = scheme.split("+", 1)[0]
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+def make_async_engine(url: str = DATABASE_URL, tuned: bool = SQLITE_TUNED, **kwargs):
+    eng = create_async_engine(async_url(url), **kwargs)
+    if url.startswith("sqlite") and tuned:
+        # Pragma'lar senkron motordakiyle aynı; aiosqlite bağlantısı DB-API arayüzünü taklit eder
+        event.listen(eng.sync_engine, "connect", apply_sqlite_pragmas)
+    return eng
+
+
+async_engine = make_async_engine()
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
+# --- TEK YAZAR KUYRUĞU ---
+# SQLite aynı anda tek yazara izin verir. Yazarlar transaction'ı begin_write ile (BEGIN IMMEDIATE) açar:
+# kilit başka bağlantıdaysa (aynı süreçte veya başka bir worker/CLI'da) busy_timeout kadar sırasını bekler.
+# Okuyucular WAL sayesinde hiç beklemez. PostgreSQL'de satır kilitleri yeterli, kuyruklar devre dışıdır.
+#
+# İstek yazarları ayrıca event loop üzerinde sıraya girer (async kilit): bekleyen istek thread havuzundan
+# işçi tutmaz. Havuzdaki thread'lerde kilit beklemek, havuz dolunca kilit sahibinin endpoint'ini
+# çalıştıracak thread bırakmaz ve sunucu kilitlenirdi.
+_request_lock = anyio.Lock() if IS_SQLITE else None
+# Arka plan yazarları (fiyat geçmişi, toplu commit thread'i, CLI aktarımı) kendi aralarında thread kilidiyle sıralanır
+_write_lock = threading.Lock() if IS_SQLITE else None
+
+
+@asynccontextmanager
+async def request_write_lock():
+    """İstek yazarlarının kuyruğu; beklerken thread tutmaz (async endpoint'lerden ve bağımlılıklardan kullanılır)"""
+    if _request_lock is None:
+        yield
+        return
+    async with _request_lock:
+        yield
+
+
+@contextmanager
+def write_lock():
+    """Arka plan yazarları (fiyat geçmişi vb.) için thread kilidi; transaction yine begin_write ile açılır"""
+    if _write_lock is None:
+        yield
+        return
+    with _write_lock:
+        yield
+
+
 # Dependency
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """async endpoint'lerin bağımlılığı; sorgular `await db.execute(select(...))` ile yazılır"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+@asynccontextmanager
+async def writing(db):
+    """Oturumu istek yazarları kuyruğunda tutar; transaction kuyruk bırakılmadan kapanır"""
+    async with request_write_lock():
+        try:
+            await run_in_threadpool(begin_write, db)
+            yield db
+        finally:
+            # Açık kalan transaction kuyruk bırakılmadan kapatılır (istek iptal edilse bile)
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(db.rollback)
+
+
+async def get_write_db(db=Depends(get_db)):
+    """Yazan endpoint'lerin bağımlılığı: oturum kapanana kadar istek yazarları kuyruğunu tutar"""
+    async with writing(db):
+        yield db
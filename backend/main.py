@@ -1,29 +1,61 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Response, Query, Request, Header
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import func, or_, and_, select
 from typing import List, Optional
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 import sys
 import os
 import hashlib
+import base64
+import asyncio
+import tempfile
+import httpx
 
 
 # Paket yapısını desteklemek için dizin ayarı
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
-    from backend.database import Base, engine, get_db, SessionLocal
+    from backend.database import Base, engine, async_engine, get_db, get_async_db, get_write_db, write_lock, request_write_lock, writing, begin_write, SessionLocal
     from backend import models, schemas
-    from backend.services.prices import fetch_prices_async
+    from backend.services.prices import fetch_prices_async, get_price_snapshot
+    from backend.services import prices as price_service
+    from backend.services import pricing
+    from backend.services import history
+    from backend.services import rollup, shopday, pnl, inventory, versions, export, importer, ledger, groupcommit, search
+    from backend.services.atomic import get_or_create
+    from backend.services.events import bus, format_sse
+    from backend.services.poller import PricePoller
 except ImportError:
-    from database import Base, engine, get_db, SessionLocal
+    from database import Base, engine, async_engine, get_db, get_async_db, get_write_db, write_lock, request_write_lock, writing, begin_write, SessionLocal
     import models, schemas
-    from services.prices import fetch_prices_async
+    from services.prices import fetch_prices_async, get_price_snapshot
+    from services import prices as price_service
+    from services import pricing
+    from services import history
+    from services import rollup, shopday, pnl, inventory, versions, export, importer, ledger, groupcommit, search
+    from services.atomic import get_or_create
+    from services.events import bus, format_sse
+    from services.poller import PricePoller
 
 
 # --- LICENSE SETTINGS ---
 LICENSE_TIER = "NORMAL"
 
+# --- EVENTS (TERMİNALLERE ANLIK YAYIN) ---
+STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))
+
+def publish_prices(snap):
+    bus.publish("prices", snap.as_dict())
+
+def notify_change(kind: str, **data):
+    """Kasa/işlem/ayar değişikliğini terminallere duyurur (yenileme sadece gerektiğinde yapılır)"""
+    bus.publish(kind, data)
+
 # --- MIDDLEWARE / UTILS ---
 def check_premium():
     if LICENSE_TIER != "PREMIUM":
@@ -69,15 +101,93 @@ def refresh_license_tier():
     finally:
         db.close()
 
+def take_ledger_snapshot():
+    db = SessionLocal()
+    try:
+        with write_lock():
+            try:
+                begin_write(db)
+                ledger.snapshot(db)
+            finally:
+                # Transaction kilit bırakılmadan kapanır (sıradaki yazar SQLITE_BUSY almaz)
+                db.close()
+    except Exception as e:
+        print(f"Ledger snapshot error: {e}")
+
+async def ledger_snapshot_loop():
+    """Defter snapshot'ları aralıklarla alınır; geçmiş bakiye sorgusu en fazla bir aralığın kayıtlarını toplar"""
+    while True:
+        await asyncio.sleep(ledger.SNAPSHOT_INTERVAL)
+        await asyncio.to_thread(take_ledger_snapshot)
+
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    poller = None
+    snapshots = None
     # Test ortamında gerçek DB'yi init etme (Deadlock'ı önle)
     if not os.getenv("TESTING"):
         Base.metadata.create_all(bind=engine)
         refresh_license_tier()
+        # Sonradan eklenen indeksler mevcut tablolarda da oluşturulur
+        for table in (models.Transaction.__table__, models.Price.__table__):
+            for idx in table.indexes:
+                try:
+                    idx.create(bind=engine, checkfirst=True)
+                except Exception as e:
+                    # Örn. kolon henüz eklenmemiş eski veritabanı: fix_db.py çalıştırılmalı
+                    print(f"Index {idx.name} could not be created: {e}")
+        # Müşteri arama indeksi (FTS5 / pg_trgm); eski kayıtların arama anahtarları doldurulur
+        try:
+            print(f"Customer search: {search.setup(engine)}")
+        except Exception as e:
+            # Örn. search_key kolonu henüz eklenmemiş eski veritabanı: fix_db.py çalıştırılmalı
+            print(f"Customer search index could not be prepared: {e}")
+        db = SessionLocal()
+        try:
+            # Altın ürünlerinin fiyatlama tablosu (has gram, saflık, makas) DB'den okunur
+            pricing.load_table(db)
+            # Türetilmiş tablolar boşsa (ilk kurulum / eski veritabanı) geçmişten üretilir
+            if db.query(models.Transaction.id).first():
+                if not db.query(models.DailyRollup.id).first():
+                    rollup.rebuild(db)
+                if not db.query(models.Position.id).first():
+                    pnl.rebuild_positions(db)
+            if db.query(models.Product.id).first() and not db.query(models.InventoryAggregate.id).first():
+                inventory.rebuild(db)
+            # Defterden önceki bakiyeler açılış kaydı olarak deftere alınır
+            if ledger.bootstrap(db):
+                ledger.snapshot(db)
+        finally:
+            db.close()
+        # TCMB kesintisinde son iyi fiyatlar configs tablosundan sunulur
+        price_service.configure_store(SessionLocal)
+        # Her yeni fiyat snapshot'ı geçmiş tablosuna ve OHLC özetlerine yazılır
+        history.configure(SessionLocal)
+        price_service.add_listener(history.on_snapshot)
+        # Yeni fiyatlar bağlı tüm terminallere anında iletilir
+        price_service.add_listener(publish_prices)
+        # TCMB bağlantısı uygulama boyunca açık tutulur (DNS/TCP/TLS tekrarlanmaz)
+        await price_service.open_client()
+        # Fiyatlar arka planda çekilir, istekler hazır snapshot'ı okur
+        if os.getenv("PRICE_POLL_ENABLED", "1") != "0":
+            poller = PricePoller()
+            poller.start()
+        snapshots = asyncio.create_task(ledger_snapshot_loop())
+        if groupcommit.GROUP_COMMIT:
+            start_group_commit()
     yield
+    stop_group_commit()
+    if snapshots:
+        snapshots.cancel()
+    if poller:
+        poller.shutdown()
+    # Kuyrukta kalan fiyat geçmişi ve son iyi fiyat yazımları kapanmadan tamamlanır
+    history.flush(5)
+    price_service.flush_store(5)
+    await price_service.close_client()
+    await async_engine.dispose()
 
 app = FastAPI(title="Kuyumcu Pro Personalized AI", version="8.3.0", lifespan=lifespan)
 
@@ -87,7 +197,7 @@ def get_tier():
     return {"tier": LICENSE_TIER}
 
 @app.post("/system/activate")
-def activate_system(req: schemas.ActivationRequest, db: Session = Depends(get_db)):
+def activate_system(req: schemas.ActivationRequest, db: Session = Depends(get_write_db)):
     global LICENSE_TIER
     import requests
     # WEB SUNUCUSUNA (localhost:8080) SORUYORUZ
@@ -133,39 +243,45 @@ def activate_system(req: schemas.ActivationRequest, db: Session = Depends(get_db
         raise HTTPException(status_code=500, detail=f"Lisans sunucusuna bağlanılamadı: {e}")
 
 @app.post("/system/sync")
-async def cloud_sync(premium: bool = Depends(check_premium), db: Session = Depends(get_db)):
+async def cloud_sync(premium: bool = Depends(check_premium), db: AsyncSession = Depends(get_async_db)):
     """Dükkan verilerini Bulut (Web) sunucusuna gönderir"""
-    key_cfg = db.query(models.Config).filter(models.Config.key == "license_key").first()
+    key_cfg = await db.scalar(select(models.Config).where(models.Config.key == "license_key"))
     if not key_cfg:
         raise HTTPException(status_code=403, detail="Lisans anahtarı bulunamadı.")
     
     # Kasa ve Rapor verilerini topla (Aynı dosyadaki fonksiyonları çağırıyoruz)
     kasa = await get_kasa(db)
-    daily = await get_daily(db)
+    daily = await db.run_sync(rollup.day_summary, shopday.today(), await fetch_prices_async())
     
     payload = {
         "kasa": kasa,
         "daily_profit": daily["profit"],
-        "tx_count": len(daily["transactions"])
+        "tx_count": daily["tx_count"]
     }
     
-    import requests
+    # Async istemci: web merkezi yavaşsa bile bekleme event loop'u (diğer istekleri) durdurmaz
     try:
-        r = requests.post(f"http://127.0.0.1:8080/api/sync/report?key={key_cfg.value}", json=payload, timeout=5)
+        async with httpx.AsyncClient(timeout=5) as client:
+            r = await client.post(f"http://127.0.0.1:8080/api/sync/report?key={key_cfg.value}", json=payload)
         if r.status_code == 200:
             return r.json()
         else:
             raise HTTPException(status_code=r.status_code, detail="Web merkezi hata döndürdü.")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Web merkezine ulaşılamadı (8080 kapalı olabilir): {e}")
 
 # --- SETTINGS / MARGINS ---
 @app.get("/settings/margins")
-def get_margins(db: Session = Depends(get_db)):
+def get_margins(request: Request, response: Response, db: Session = Depends(get_db)):
+    cached = not_modified(request, response, db, ["margins"])
+    if cached is not None:
+        return cached
     return db.query(models.Margin).all()
 
 @app.post("/settings/margins")
-def update_margin(symbol: str, buy_margin: float, sell_margin: float, db: Session = Depends(get_db)):
+def update_margin(symbol: str, buy_margin: float, sell_margin: float, db: Session = Depends(get_write_db)):
     db_m = db.query(models.Margin).filter(models.Margin.symbol == symbol).first()
     if not db_m:
         db_m = models.Margin(symbol=symbol)
@@ -173,36 +289,98 @@ def update_margin(symbol: str, buy_margin: float, sell_margin: float, db: Sessio
     db_m.buy_margin = buy_margin
     db_m.sell_margin = sell_margin
     db.commit()
+    notify_change("margins", symbol=symbol)
     return {"status": "ok"}
 
+@app.post("/settings/ons")
+def update_ons(ons_usd: float, db: Session = Depends(get_write_db)):
+    """Altın fiyatlarının dayandığı ons (USD) fiyatını günceller"""
+    if ons_usd <= 0:
+        raise HTTPException(status_code=400, detail="Ons fiyatı sıfırdan büyük olmalı.")
+    cfg = db.query(models.Config).filter(models.Config.key == pricing.ONS_CONFIG_KEY).first()
+    if not cfg:
+        cfg = models.Config(key=pricing.ONS_CONFIG_KEY)
+        db.add(cfg)
+    cfg.value = str(ons_usd)
+    db.commit()
+    pricing.set_ons_usd(ons_usd)
+    price_service.reprice()
+    return {"status": "ok", "ons_usd": ons_usd}
+
+# --- INSTRUMENTS (ALTIN ÜRÜN TABLOSU) ---
+@app.get("/instruments", response_model=List[schemas.InstrumentOut])
+def list_instruments(db: Session = Depends(get_db)):
+    return db.query(models.Instrument).order_by(models.Instrument.symbol).all()
+
+@app.post("/instruments", response_model=schemas.InstrumentOut)
+def upsert_instrument(ins: schemas.InstrumentCreate, db: Session = Depends(get_write_db)):
+    """Yeni ziynet/ayar ürünü ekler veya makasını günceller; kod değişikliği gerekmez"""
+    db_i = db.query(models.Instrument).filter(models.Instrument.symbol == ins.symbol).first()
+    if not db_i:
+        db_i = models.Instrument(symbol=ins.symbol)
+        db.add(db_i)
+    for k, v in ins.model_dump().items():
+        setattr(db_i, k, v)
+    db.commit()
+    db.refresh(db_i)
+    pricing.load_table(db)
+    price_service.reprice()
+    return db_i
+
 # --- VAULT / STOCK MANAGEMENT ---
 @app.get("/vault")
-def get_vault(db: Session = Depends(get_db)):
+def get_vault(request: Request, response: Response, db: Session = Depends(get_db)):
     """Dükkanın net varlıklarını döner"""
+    cached = not_modified(request, response, db, ["vault"])
+    if cached is not None:
+        return cached
     return db.query(models.Vault).all()
 
 @app.post("/vault/update")
-def update_vault(symbol: str, amount: float, db: Session = Depends(get_db)):
+def update_vault(symbol: str, amount: float, db: Session = Depends(get_write_db)):
     """Açılış stoğu veya sayım düzeltmesi için dükkan varlığını günceller"""
     allowed = ["TRY", "USD", "EUR", "GA", "C22", "CEYREK", "YARIM", "TAM", "ATA"]
     if symbol not in allowed:
         raise HTTPException(status_code=400, detail=f"Geçersiz sembol: {symbol}")
 
-    v = db.query(models.Vault).filter(models.Vault.symbol == symbol).first()
-    if not v:
-        v = models.Vault(symbol=symbol, balance=0.0)
-        db.add(v)
-    v.balance = (v.balance or 0.0) + amount
+    v = get_or_create(db, models.Vault, {"symbol": symbol}, balance=0.0)
+    ledger.vault(db, v, amount, source="vault_update")
     db.commit()
+    notify_change("vault", symbol=symbol)
     return {"status": "ok", "new_balance": v.balance}
 
 
 # --- PRICE ENGINE ---
+def not_modified(request: Request, response: Response, db: Session, tables, *extra) -> Optional[Response]:
+    """
+    Veri sürümünden ETag üretir; istemcinin elindeki sürüm güncelse gövdesiz 304 döner.
+    Sorgu parametreleri de etikete girer: başka filtreyle alınmış etiket bu yanıt için geçerli sayılmaz.
+    Parametreleri doğrulayan endpoint'ler bunu doğrulamadan sonra çağırır (hatalı istek 304 değil 400 almalı).
+    """
+    query = sorted(request.query_params.multi_items())
+    if query:
+        extra += (hashlib.sha1(repr(query).encode()).hexdigest()[:12],)
+    tag = versions.etag(db, tables, *extra)
+    headers = {"ETag": tag, "Cache-Control": "no-cache"}
+    if tag in (t.strip() for t in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+def set_price_headers(response: Response, snap):
+    """Fiyat snapshot'ının ne kadar eski olduğunu istemciye bildirir"""
+    response.headers["Age"] = str(int(snap.age))
+    response.headers["X-Prices-Fetched-At"] = snap.fetched_at.isoformat()
+    response.headers["X-Prices-Source"] = snap.source
+    response.headers["X-Prices-Stale"] = "1" if snap.stale else "0"
+
 @app.get("/prices/smart")
-async def get_smart_prices(db: Session = Depends(get_db)):
+async def get_smart_prices(response: Response, db: AsyncSession = Depends(get_async_db)):
     try:
-        live = await fetch_prices_async()
-        margins = {m.symbol: m for m in db.query(models.Margin).all()}
+        snap = await get_price_snapshot()
+        set_price_headers(response, snap)
+        live = snap.prices
+        margins = {m.symbol: m for m in await db.scalars(select(models.Margin))}
         res = {}
         for sym in live.keys():
             d = live.get(sym, {"buy": 0, "sell": 0})
@@ -218,13 +396,13 @@ async def get_smart_prices(db: Session = Depends(get_db)):
 
 # --- AI ENGINE ---
 @app.get("/ai/suggestions")
-async def get_ai_suggestions(premium: bool = Depends(check_premium), db: Session = Depends(get_db)):
+async def get_ai_suggestions(premium: bool = Depends(check_premium), db: AsyncSession = Depends(get_async_db)):
     """Kullanıcının SON 15 işlemini analiz ederek alışkanlığını yakalar (Stabil Versiyon)"""
     try:
         live = await fetch_prices_async()
         # Hafızayı tekrar 15 işleme çıkardık
-        txs = db.query(models.Transaction).order_by(models.Transaction.ts.desc()).limit(15).all()
-        margins = {m.symbol: m for m in db.query(models.Margin).all()}
+        txs = (await db.scalars(select(models.Transaction).order_by(models.Transaction.ts.desc()).limit(15))).all()
+        margins = {m.symbol: m for m in await db.scalars(select(models.Margin))}
         
         stats = {}
         for tx in txs:
@@ -258,25 +436,27 @@ async def get_ai_suggestions(premium: bool = Depends(check_premium), db: Session
         return []
 
 # --- TRANSACTIONS ---
-@app.post("/transactions")
-def add_tx(tx: schemas.TransactionCreate, db: Session = Depends(get_db)):
+def _apply_tx(db: Session, tx: schemas.TransactionCreate, idempotency_key: Optional[str] = None) -> models.Transaction:
+    """İşlemi kaydeder, kasa/stok/cari ve özet tablolarını günceller. Commit çağıranındır."""
+    # Aynı transaction'daki önceki kalemlerin kasa satırları sorgularda görünsün
+    db.flush()
     # İşlemi kaydet
-    ntx = models.Transaction(**tx.model_dump(), ts=datetime.now())
+    ntx = models.Transaction(**tx.model_dump(), ts=datetime.now(), idempotency_key=idempotency_key)
     db.add(ntx)
     
     # KASAYI GÜNCELLE (Vault)
     # TL Kasası (TRY)
-    try_v = db.query(models.Vault).filter(models.Vault.symbol == "TRY").first()
-    if not try_v: try_v = models.Vault(symbol="TRY", balance=0.0); db.add(try_v)
+    try_v = get_or_create(db, models.Vault, {"symbol": "TRY"}, balance=0.0)
     
     # 2. Ürün Stoğunu Güncelle (Eğer ürün seçildiyse)
     if tx.product_id:
         prod = db.get(models.Product, tx.product_id)
-        if prod:
-            if tx.side == "sell":
-                prod.stock_qty -= int(tx.qty)
-            elif tx.side == "buy":
-                prod.stock_qty += int(tx.qty)
+        if prod and tx.side in ("buy", "sell"):
+            delta = int(tx.qty) if tx.side == "buy" else -int(tx.qty)
+            # Stok tek bir koşullu UPDATE ile değişir (eşzamanlı satışlar birbirini ezmez);
+            # kasa değerlemesindeki stok toplamları da aynı transaction'da güncellenir
+            if delta and inventory.move_stock(db, prod, delta) is None:
+                raise HTTPException(status_code=409, detail=f"Stokta yeterli ürün yok: {prod.name} ({prod.stock_qty} adet)")
 
 
 
@@ -292,59 +472,228 @@ def add_tx(tx: schemas.TransactionCreate, db: Session = Depends(get_db)):
             
             # Altın mı, TL bazlı mı?
             if tx.symbol == "GA":
-                cust.balance_gold += (tx.qty * multiplier)
+                ledger.customer(db, cust, "GA", tx.qty * multiplier, ntx)
             else:
-                cust.balance_try += (tx.total_price * multiplier)
+                ledger.customer(db, cust, "TRY", tx.total_price * multiplier, ntx)
             
             # Ürün dükkandan çıkıyor (veya giriyor), bu yüzden kasa stokları yine güncellenmeli 
             # ancak TL kasasına nakit giriş/çıkış olmaz, sadece stok (altın/ürün vb) güncellenir.
             if tx.symbol and tx.symbol != "ÜRÜN" and tx.symbol != "TRY":
-                sym_v = db.query(models.Vault).filter(models.Vault.symbol == tx.symbol).first()
-                if not sym_v: sym_v = models.Vault(symbol=tx.symbol, balance=0.0); db.add(sym_v)
-                sym_v.balance += (tx.qty * (-multiplier)) # Dükkan: Satışsa eksi, alışsa artı
+                sym_v = get_or_create(db, models.Vault, {"symbol": tx.symbol}, balance=0.0)
+                ledger.vault(db, sym_v, tx.qty * (-multiplier), ntx) # Dükkan: Satışsa eksi, alışsa artı
                 
     # 3B. Nakit İşlem (Peşin/Kredi Kartı - Direk Kasaya İşle)
     else:
         if tx.symbol and tx.symbol != "ÜRÜN":
-            sym_v = db.query(models.Vault).filter(models.Vault.symbol == tx.symbol).first()
-            if not sym_v: sym_v = models.Vault(symbol=tx.symbol, balance=0.0); db.add(sym_v)
+            sym_v = get_or_create(db, models.Vault, {"symbol": tx.symbol}, balance=0.0)
             
             if tx.side == "sell":
-                try_v.balance += tx.total_price
-                sym_v.balance -= tx.qty
+                ledger.vault(db, try_v, tx.total_price, ntx)
+                ledger.vault(db, sym_v, -tx.qty, ntx)
             elif tx.side == "buy":
-                try_v.balance -= tx.total_price
-                sym_v.balance += tx.qty
+                ledger.vault(db, try_v, -tx.total_price, ntx)
+                ledger.vault(db, sym_v, tx.qty, ntx)
         elif tx.symbol == "ÜRÜN" and tx.side == "sell":
-            try_v.balance += tx.total_price
+            ledger.vault(db, try_v, tx.total_price, ntx)
         elif tx.symbol == "ÜRÜN" and tx.side == "buy":
-            try_v.balance -= tx.total_price
+            ledger.vault(db, try_v, -tx.total_price, ntx)
 
-    db.commit()
+    # Günlük özet aynı DB transaction'ında güncellenir
+    rollup.apply(db, ntx)
+    # Ortalama maliyet pozisyonu da aynı transaction'da güncellenir
+    pnl.update_position(db, ntx)
+    return ntx
+
+def _replayed(db: Session, keys: List[str]) -> Optional[List[models.Transaction]]:
+    """Anahtarları daha önce yazılmış işlemleri (tekrar gönderim) sırasıyla döner"""
+    found = {t.idempotency_key: t for t in
+             db.query(models.Transaction).filter(models.Transaction.idempotency_key.in_(keys))}
+    if not found:
+        return None
+    return [found[k] for k in keys if k in found]
+
+# Pozisyon sürüm çakışmasında (başka terminal aynı anda yazdı) işlem bu kadar kez baştan denenir
+TX_RETRIES = int(os.getenv("TX_RETRIES", "5"))
+
+def _conflict() -> HTTPException:
+    # Terminal kuyruğu 5xx'i tekrar gönderir; aynı Idempotency-Key ile çift yazım olmaz
+    return HTTPException(status_code=503, detail="Eşzamanlı güncelleme çakışması, tekrar deneyin",
+                         headers={"Retry-After": "1"})
+
+def _apply_txs(db: Session, items: List[schemas.TransactionCreate], keys: List[Optional[str]]) -> List[models.Transaction]:
+    ntxs = [_apply_tx(db, tx, key) for tx, key in zip(items, keys)]
+    db.flush()
+    return ntxs
+
+def _commit_txs(db: Session, items: List[schemas.TransactionCreate], keys: List[Optional[str]]) -> List[models.Transaction]:
+    """Kalemleri tek DB transaction'ında yazar; iyimser sürüm kontrolü çakışırsa geri alıp yeniden dener"""
+    # Toplu commit açıksa kalemler diğer terminallerin istekleriyle aynı commit'e girer
+    if committer is not None:
+        try:
+            return committer.submit(items, keys)
+        except StaleDataError:
+            raise _conflict()
+    for _ in range(TX_RETRIES):
+        try:
+            ntxs = _apply_txs(db, items, keys)
+            db.commit()
+            return ntxs
+        except StaleDataError:
+            db.rollback()
+            begin_write(db)
+    raise _conflict()
+
+# --- TOPLU COMMIT (GROUP_COMMIT=1) ---
+committer: Optional[groupcommit.GroupCommitter] = None
+
+def start_group_commit(session_factory=SessionLocal) -> groupcommit.GroupCommitter:
+    global committer
+    committer = groupcommit.GroupCommitter(session_factory, _apply_txs, lock=write_lock, begin=begin_write,
+                                           retry_on=(StaleDataError,), retries=TX_RETRIES).start()
+    return committer
+
+def stop_group_commit():
+    global committer
+    if committer is not None:
+        committer.stop()
+        committer = None
+
+async def get_tx_db(db: Session = Depends(get_db)):
+    """İşlem yazan endpoint'lerin oturumu; toplu commit açıkken yazar kuyruğunu committer thread'i tutar"""
+    if committer is not None:
+        yield db
+        return
+    async with writing(db):
+        yield db
+
+@app.post("/transactions")
+def add_tx(tx: schemas.TransactionCreate, idempotency_key: Optional[str] = Header(None),
+           db: Session = Depends(get_tx_db)):
+    # Aynı Idempotency-Key ile tekrar gelen istek yeni işlem yazmaz, ilk kaydı döner
+    if idempotency_key:
+        done = _replayed(db, [idempotency_key])
+        if done:
+            return done[0]
+    try:
+        ntx = _commit_txs(db, [tx], [idempotency_key])[0]
+    except IntegrityError:
+        # Aynı anahtarla eşzamanlı gelen diğer istek önce yazdı
+        db.rollback()
+        done = _replayed(db, [idempotency_key]) if idempotency_key else None
+        if not done:
+            raise
+        return done[0]
+    notify_change("transaction", id=ntx.id, side=ntx.side, symbol=ntx.symbol)
     return ntx
 
+def _batch_result(db: Session, ntxs: List[models.Transaction]):
+    customer_ids = {t.customer_id for t in ntxs if t.customer_id}
+    customers = db.query(models.Customer).filter(models.Customer.id.in_(customer_ids)).all() if customer_ids else []
+    return {
+        "transactions": ntxs,
+        "vault": {v.symbol: v.balance for v in db.query(models.Vault).all()},
+        "customers": [{"id": c.id, "balance_try": c.balance_try, "balance_gold": c.balance_gold} for c in customers],
+    }
+
+@app.post("/transactions/batch")
+def add_tx_batch(batch: schemas.TransactionBatch, idempotency_key: Optional[str] = Header(None),
+                 db: Session = Depends(get_tx_db)):
+    """Terazi sepetini (alış + satış kalemleri) tek DB transaction'ında işler; bir kalem hata verirse hiçbiri yazılmaz"""
+    if not batch.items:
+        raise HTTPException(status_code=400, detail="Sepet boş")
+    # Sepet anahtarından her kalem için ayrı anahtar türetilir
+    keys = [f"{idempotency_key}:{i}" for i in range(len(batch.items))] if idempotency_key else [None] * len(batch.items)
+    if idempotency_key:
+        done = _replayed(db, keys)
+        if done:
+            return _batch_result(db, done)
+    try:
+        ntxs = _commit_txs(db, batch.items, keys)
+    except IntegrityError:
+        db.rollback()
+        done = _replayed(db, keys) if idempotency_key else None
+        if not done:
+            raise
+        return _batch_result(db, done)
+    except Exception:
+        db.rollback()
+        raise
+    notify_change("transaction", ids=[t.id for t in ntxs])
+    return _batch_result(db, ntxs)
+
 
+TX_PAGE_MAX = 1000
+
+def _encode_cursor(t: models.Transaction) -> str:
+    return base64.urlsafe_b64encode(f"{t.ts.isoformat()}|{t.id}".encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        ts, tx_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(ts), int(tx_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Geçersiz sayfa imleci")
 
 @app.get("/transactions")
-def list_tx(db: Session = Depends(get_db)):
-    query = db.query(models.Transaction)
+def list_tx(
+    request: Request,
+    response: Response,
+    limit: int = Query(200, ge=1, le=TX_PAGE_MAX),
+    cursor: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    symbol: Optional[str] = None,
+    side: Optional[str] = None,
+    customer_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    payment_type: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    İşlemler yeniden eskiye, (ts, id) üzerinden sayfalanır. Sonraki sayfanın imleci X-Next-Cursor başlığındadır;
+    OFFSET kullanılmadığı için her sayfa geçmişin uzunluğundan bağımsız olarak indeksten okunur.
+    """
+    T = models.Transaction
+    query = db.query(T)
+    window = None
     
     if LICENSE_TIER == "NORMAL":
         seven_days_ago = datetime.now() - timedelta(days=7)
-        query = query.filter(models.Transaction.ts >= seven_days_ago)
-        
-    return query.order_by(models.Transaction.ts.desc()).all()
+        query = query.filter(T.ts >= seven_days_ago)
+        # 7 günlük pencere kaydıkça liste yazma olmadan da değişir; ETag dakikada bir yenilenir
+        window = seven_days_ago.strftime("%Y%m%d%H%M")
+    
+    if start:
+        query = query.filter(T.ts >= shopday.shop_day_bounds(start)[0])
+    if end:
+        query = query.filter(T.ts < shopday.shop_day_bounds(end)[1])
+    for column, value in ((T.symbol, symbol), (T.side, side), (T.customer_id, customer_id),
+                          (T.product_id, product_id), (T.payment_type, payment_type)):
+        if value is not None:
+            query = query.filter(column == value)
+    if cursor:
+        c_ts, c_id = _decode_cursor(cursor)
+        query = query.filter(or_(T.ts < c_ts, and_(T.ts == c_ts, T.id < c_id)))
+
+    cached = not_modified(request, response, db, ["transactions"], LICENSE_TIER, window)
+    if cached is not None:
+        return cached
+    rows = query.order_by(T.ts.desc(), T.id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1])
+    return rows
 
 # --- REPORTS (MULTİ-CASH VALUATION) ---
 @app.get("/reports/kasa")
-async def get_kasa(db: Session = Depends(get_db)):
+async def get_kasa(db: AsyncSession = Depends(get_async_db)):
     # 1. Kasadaki Hammaddeler (Naklit, USD, Has Altın)
-    v_data = {v.symbol: v.balance for v in db.query(models.Vault).all()}
+    v_data = {v.symbol: v.balance for v in await db.scalars(select(models.Vault))}
     
-    # 2. Stoktaki İşlenmiş Ürünler (Künye, Bilezik vb)
-    products = db.query(models.Product).filter(models.Product.stock_qty > 0).all()
-    total_product_weight = sum(p.weight * p.purity * p.stock_qty for p in products) # Has Altın Karşılığı
-    total_labor_tl = sum(p.labor_cost * p.stock_qty for p in products)
+    # 2. Stoktaki İşlenmiş Ürünler (Künye, Bilezik vb) - ürün tablosu değil, güncel tutulan toplamlar okunur
+    stock = await db.run_sync(inventory.totals)
+    total_product_weight = stock["total_weight_has"] # Has Altın Karşılığı
+    total_labor_tl = stock["total_labor_tl"]
     
     live = await fetch_prices_async()
     
@@ -366,7 +715,8 @@ async def get_kasa(db: Session = Depends(get_db)):
         "balances": v_data,
         "product_stock": {
             "total_weight_has": round(total_product_weight, 3),
-            "total_labor_tl": round(total_labor_tl, 2)
+            "total_labor_tl": round(total_labor_tl, 2),
+            "groups": stock["groups"]
         },
         "total_gold_has": round(v_data.get("GA", 0.0) + total_product_weight, 3),
         "valuation": {
@@ -381,26 +731,40 @@ async def get_kasa(db: Session = Depends(get_db)):
 
 
 @app.get("/reports/pnl")
-async def get_pnl(premium: bool = Depends(check_premium), db: Session = Depends(get_db)):
-    txs, cur = db.query(models.Transaction).all(), await fetch_prices_async()
-    total = 0.0
-    for t in txs:
-        m = cur.get(t.symbol or "GA", cur.get("GA", {"buy":0}))
-        ref = m.get("buy") or 0
-        if t.side == "sell": total += (t.unit_price - ref) * t.qty
-        else: total += (ref - t.unit_price) * t.qty
-    return {"profit": round(total, 2)}
+async def get_pnl(premium: bool = Depends(check_premium), db: AsyncSession = Depends(get_async_db)):
+    """Ortalama maliyet yöntemiyle toplam kar/zarar; işlem geçmişi değil pozisyon tablosu okunur"""
+    positions = (await db.scalars(select(models.Position))).all()
+    report = pnl.position_report(positions, await fetch_prices_async())
+    report["profit"] = round(report["realized"] + report["unrealized"], 2)
+    return report
+
+@app.get("/reports/pnl/realized")
+def get_realized_pnl(premium: bool = Depends(check_premium), db: Session = Depends(get_db)):
+    """Gerçekleşen kar/zarar (fiyattan bağımsız)"""
+    return pnl.position_report(db.query(models.Position).all())
+
+@app.get("/reports/pnl/unrealized")
+async def get_unrealized_pnl(premium: bool = Depends(check_premium), db: AsyncSession = Depends(get_async_db)):
+    """Eldeki pozisyonların güncel alış fiyatına göre gerçekleşmemiş kar/zararı"""
+    positions = (await db.scalars(select(models.Position).where(models.Position.qty > 0))).all()
+    report = pnl.position_report(positions, await fetch_prices_async())
+    return {"unrealized": report["unrealized"], "positions": report["positions"]}
+
+@app.post("/reports/pnl/rebuild")
+def rebuild_pnl(premium: bool = Depends(check_premium), db: Session = Depends(get_write_db)):
+    """Pozisyon tablosunu işlem geçmişinden yeniden üretir (denetim)"""
+    return {"symbols": pnl.rebuild_positions(db)}
 
 @app.get("/reports/daily")
-async def get_daily(db: Session = Depends(get_db)):
-    from datetime import date
-    
-    # Bugünün işlemleri (Transaction modelinde ts DateTime tipinde olduğu için bugüne göre filtreleyeceğiz)
-    today_start = date.today().isoformat()
-    # Tüm işlemleri çekip bellekte bugünün tarihini filtreleyelim 
-    # (Daha verimli yöntem veri tabanı filtredir ancak sqlite ile safe olmak için string startswith yapabiliriz)
-    txs_all = db.query(models.Transaction).order_by(models.Transaction.ts.desc()).all()
-    txs = [t for t in txs_all if t.ts and str(t.ts).startswith(today_start)]
+async def get_daily(date: Optional[date] = None, db: AsyncSession = Depends(get_async_db)):
+    """Seçilen günün (varsayılan: dükkan saatine göre bugün) işlemleri ve kar/zararı"""
+    day = date or shopday.today()
+    day_start, day_end = shopday.shop_day_bounds(day)
+    # [gün başı, ertesi gün başı) aralığı ts indeksinden okunur; maliyet günün işlem sayısıyla orantılı
+    txs = (await db.scalars(select(models.Transaction).where(
+        models.Transaction.ts >= day_start,
+        models.Transaction.ts < day_end,
+    ).order_by(models.Transaction.ts.desc()))).all()
     
     cur = await fetch_prices_async()
     daily_profit = 0.0
@@ -415,7 +779,7 @@ async def get_daily(db: Session = Depends(get_db)):
         
         # Gösterim için işlem objesi
         daily_txs.append({
-            "ts": t.ts.split("T")[1][:5] if "T" in str(t.ts) else str(t.ts).split(" ")[1][:5] if " " in str(t.ts) else str(t.ts),
+            "ts": t.ts.strftime("%H:%M"),
             "side": "SATIŞ" if t.side == "sell" else "ALIŞ",
             "symbol": t.symbol,
             "qty": t.qty,
@@ -425,98 +789,324 @@ async def get_daily(db: Session = Depends(get_db)):
         })
         
     return {
+        "date": day.isoformat(),
         "profit": round(daily_profit, 2),
         "transactions": daily_txs
     }
 
+ANALYTICS_WINDOWS = (7, 30, 90, 365)
+
 @app.get("/reports/analytics")
-def get_analytics(premium: bool = Depends(check_premium), db: Session = Depends(get_db)):
-    from datetime import datetime, timedelta
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    txs = db.query(models.Transaction).filter(models.Transaction.ts >= thirty_days_ago).all()
-    
-    total_buy = sum(t.total_price for t in txs if t.side == "buy" and t.total_price)
-    total_sell = sum(t.total_price for t in txs if t.side == "sell" and t.total_price)
-    
-    category_sales = {}
-    symbol_sales = {}
-    for t in txs:
-        if t.side == "sell":
-            if t.product_id:
-                prod = db.get(models.Product, t.product_id)
-                cat = prod.category if prod and prod.category else "Ürün"
-                category_sales[cat] = category_sales.get(cat, 0) + (t.total_price or 0)
-            elif t.symbol and t.symbol != "ÜRÜN":
-                symbol_sales[t.symbol] = symbol_sales.get(t.symbol, 0) + (t.total_price or 0)
+def get_analytics(
+    days: int = 30,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    series: bool = False,
+    premium: bool = Depends(check_premium),
+    db: Session = Depends(get_db),
+):
+    """
+    Hacim, sembol ve kategori bazlı satışlar. Pencere son `days` gün (7/30/90/365) ya da start/end ile özel aralıktır.
+    İşlem hacminden bağımsız olarak sabit sayıda sorgu çalışır.
+    """
+    end = end or shopday.today()
+    if start is None:
+        if days not in ANALYTICS_WINDOWS:
+            raise HTTPException(status_code=400, detail=f"Geçersiz pencere: {days} (7/30/90/365)")
+        start = end - timedelta(days=days - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="Başlangıç tarihi bitişten sonra olamaz")
 
-    category_keys = list(category_sales.keys())
-    category_values = list(category_sales.values())
+    # Hacim ve sembol satışları günlük özet tablosundan okunur
+    vol = rollup.volume(db, start, end)
+    symbol_sales = rollup.symbol_sales(db, start, end)
 
-    symbol_keys = list(symbol_sales.keys())
-    symbol_values = list(symbol_sales.values())
+    # Kategori satışları: vitrin ürünü satışları ürün tablosuyla birleştirilip tek sorguda gruplanır
+    ts_from, _ = shopday.shop_day_bounds(start)
+    _, ts_to = shopday.shop_day_bounds(end)
+    category = func.coalesce(func.nullif(models.Product.category, ""), "Ürün")
+    category_sales = dict(
+        db.query(category, func.sum(models.Transaction.total_price))
+        .select_from(models.Transaction)
+        .outerjoin(models.Product, models.Product.id == models.Transaction.product_id)
+        .filter(
+            models.Transaction.side == "sell",
+            models.Transaction.product_id.isnot(None),
+            models.Transaction.ts >= ts_from,
+            models.Transaction.ts < ts_to,
+        )
+        .group_by(category)
+        .all()
+    )
 
-    return {
-        "volume": {"buy": round(total_buy, 2), "sell": round(total_sell, 2)},
-        "category_sales": {"labels": category_keys, "values": category_values},
-        "symbol_sales": {"labels": symbol_keys, "values": symbol_values}
+    report = {
+        "window": {"start": start.isoformat(), "end": end.isoformat()},
+        "volume": {"buy": round(vol.get("buy", 0.0), 2), "sell": round(vol.get("sell", 0.0), 2)},
+        "category_sales": {"labels": list(category_sales.keys()), "values": [v or 0 for v in category_sales.values()]},
+        "symbol_sales": {"labels": list(symbol_sales.keys()), "values": list(symbol_sales.values())}
     }
+    if series:
+        report["series"] = rollup.daily_series(db, start, end)
+    return report
+
+# --- EXPORT (MUHASEBE) ---
+@app.get("/export/{dataset}")
+def export_dataset(
+    dataset: str,
+    format: str = "csv",
+    compress: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    premium: bool = Depends(check_premium),
+    db: Session = Depends(get_db),
+):
+    """İşlem, cari hesap ve kasa dökümü; satırlar parça parça akıtılır (bellek kullanımı satır sayısından bağımsız)"""
+    if dataset not in export.DATASETS:
+        raise HTTPException(status_code=404, detail=f"Bilinmeyen veri kümesi: {dataset}")
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Geçersiz format: {format} (csv/ndjson/parquet)")
+    if compress not in (None, "gzip"):
+        raise HTTPException(status_code=400, detail=f"Geçersiz sıkıştırma: {compress}")
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet çıktısı için sunucuya pyarrow kurulmalı")
+
+    ts_from = shopday.shop_day_bounds(start)[0] if start else None
+    ts_to = shopday.shop_day_bounds(end)[1] if end else None
+    filename = f"{dataset}.{format}" + (".gz" if compress else "")
+    media_type = "application/gzip" if compress else export.FORMATS[format]
+    return StreamingResponse(
+        export.stream(db, dataset, format, compress=bool(compress), ts_from=ts_from, ts_to=ts_to),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# Yüklenen dosyanın bu kadarı bellekte tutulur, fazlası geçici dosyaya taşar
+IMPORT_SPOOL_BYTES = int(os.getenv("IMPORT_SPOOL_BYTES", str(8 * 1024 * 1024)))
+
+@app.post("/import/{dataset}")
+async def import_dataset(
+    dataset: str,
+    request: Request,
+    format: str = "csv",
+    premium: bool = Depends(check_premium),
+):
+    """
+    Ürün, müşteri veya geçmiş işlem dosyasını (CSV/NDJSON, .gz olabilir) toplu aktarır. Gövde parça
+    parça okunur; hatalı satırlar atlanıp raporlanır, geçerli olanlar tek transaction'da yazılır.
+    Aktarım uzun sürebileceği için ayrı thread'de kendi oturumuyla çalışır (event loop bloklanmaz).
+    """
+    if dataset not in importer.DATASETS:
+        raise HTTPException(status_code=404, detail=f"Bilinmeyen veri kümesi: {dataset}")
+    if format not in importer.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Geçersiz format: {format} (csv/ndjson)")
+
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+    try:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+
+        def run():
+            with write_lock():
+                db = SessionLocal()
+                try:
+                    begin_write(db)
+                    return importer.run(db, dataset, spool, format)
+                finally:
+                    db.close()
+
+        try:
+            # Aktarım bitene kadar istek yazarları event loop'ta sıra bekler (busy_timeout'a takılmaz)
+            async with request_write_lock():
+                report = await asyncio.to_thread(run)
+        except (UnicodeDecodeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Dosya okunamadı: {e}")
+        except IntegrityError as e:
+            # Doğrulamanın yakalayamadığı (ör. aynı anda yazılan) tekil kayıt çakışması; aktarım geri alındı
+            raise HTTPException(status_code=409, detail=f"Kayıt çakışması, aktarım geri alındı: {e.orig}")
+    finally:
+        spool.close()
+    if report["inserted"]:
+        notify_change("import", dataset=dataset, inserted=report["inserted"])
+    return report
 
 # --- PRODUCTS ---
 @app.get("/products")
-def list_products(db: Session = Depends(get_db)):
+def list_products(request: Request, response: Response, db: Session = Depends(get_db)):
+    cached = not_modified(request, response, db, ["products"])
+    if cached is not None:
+        return cached
     return db.query(models.Product).filter(models.Product.stock_qty > 0).all()
 
 
 @app.post("/products")
-def create_product(p: schemas.ProductCreate, db: Session = Depends(get_db)):
+def create_product(p: schemas.ProductCreate, db: Session = Depends(get_write_db)):
     db_p = models.Product(**p.model_dump())
-    db.add(db_p); db.commit(); db.refresh(db_p); return db_p
+    db.add(db_p)
+    inventory.adjust(db, db_p, 0, db_p.stock_qty)
+    db.commit(); db.refresh(db_p)
+    notify_change("stock", id=db_p.id)
+    return db_p
 
 # --- CUSTOMERS ---
 @app.get("/customers")
-def list_customers(db: Session = Depends(get_db)):
+def list_customers(request: Request, response: Response, db: Session = Depends(get_db)):
+    cached = not_modified(request, response, db, ["customers"])
+    if cached is not None:
+        return cached
     return db.query(models.Customer).all()
 
+@app.get("/customers/search")
+def search_customers(q: str = "", limit: int = Query(search.SEARCH_LIMIT, ge=1, le=100), db: Session = Depends(get_db)):
+    """Yazarken arama: ad veya telefonun kelime başlarıyla eşleşen müşteriler (Türkçe harf/büyük-küçük duyarsız)"""
+    return search.customers(db, q, limit)
+
 @app.post("/customers")
-def create_customer(c: schemas.CustomerCreate, db: Session = Depends(get_db)):
+def create_customer(c: schemas.CustomerCreate, db: Session = Depends(get_write_db)):
     if LICENSE_TIER == "NORMAL":
         count = db.query(models.Customer).count()
         if count >= 20:
             raise HTTPException(status_code=402, detail="Cari Limitiniz Doldu (20/20). Sınırsız müşteri kaydı için Kuyumcu Pro Premium'a geçin.")
             
     db_c = models.Customer(**c.model_dump())
-    db.add(db_c); db.commit(); db.refresh(db_c); return db_c
+    db.add(db_c); db.commit(); db.refresh(db_c)
+    notify_change("customers", id=db_c.id)
+    return db_c
 
 @app.post("/customers/{customer_id}/payment")
-def process_customer_payment(customer_id: int, amount: float, p_type: str, db: Session = Depends(get_db)):
+def process_customer_payment(customer_id: int, amount: float, p_type: str, db: Session = Depends(get_write_db)):
     # p_type: "tahsilat" (müşteri öder, kasaya girer, borç düşer), "odeme" (biz öderiz, kasadan çıkar, borç artar)
     cust = db.get(models.Customer, customer_id)
     if not cust: return {"error": "Müşteri bulunamadı"}
     
-    try_v = db.query(models.Vault).filter(models.Vault.symbol == "TRY").first()
-    if not try_v: try_v = models.Vault(symbol="TRY", balance=0.0); db.add(try_v)
+    try_v = get_or_create(db, models.Vault, {"symbol": "TRY"}, balance=0.0)
 
     if p_type == "tahsilat":
-        cust.balance_try -= amount  # Müşterinin bize borcu azalır (veya bizim ona borcumuz artar)
-        try_v.balance += amount     # Kasamıza para girer
+        ledger.customer(db, cust, "TRY", -amount, source="payment")  # Müşterinin bize borcu azalır (veya bizim ona borcumuz artar)
+        ledger.vault(db, try_v, amount, source="payment")            # Kasamıza para girer
     elif p_type == "odeme":
-        cust.balance_try += amount  # Müşteriye para verdik, borcu arttı
-        try_v.balance -= amount     # Kasamızdan para çıktı
+        ledger.customer(db, cust, "TRY", amount, source="payment")   # Müşteriye para verdik, borcu arttı
+        ledger.vault(db, try_v, -amount, source="payment")           # Kasamızdan para çıktı
         
     db.commit()
+    notify_change("vault", customer_id=customer_id)
     return {"message": "İşlem başarılı", "new_balance": cust.balance_try}
 
 
+# --- LEDGER (KASA/CARİ HAREKET DEFTERİ) ---
+@app.get("/ledger", response_model=List[schemas.LedgerEntryOut])
+def list_ledger(
+    response: Response,
+    limit: int = Query(200, ge=1, le=TX_PAGE_MAX),
+    cursor: Optional[int] = None,
+    account: Optional[str] = None,
+    symbol: Optional[str] = None,
+    customer_id: Optional[int] = None,
+    transaction_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db),
+):
+    """Bakiye değişimlerinin denetim kaydı, yeniden eskiye. Sonraki sayfanın imleci (kayıt id) X-Next-Cursor başlığındadır."""
+    E = models.LedgerEntry
+    query = db.query(E)
+    for column, value in ((E.account, account), (E.symbol, symbol), (E.customer_id, customer_id),
+                          (E.transaction_id, transaction_id)):
+        if value is not None:
+            query = query.filter(column == value)
+    if start:
+        query = query.filter(E.ts >= shopday.shop_day_bounds(start)[0])
+    if end:
+        query = query.filter(E.ts < shopday.shop_day_bounds(end)[1])
+    if cursor:
+        query = query.filter(E.id < cursor)
+
+    rows = query.order_by(E.id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return rows
+
+@app.get("/ledger/balances")
+def ledger_balances(at: Optional[datetime] = None, db: Session = Depends(get_db)):
+    """Kasa ve cari bakiyelerinin istenen andaki (varsayılan: şimdi) hali; son snapshot + sonraki kayıtlar"""
+    at = at or datetime.now()
+    if at.tzinfo is not None:
+        # Kayıt zamanları sunucunun yerel saatinde, saat dilimsiz tutulur
+        at = at.astimezone().replace(tzinfo=None)
+    return {"at": at.isoformat(), **ledger.group(ledger.balances_at(db, at))}
+
+
 @app.get("/prices")
-async def get_prices():
-    return await fetch_prices_async()
+async def get_prices(response: Response):
+    snap = await get_price_snapshot()
+    set_price_headers(response, snap)
+    return snap.as_dict()
+
+@app.get("/prices/status")
+def get_price_status():
+    """Fiyat kaynağının durumu (devre kesici, snapshot yaşı, bayatlık)"""
+    return price_service.status()
+
+@app.get("/prices/history")
+def get_price_history(
+    symbol: str = "GA",
+    bucket: str = "day",
+    price_type: str = "buy",
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """OHLC özetlerinden fiyat geçmişi (zamanlar UTC). Ham tick tablosu taranmaz."""
+    if bucket not in history.BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Geçersiz periyot: {bucket}")
+    if price_type not in ("buy", "sell"):
+        raise HTTPException(status_code=400, detail=f"Geçersiz fiyat tipi: {price_type}")
+    default_span = {"minute": timedelta(hours=6), "hour": timedelta(days=7), "day": timedelta(days=30)}[bucket]
+    end = _to_utc_naive(to) if to else datetime.now(timezone.utc).replace(tzinfo=None)
+    start = _to_utc_naive(from_) if from_ else end - default_span
+    return {"symbol": symbol, "bucket": bucket, "price_type": price_type,
+            "bars": history.query_bars(db, symbol, bucket, price_type, start, end)}
+
+def _to_utc_naive(dt: datetime) -> datetime:
+    # Saat dilimi verilmemişse UTC kabul edilir
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+@app.get("/prices/metrics")
+def get_price_metrics(limit: int = 100):
+    """Son TCMB çekimlerinin süre ölçümleri (connect / TTFB / parse, ms)"""
+    return list(price_service.fetch_metrics)[-limit:]
+
+# --- EVENT STREAM ---
+async def event_stream(request: Request):
+    q = bus.subscribe()
+    try:
+        # Bağlanan terminal beklemeden güncel fiyatları alır
+        snap = await get_price_snapshot()
+        yield format_sse("prices", snap.as_dict())
+        while not await request.is_disconnected():
+            try:
+                event, data = await asyncio.wait_for(q.get(), timeout=STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                # Bağlantının (proxy/NAT) kopmaması için yorum satırı gönderilir
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(event, data)
+    finally:
+        bus.unsubscribe(q)
+
+@app.get("/events/stream")
+async def stream_events(request: Request):
+    """Server-Sent Events: fiyat, kasa ve işlem değişikliklerini terminallere iter"""
+    return StreamingResponse(event_stream(request), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # --- USERS / AUTH ---
 def get_password_hash(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
 @app.post("/users", response_model=schemas.UserOut)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+def create_user(user: schemas.UserCreate, db: Session = Depends(get_write_db)):
     if LICENSE_TIER == "NORMAL":
         count = db.query(models.User).count()
         if count >= 1:
@@ -549,7 +1139,7 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
     return {"message": "Login successful", "user": {"id": db_user.id, "username": db_user.username, "role": db_user.role}}
 
 @app.get("/users/ensure_admin")
-def ensure_admin(db: Session = Depends(get_db)):
+def ensure_admin(db: Session = Depends(get_write_db)):
     # Create default admin if not exists
     admin = db.query(models.User).filter(models.User.username == "admin").first()
     if not admin:
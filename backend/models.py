@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Index, UniqueConstraint, event, inspect
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .database import Base
+from .services.turkish import customer_key
 from datetime import datetime
 
 class User(Base):
@@ -23,6 +24,11 @@ class Instrument(Base):
     id = Column(Integer, primary_key=True, index=True)
     symbol = Column(String, unique=True, index=True)
     name = Column(String)
+    # Türev altın ürünleri için fiyatlama tablosu (döviz kayıtlarında boş kalır)
+    has_gram = Column(Float, nullable=True) # Birim başına gram (ziynette has karşılığı)
+    purity = Column(Float, default=1.0) # Saflık
+    buy_spread = Column(Float, default=0.0) # Alış makası (0.02 = %2)
+    sell_spread = Column(Float, default=0.0) # Satış makası
 
 class Price(Base):
     __tablename__ = "prices"
@@ -32,6 +38,26 @@ class Price(Base):
     price = Column(Float)
     ts = Column(DateTime(timezone=True), server_default=func.now())
     instrument = relationship("Instrument")
+    __table_args__ = (Index("ix_prices_instrument_ts", "instrument_id", "price_type", "ts"),)
+
+class PriceBar(Base):
+    """Fiyat geçmişinin dakika/saat/gün bazlı OHLC özetleri (ham tick'ler taranmadan grafik çizilir)"""
+    __tablename__ = "price_bars"
+    id = Column(Integer, primary_key=True, index=True)
+    instrument_id = Column(Integer, ForeignKey("instruments.id"))
+    price_type = Column(String)  # "buy" | "sell"
+    bucket = Column(String)  # "minute" | "hour" | "day"
+    bucket_start = Column(DateTime) # UTC
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    count = Column(Integer, default=0)
+    __table_args__ = (UniqueConstraint("instrument_id", "price_type", "bucket", "bucket_start", name="uq_price_bars_bucket"),)
+
+def _search_key_default(context):
+    params = context.get_current_parameters()
+    return customer_key(params.get("full_name"), params.get("phone"))
 
 class Customer(Base):
     __tablename__ = "customers"
@@ -43,8 +69,18 @@ class Customer(Base):
     balance_try = Column(Float, default=0.0) # Borç/Alacak durumu (TL)
     balance_gold = Column(Float, default=0.0) # Borç/Alacak durumu (Has Altın Gram)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Ad/telefonun normalize edilmiş hali (Türkçe harf ve büyük/küçük farkı yok); arama indeksi bunu okur.
+    # Kolon varsayılanı olduğu için toplu INSERT'lerde (aktarım) de doldurulur.
+    search_key = Column(String, default=_search_key_default)
     transactions = relationship("Transaction", back_populates="customer")
 
+
+@event.listens_for(Customer, "before_update")
+def _refresh_search_key(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.full_name.history.has_changes() or state.attrs.phone.history.has_changes():
+        target.search_key = customer_key(target.full_name, target.phone)
+
 class Product(Base):
     __tablename__ = "products"
     id = Column(Integer, primary_key=True, index=True)
@@ -56,6 +92,17 @@ class Product(Base):
     stock_qty = Column(Integer, default=1)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class InventoryAggregate(Base):
+    """Stoktaki ürünlerin kategori ve ayar bazlı toplamları (kasa değerlemesi ürünleri tek tek taramaz)"""
+    __tablename__ = "inventory_aggregates"
+    id = Column(Integer, primary_key=True, index=True)
+    category = Column(String, default="")
+    purity = Column(Float)
+    qty = Column(Integer, default=0) # Adet
+    weight_has = Column(Float, default=0.0) # weight * purity * adet
+    labor_tl = Column(Float, default=0.0) # labor_cost * adet
+    __table_args__ = (UniqueConstraint("category", "purity", name="uq_inventory_aggregates_group"),)
+
 class Vault(Base):
     __tablename__ = "vault"
     id = Column(Integer, primary_key=True, index=True)
@@ -63,6 +110,41 @@ class Vault(Base):
     balance = Column(Float, default=0.0)
     last_updated = Column(DateTime, onupdate=datetime.now, default=datetime.now)
 
+class LedgerEntry(Base):
+    """
+    Kasa ve cari bakiyelerindeki her değişimin kaydı; sadece eklenir, güncellenmez/silinmez.
+    Vault.balance ve Customer.balance_* bu kayıtlardan türetilmiş güncel bakiye önbelleğidir.
+    """
+    __tablename__ = "ledger_entries"
+    id = Column(Integer, primary_key=True, index=True)
+    ts = Column(DateTime, default=datetime.now)
+    account = Column(String) # "vault" veya "customer"
+    symbol = Column(String) # Kasa sembolü; cari için "TRY" (TL) veya "GA" (has altın)
+    customer_id = Column(Integer, ForeignKey("customers.id"), nullable=True)
+    delta = Column(Float)
+    transaction_id = Column(Integer, ForeignKey("transactions.id"), nullable=True)
+    source = Column(String) # "tx", "payment", "vault_update", "opening"
+    __table_args__ = (
+        Index("ix_ledger_entries_ts_id", "ts", "id"),
+        Index("ix_ledger_entries_account", "account", "symbol", "customer_id", "id"),
+        Index("ix_ledger_entries_transaction", "transaction_id"),
+    )
+
+    transaction = relationship("Transaction")
+
+class LedgerSnapshot(Base):
+    """Defterin entry_id'ye kadarki hesap bakiyeleri; geçmiş bakiye sorguları baştan toplamak yerine buradan başlar"""
+    __tablename__ = "ledger_snapshots"
+    id = Column(Integer, primary_key=True, index=True)
+    entry_id = Column(Integer) # Snapshot'a dahil son defter kaydı
+    ts = Column(DateTime) # O kaydın zamanı
+    account = Column(String)
+    symbol = Column(String)
+    customer_id = Column(Integer, nullable=True)
+    balance = Column(Float, default=0.0)
+    __table_args__ = (Index("ix_ledger_snapshots_ts_entry", "ts", "entry_id"),
+                      Index("ix_ledger_snapshots_entry", "entry_id"))
+
 class Transaction(Base):
     __tablename__ = "transactions"
     id = Column(Integer, primary_key=True, index=True)
@@ -77,14 +159,57 @@ class Transaction(Base):
     payment_type = Column(String, default="Cash")  # Cash, Debt vb.
     net_try = Column(Float, default=0.0) # Borç/Alacak için yansıyan net TL
     ts = Column(DateTime, default=datetime.now)
+    # Terminalin tekrar gönderdiği işlemler bu anahtarla tanınır (aynı işlem iki kez yazılmaz)
+    idempotency_key = Column(String, nullable=True)
 
+    # Gün/aralık raporları tüm tabloyu taramadan bu indekslerden okunur
+    __table_args__ = (
+        Index("ix_transactions_ts_id", "ts", "id"),
+        Index("ix_transactions_symbol_ts", "symbol", "ts"),
+        Index("ix_transactions_customer_ts", "customer_id", "ts"),
+        Index("ix_transactions_product_ts", "product_id", "ts"),
+        Index("ux_transactions_idempotency_key", "idempotency_key", unique=True),
+    )
     
     instrument = relationship("Instrument")
     customer = relationship("Customer", back_populates="transactions")
     product = relationship("Product")
 
+class Position(Base):
+    """Sembol bazlı açık pozisyon: ortalama maliyet ve gerçekleşen kar/zarar (her işlemde güncellenir)"""
+    __tablename__ = "positions"
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String, unique=True, index=True)
+    qty = Column(Float, default=0.0)
+    avg_cost = Column(Float, default=0.0)
+    realized_pnl = Column(Float, default=0.0)
+    last_updated = Column(DateTime, onupdate=datetime.now, default=datetime.now)
+    # Ortalama maliyet artışla ifade edilemez (okunup hesaplanır); iki terminal aynı anda yazarsa
+    # UPDATE ... WHERE version = ? ikincisini StaleDataError ile reddeder ve işlem baştan denenir
+    version = Column(Integer, nullable=False, default=1)
+    __mapper_args__ = {"version_id_col": version}
+
+class DailyRollup(Base):
+    """İşlemlerin gün bazlı özeti; raporlar ham işlem tablosunu taramadan buradan okur"""
+    __tablename__ = "daily_rollups"
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date) # Dükkan saat dilimine göre gün
+    symbol = Column(String, default="")
+    side = Column(String)
+    payment_type = Column(String, default="")
+    qty = Column(Float, default=0.0)
+    total_price = Column(Float, default=0.0)
+    count = Column(Integer, default=0)
+    __table_args__ = (UniqueConstraint("day", "symbol", "side", "payment_type", name="uq_daily_rollups_key"),)
+
 class Config(Base):
     __tablename__ = "configs"
     id = Column(Integer, primary_key=True, index=True)
     key = Column(String, unique=True, index=True)
-    value = Column(String)
\ No newline at end of file
+    value = Column(String)
+class TableVersion(Base):
+    """Tablo başına yazma sayacı; okuma endpoint'lerinin ETag'i buradan üretilir"""
+    __tablename__ = "table_versions"
+    # Sayaç yazan transaction'la birlikte commit edilir: CLI araçları ve diğer süreçlerin yazmaları da görünür
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
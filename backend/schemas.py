@@ -1,4 +1,4 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, model_validator
 from typing import Optional, List
 from datetime import datetime
 
@@ -22,6 +22,10 @@ class UserLogin(BaseModel):
 class InstrumentBase(BaseModel):
     symbol: str
     name: str
+    has_gram: Optional[float] = None # Birim başına gram (ziynette has karşılığı)
+    purity: float = 1.0
+    buy_spread: float = 0.0
+    sell_spread: float = 0.0
 
 class InstrumentCreate(InstrumentBase):
     pass
@@ -87,13 +91,46 @@ class TransactionBase(BaseModel):
 
 
 class TransactionCreate(TransactionBase):
-    pass
+    @model_validator(mode="after")
+    def _fill_total(self):
+        # Tutar gönderilmezse adet x birim fiyattan hesaplanır (kasa/cari hareketleri tutarsız kalmasın)
+        if self.total_price is None:
+            self.total_price = self.qty * self.unit_price
+        return self
+
+class TransactionBatch(BaseModel):
+    items: List[TransactionCreate]
 
 class TransactionOut(TransactionBase):
     id: int
     ts: datetime
     model_config = ConfigDict(from_attributes=True)
 
+# --- Ledger ---
+class LedgerEntryOut(BaseModel):
+    id: int
+    ts: datetime
+    account: str
+    symbol: str
+    customer_id: Optional[int] = None
+    delta: float
+    transaction_id: Optional[int] = None
+    source: str
+    model_config = ConfigDict(from_attributes=True)
+
+# --- Import (eski programdan toplu aktarım) ---
+# Eski kayıtların id'leri korunabilir; işlemler müşteri/ürüne bu id'lerle bağlanır
+class ProductImport(ProductCreate):
+    id: Optional[int] = None
+
+class CustomerImport(CustomerCreate):
+    id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+class TransactionImport(TransactionCreate):
+    id: Optional[int] = None
+    ts: datetime
+
 # --- Conversion ---
 class ConvertRequest(BaseModel):
     symbol: str
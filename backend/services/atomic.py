@@ -0,0 +1,44 @@
+from sqlalchemy import func, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.sql import ClauseElement
+
+_UPSERT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def increment(obj, attr: str, delta):
+    """
+    obj.attr += delta işlemini flush'ta "attr = attr + delta" olarak yazar. Değer Python'da
+    okunup yazılmadığı için aynı satırı eşzamanlı değiştiren terminaller birbirinin güncellemesini
+    ezmez. Aynı flush içinde tekrar çağrılırsa artışlar birleştirilir; henüz yazılmamış (yeni)
+    nesnede düz toplama yapılır. Flush'tan sonra alan okunursa güncel değer DB'den yüklenir.
+    """
+    if delta is None:
+        # NULL ile toplama bakiyeyi sessizce NULL'a çevirirdi
+        raise TypeError(f"{type(obj).__name__}.{attr} için artış değeri yok")
+    state = inspect(obj)
+    current = state.dict.get(attr)
+    if isinstance(current, ClauseElement):
+        value = current + delta
+    elif state.persistent:
+        value = func.coalesce(getattr(type(obj), attr), 0) + delta
+    else:
+        value = (current or 0) + delta
+    setattr(obj, attr, value)
+
+
+def get_or_create(db, model, keys: dict, **defaults):
+    """
+    keys (tekil kısıtın kolonları) ile satırı döner; yoksa INSERT ... ON CONFLICT DO NOTHING ile açar.
+    İki terminal aynı anahtarın ilk satırını aynı anda yazarsa kaybeden IntegrityError almaz, kazananın
+    satırını okur (PostgreSQL'de yazar kilidi yok). Değerler sonradan increment ile artırılır.
+    """
+    row = db.query(model).filter_by(**keys).first()
+    if row is not None:
+        return row
+    upsert = _UPSERT.get(db.get_bind().dialect.name)
+    if upsert is None:
+        row = model(**keys, **defaults)
+        db.add(row)
+        return row
+    db.execute(upsert(model).values(**keys, **defaults).on_conflict_do_nothing(index_elements=list(keys)))
+    return db.query(model).filter_by(**keys).one()
@@ -0,0 +1,51 @@
+import time
+
+
+class CircuitBreaker:
+    """
+    Dış servis çağrıları için basit devre kesici.
+    closed: çağrılar serbest, open: çağrılar anında reddedilir,
+    half_open: bekleme süresi dolunca tek bir deneme çağrısına izin verilir.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN and not self._probing:
+            # Yarı açık durumda aynı anda sadece bir deneme yapılır
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def reset(self):
+        self.record_success()
+
+    def status(self) -> dict:
+        return {"state": self.state, "failures": self.failures}
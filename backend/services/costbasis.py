@@ -0,0 +1,94 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+
+def _affine_scan(w: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    x_i = w_i * x_{i-1} + b_i (x_{-1} = 0) yinelemesini log2(n) adımda vektörel çözer.
+    Bölme yapılmaz; katsayılar çarpılarak sıfıra yaklaşırsa o satırların etkisi zaten yok sayılabilir.
+    """
+    w = w.copy()
+    b = b.copy()
+    step = 1
+    while step < len(w):
+        b[step:] = w[step:] * b[:-step] + b[step:]
+        w[step:] = w[step:] * w[:-step]
+        step *= 2
+    return b
+
+
+def compute(symbol, side, qty, unit_price, ts=None) -> Dict[str, Dict[str, float]]:
+    """
+    Tüm işlem geçmişinden sembol bazlı pozisyon, ortalama maliyet ve FIFO maliyeti ile
+    gerçekleşen kar/zararı tek geçişte hesaplar. Girdiler aynı uzunlukta kolon dizileridir;
+    "buy"/"sell" dışındaki işlemler yok sayılır. Eldekinden fazla satış pnl.apply_trade ile
+    aynı şekilde kırpılır (sadece eldeki miktar kadar kar yazılır).
+    """
+    # Metin kolonları nesne dizisi olarak bırakılırsa karşılaştırmalar Python hızında kalır
+    symbol = np.asarray(symbol).astype(str)
+    side = np.asarray(side).astype(str)
+    qty = np.asarray(qty, dtype=float)
+    price = np.asarray(unit_price, dtype=float)
+
+    keep = (side == "buy") | (side == "sell")
+    idx = np.flatnonzero(keep)
+    if len(idx) == 0:
+        return {}
+    symbols, codes = np.unique(symbol[idx], return_inverse=True)
+    # Sıralama: sembol, sonra zaman, sonra giriş sırası
+    keys = [idx, codes]
+    if ts is not None:
+        ts = np.asarray(ts)[idx]
+        if ts.dtype == object:
+            ts = ts.astype("datetime64[us]")
+        keys.insert(1, ts)
+    perm = np.lexsort(keys)
+    order = idx[perm]
+    codes = codes[perm]
+
+    q = qty[order]
+    c = price[order]
+    is_buy = side[order] == "buy"
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(order)]
+
+    # Pozisyon: sembol içi kümülatif toplamın sıfırdan yansıtılmış hali (fazla satış kırpılır)
+    delta = np.where(is_buy, q, -q)
+    pos = np.empty_like(q)
+    for s, e in zip(starts, ends):
+        run = np.cumsum(delta[s:e])
+        pos[s:e] = run - np.minimum.accumulate(np.minimum(run, 0.0))
+    before = np.empty_like(pos)
+    before[1:] = pos[:-1]
+    before[starts] = 0.0
+    matched = np.where(is_buy, 0.0, before - pos)
+
+    # Ortalama maliyet sadece alışta değişir: a = w * a_önceki + (1 - w) * fiyat
+    total = before + q
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w = np.where(is_buy & (total > 0), before / total, 1.0)
+    b = np.where(is_buy & (total > 0), (1.0 - w) * c, 0.0)
+    avg = _affine_scan(w, b)
+    realized_avg = np.where(is_buy, 0.0, matched * (c - avg))
+
+    # FIFO: satılan birimler alış lotlarının kümülatif sırasındaki (M_önceki, M] aralığıdır
+    bought = np.where(is_buy, q, 0.0)
+    spent = bought * c
+
+    result = {}
+    for k, (s, e) in enumerate(zip(starts, ends)):
+        lot_edge = np.r_[0.0, np.cumsum(bought[s:e])]
+        lot_cost = np.r_[0.0, np.cumsum(spent[s:e])]
+        sold = matched[s:e].sum()
+        sold_cost = np.interp(sold, lot_edge, lot_cost)
+        final_qty = pos[e - 1]
+        remaining_cost = lot_cost[-1] - sold_cost
+        result[symbols[k]] = {
+            "qty": float(final_qty),
+            "avg_cost": float(avg[e - 1]) if final_qty > 0 else 0.0,
+            "realized_avg": float(realized_avg[s:e].sum()),
+            "fifo_cost": float(remaining_cost / final_qty) if final_qty > 0 else 0.0,
+            "realized_fifo": float((matched[s:e] * c[s:e]).sum() - sold_cost),
+        }
+    return result
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import threading
+from typing import Any, Optional, Set
+
+
+class EventBus:
+    """
+    Terminallere anlık olay (fiyat, kasa, işlem) yayını için süreç içi dağıtıcı.
+    Her abonenin kendi kuyruğu vardır; senkron endpoint'lerden (thread pool) de güvenle yayın yapılabilir.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: str, data: Any = None):
+        with self._lock:
+            loop = self._loop
+            if not self._subscribers or loop is None or loop.is_closed():
+                return
+        message = (event, data)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fanout(message)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._fanout, message)
+            except RuntimeError:
+                pass  # döngü kapanmış (sunucu kapanıyor)
+
+    def _fanout(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            if q.full():
+                # Yavaş terminal tüm yayını bekletmesin: en eski olay atılır
+                q.get_nowait()
+            q.put_nowait(message)
+
+
+def format_sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+bus = EventBus()
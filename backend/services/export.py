@@ -0,0 +1,171 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import DateTime, Float, Integer, select
+
+try:
+    from backend import models
+except ImportError:
+    import models
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+CHUNK_ROWS = 5000
+
+_T = models.Transaction
+_C = models.Customer
+_V = models.Vault
+_L = models.LedgerEntry
+
+# Her veri kümesi için (kolonlar, sıralama); satırlar ORM nesnesi olmadan düz tuple olarak okunur
+DATASETS = {
+    "transactions": (
+        [_T.id, _T.ts, _T.side, _T.symbol, _T.qty, _T.unit_price, _T.total_price, _T.payment_type,
+         _T.net_try, _T.customer_id, _T.product_id],
+        [_T.ts, _T.id],
+    ),
+    "customer_ledger": (
+        [_T.id, _T.ts, _T.customer_id, _C.full_name, _T.side, _T.symbol, _T.qty, _T.unit_price,
+         _T.total_price, _T.payment_type],
+        [_T.customer_id, _T.ts, _T.id],
+    ),
+    "customers": (
+        [_C.id, _C.full_name, _C.phone, _C.email, _C.balance_try, _C.balance_gold, _C.created_at],
+        [_C.id],
+    ),
+    "vault": (
+        [_V.symbol, _V.balance, _V.last_updated],
+        [_V.symbol],
+    ),
+    "ledger": (
+        [_L.id, _L.ts, _L.account, _L.symbol, _L.customer_id, _L.delta, _L.transaction_id, _L.source],
+        [_L.id],
+    ),
+}
+
+
+def build_query(dataset: str, ts_from: Optional[datetime] = None, ts_to: Optional[datetime] = None):
+    columns, order = DATASETS[dataset]
+    stmt = select(*columns)
+    if dataset == "customer_ledger":
+        stmt = stmt.join(_C, _C.id == _T.customer_id)
+    ts = {"transactions": _T.ts, "customer_ledger": _T.ts, "ledger": _L.ts}.get(dataset)
+    if ts is not None:
+        if ts_from:
+            stmt = stmt.where(ts >= ts_from)
+        if ts_to:
+            stmt = stmt.where(ts < ts_to)
+    return stmt.order_by(*order)
+
+
+def _chunks(db, stmt) -> Iterator[list]:
+    # Sunucu tarafı imleç (PostgreSQL) + parça parça okuma; ORM katmanı atlanır, satırlar düz tuple'dır
+    conn = db.connection().execution_options(stream_results=True, max_row_buffer=CHUNK_ROWS)
+    result = conn.execute(stmt)
+    try:
+        for part in result.partitions(CHUNK_ROWS):
+            yield part
+    finally:
+        result.close()
+
+
+def _csv(db, stmt, names) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(names)
+    for part in _chunks(db, stmt):
+        # Tarihler str() ile "YYYY-MM-DD HH:MM:SS" olarak yazılır
+        writer.writerows(part)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _ndjson(db, stmt, names) -> Iterator[bytes]:
+    for part in _chunks(db, stmt):
+        yield "".join(json.dumps(dict(zip(names, row)), ensure_ascii=False, default=str) + "\n"
+                      for row in part).encode("utf-8")
+
+
+class _Sink(io.RawIOBase):
+    """ParquetWriter'ın yazdığı baytları parça parça boşaltmak için"""
+
+    def __init__(self):
+        self.parts = []
+        self.pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.parts.append(bytes(b))
+        self.pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _arrow_schema(pa, columns):
+    # Şema ilk parçadan tahmin edilmez: tamamen boş bir kolon sonraki parçalarla çakışırdı
+    types = {Integer: pa.int64(), Float: pa.float64(), DateTime: pa.timestamp("us")}
+    return pa.schema([
+        (c.key, next((t for base, t in types.items() if isinstance(c.type, base)), pa.string()))
+        for c in columns
+    ])
+
+
+def _parquet(db, stmt, columns) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(pa, columns)
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema)
+    for part in _chunks(db, stmt):
+        # Her parça ayrı bir row group olarak yazılır
+        cols = zip(*part)
+        writer.write_table(pa.Table.from_arrays([pa.array(col, type=t) for col, t in zip(cols, schema.types)],
+                                                schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: gzip başlığıyla
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def stream(db, dataset: str, fmt: str, compress: bool = False,
+           ts_from: Optional[datetime] = None, ts_to: Optional[datetime] = None) -> Iterator[bytes]:
+    """Veri kümesini sabit bellekle, CHUNK_ROWS satırlık parçalar halinde seçilen formatta üretir"""
+    stmt = build_query(dataset, ts_from, ts_to)
+    columns = DATASETS[dataset][0]
+    if fmt == "parquet":
+        chunks = _parquet(db, stmt, columns)
+    else:
+        chunks = {"csv": _csv, "ndjson": _ndjson}[fmt](db, stmt, [c.key for c in columns])
+    return _gzip(chunks) if compress else chunks
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import nullcontext
+from typing import Callable, Optional, Tuple, Type
+
+# Toplu commit modu: GROUP_COMMIT=1 ile açılır (varsayılan kapalı, her istek kendi commit'ini yapar)
+GROUP_COMMIT = os.getenv("GROUP_COMMIT", "0") == "1"
+# Yoğunlukta aynı commit'e girmek için en fazla bu kadar beklenir
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "2"))
+GROUP_COMMIT_MAX = int(os.getenv("GROUP_COMMIT_MAX", "64"))
+
+_STOP = object()
+
+
+class GroupCommitter:
+    """
+    Eşzamanlı yazma isteklerini tek bir DB transaction'ında birleştirir: tek thread kuyruktan
+    gelenleri toplar, her birini kendi SAVEPOINT'inde uygular ve hepsini tek commit (tek fsync)
+    ile yazar. Çağıran, sonucunu ancak ortak commit tamamlandıktan sonra alır.
+
+    Bir isteğin hatası (örn. fazla satış) sadece kendi savepoint'ini geri alır, gruptaki diğerleri
+    yazılır. retry_on hataları (iyimser sürüm çakışması) savepoint geri alınıp yeniden denenir.
+    Tek yazar varken beklenmez; önceki grup birden fazla istek içeriyorsa pencere kadar beklenir.
+    """
+
+    def __init__(self, session_factory, apply: Callable, lock=None, begin: Optional[Callable] = None,
+                 window_ms: float = GROUP_COMMIT_WINDOW_MS, max_batch: int = GROUP_COMMIT_MAX,
+                 retry_on: Tuple[Type[BaseException], ...] = (), retries: int = 1):
+        self._session_factory = session_factory
+        self._apply = apply
+        self._lock = lock or nullcontext
+        # Transaction'ı açan çağrı (örn. SQLite'ta BEGIN IMMEDIATE); kilit alındıktan sonra çağrılır
+        self._begin = begin
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.retry_on = retry_on
+        self.retries = max(1, retries)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._last_size = 0
+        self.commits = 0
+        self.requests = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, *args):
+        """apply(db, *args) sonucunu ortak commit'ten sonra döner; apply'ın hatası burada yeniden fırlatılır"""
+        fut = Future()
+        self._queue.put((args, fut))
+        return fut.result()
+
+    def _collect(self, first):
+        batch = [first]
+        stop = False
+        wait = self.window if self._last_size > 1 else 0.0
+        deadline = time.monotonic() + wait
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect(first)
+            self._last_size = len(batch)
+            try:
+                self._commit(batch)
+            except Exception as e:
+                # Beklenmeyen hata committer'ı durdurmasın; bekleyenlere iletilir
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+            if stop:
+                return
+
+    def _apply_one(self, db, args):
+        for attempt in range(self.retries):
+            try:
+                with db.begin_nested():
+                    return self._apply(db, *args)
+            except self.retry_on:
+                db.expire_all()
+                if attempt == self.retries - 1:
+                    raise
+
+    def _commit(self, batch):
+        db = self._session_factory(expire_on_commit=False)
+        outcomes = []
+        try:
+            with self._lock():
+                try:
+                    if self._begin is not None:
+                        self._begin(db)
+                    for args, fut in batch:
+                        try:
+                            outcomes.append((fut, self._apply_one(db, args), None))
+                        except Exception as e:
+                            outcomes.append((fut, None, e))
+                    db.commit()
+                except Exception:
+                    # Sıradaki yazar açık transaction'a takılmasın diye kilit bırakılmadan geri alınır
+                    db.rollback()
+                    raise
+        except Exception as e:
+            for fut, _, error in outcomes:
+                fut.set_exception(error or e)
+            for _, fut in batch[len(outcomes):]:
+                fut.set_exception(e)
+            return
+        finally:
+            db.close()
+        self.commits += 1
+        self.requests += len(batch)
+        for fut, result, error in outcomes:
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(result)
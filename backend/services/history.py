@@ -0,0 +1,136 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+
+try:
+    from backend import models
+    from backend.database import begin_write, write_lock
+except ImportError:
+    import models
+    from database import begin_write, write_lock
+
+BUCKETS = ("minute", "hour", "day")
+
+_session_factory = None
+# Geçmiş yazımları tek işçi thread'inde sırayla yapılır. Fiyatı yayınlayan kod yazar kilidini
+# tutuyor olabilir (örn. /settings/ons); yazım aynı thread'de kilidi tekrar isteseydi kilitlenirdi.
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="price-history")
+
+
+def configure(session_factory):
+    global _session_factory
+    _session_factory = session_factory
+
+
+def bucket_start(ts: datetime, bucket: str) -> datetime:
+    if bucket == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if bucket == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if bucket == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Invalid bucket: {bucket}")
+
+
+def _instrument_ids(db, symbols) -> Dict[str, int]:
+    ids = {i.symbol: i.id for i in db.query(models.Instrument).filter(models.Instrument.symbol.in_(symbols))}
+    missing = [s for s in symbols if s not in ids]
+    if missing:
+        # Fiyatı gelen ama tanımı olmayan semboller (örn. TCMB'deki diğer dövizler) otomatik eklenir
+        db.execute(insert(models.Instrument), [{"symbol": s, "name": s} for s in missing])
+        ids.update({i.symbol: i.id for i in db.query(models.Instrument).filter(models.Instrument.symbol.in_(missing))})
+    return ids
+
+
+def record_snapshot(db, prices: Dict[str, Dict[str, Optional[float]]], ts: Optional[datetime] = None):
+    """
+    Snapshot'taki tüm fiyatları tek bir toplu INSERT ile tick tablosuna yazar,
+    dakika/saat/gün OHLC özetlerini artımlı olarak günceller. Tek commit yapılır.
+    """
+    # Geçmiş UTC olarak saklanır
+    ts = (ts or datetime.now(timezone.utc)).astimezone(timezone.utc).replace(tzinfo=None)
+    ids = _instrument_ids(db, list(prices.keys()))
+
+    ticks = []
+    for sym, p in prices.items():
+        for price_type in ("buy", "sell"):
+            val = p.get(price_type)
+            if val is not None:
+                ticks.append({"instrument_id": ids[sym], "price_type": price_type, "price": val, "ts": ts})
+    if not ticks:
+        return 0
+    db.execute(insert(models.Price), ticks)
+
+    for bucket in BUCKETS:
+        start = bucket_start(ts, bucket)
+        existing = {
+            (b.instrument_id, b.price_type): b
+            for b in db.query(models.PriceBar).filter(models.PriceBar.bucket == bucket, models.PriceBar.bucket_start == start)
+        }
+        new_bars = []
+        for t in ticks:
+            bar = existing.get((t["instrument_id"], t["price_type"]))
+            if bar:
+                bar.high = max(bar.high, t["price"])
+                bar.low = min(bar.low, t["price"])
+                bar.close = t["price"]
+                bar.count += 1
+            else:
+                new_bars.append({"instrument_id": t["instrument_id"], "price_type": t["price_type"], "bucket": bucket,
+                                 "bucket_start": start, "open": t["price"], "high": t["price"], "low": t["price"],
+                                 "close": t["price"], "count": 1})
+        if new_bars:
+            db.execute(insert(models.PriceBar), new_bars)
+    db.commit()
+    return len(ticks)
+
+
+def _record_safe(snap):
+    db = _session_factory()
+    try:
+        # İstek yazarlarıyla aynı kuyruğa girer (SQLite tek yazar)
+        with write_lock():
+            try:
+                begin_write(db)
+                record_snapshot(db, snap.as_dict())
+            except Exception:
+                db.rollback()
+                raise
+    except Exception as e:
+        print(f"Price history write error: {e}")
+    finally:
+        db.close()
+
+
+def on_snapshot(snap):
+    """prices servisinin dinleyicisi; DB yazımı çağıranı (event loop veya yazar kilidini tutan istek) bekletmez"""
+    if _session_factory is None or snap.stale:
+        return
+    _writer.submit(_record_safe, snap)
+
+
+def flush(timeout: Optional[float] = None):
+    """Kuyruktaki geçmiş yazımlarının bitmesini bekler (testler ve kapanış için)"""
+    _writer.submit(lambda: None).result(timeout)
+
+
+def query_bars(db, symbol: str, bucket: str, price_type: str, start: datetime, end: datetime) -> List[dict]:
+    bars = (
+        db.query(models.PriceBar)
+        .join(models.Instrument, models.Instrument.id == models.PriceBar.instrument_id)
+        .filter(
+            models.Instrument.symbol == symbol,
+            models.PriceBar.price_type == price_type,
+            models.PriceBar.bucket == bucket,
+            models.PriceBar.bucket_start >= start,
+            models.PriceBar.bucket_start < end,
+        )
+        .order_by(models.PriceBar.bucket_start)
+        .all()
+    )
+    return [
+        {"t": b.bucket_start.isoformat(), "open": b.open, "high": b.high, "low": b.low, "close": b.close, "count": b.count}
+        for b in bars
+    ]
@@ -0,0 +1,258 @@
+import csv
+import gzip
+import io
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+from sqlalchemy import insert, text
+
+try:
+    from backend import models, schemas
+    from backend.services import inventory, ledger, pnl, rollup
+    from backend.services.atomic import get_or_create, increment
+except ImportError:
+    import models, schemas
+    from services import inventory, ledger, pnl, rollup
+    from services.atomic import get_or_create, increment
+
+FORMATS = ("csv", "ndjson")
+CHUNK_ROWS = 5000
+# Rapor şişmesin diye sadece ilk hatalı satırlar ayrıntılı döner
+MAX_ERRORS = 100
+
+DATASETS = {
+    "products": (models.Product, schemas.ProductImport),
+    "customers": (models.Customer, schemas.CustomerImport),
+    "transactions": (models.Transaction, schemas.TransactionImport),
+}
+
+
+def _text(raw: IO[bytes]) -> IO[str]:
+    # .gz dosyası da doğrudan verilebilir (ilk iki bayt gzip imzası)
+    buffered = io.BufferedReader(raw) if not hasattr(raw, "peek") else raw
+    if buffered.peek(2)[:2] == b"\x1f\x8b":
+        buffered = gzip.GzipFile(fileobj=buffered, mode="rb")
+    return io.TextIOWrapper(buffered, encoding="utf-8-sig", newline="")
+
+
+def iter_rows(raw: IO[bytes], fmt: str) -> Iterator[Tuple[int, dict]]:
+    """Dosyayı satır satır (satır numarasıyla) okur; tamamı belleğe alınmaz"""
+    text = _text(raw)
+    if fmt == "csv":
+        for line, row in enumerate(csv.DictReader(text), start=2):
+            # CSV'de boş hücre "değer yok" demektir
+            yield line, {k: (v if v != "" else None) for k, v in row.items() if k}
+    else:
+        for line, raw_line in enumerate(text, start=1):
+            if raw_line.strip():
+                try:
+                    yield line, json.loads(raw_line)
+                except json.JSONDecodeError as e:
+                    # Bozuk satır tüm aktarımı durdurmaz, doğrulamada reddedilir
+                    yield line, e
+
+
+def _chunks(rows: Iterator[Tuple[int, dict]], size: int) -> Iterator[List[Tuple[int, dict]]]:
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _Import:
+    def __init__(self, db, dataset: str):
+        self.db = db
+        self.dataset = dataset
+        self.model, self.schema = DATASETS[dataset]
+        self.inserted = 0
+        self.rejected = 0
+        self.errors: List[Dict] = []
+        self.explicit_ids = False
+        # Tekil kolonlar (id dahil) ve dosyada şimdiye kadar görülen değerleri
+        table = self.model.__table__
+        unique = {c.name for c in table.columns if c.primary_key or c.unique}
+        unique |= {ix.columns[0].name for ix in table.indexes if ix.unique and len(ix.columns) == 1}
+        self.unique = sorted(unique & set(self.schema.model_fields))
+        self.seen: Dict[str, set] = defaultdict(set)
+        # Aktarılan en eski defter kaydının zamanı: bundan yeni snapshot'lar geçersizleşir
+        self.earliest: Optional[datetime] = None
+        # Bakiye önbelleğine en sonda tek seferde yansıtılacak toplamlar
+        self.balances: Dict[Tuple[str, str, Optional[int]], float] = defaultdict(float)
+        if dataset == "transactions":
+            self.customer_ids = {i for (i,) in db.query(models.Customer.id)}
+            self.product_ids = {i for (i,) in db.query(models.Product.id)}
+
+    def reject(self, line: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def validate(self, chunk) -> List[dict]:
+        checked = [(line, self._check(row)) for line, row in chunk]
+        taken = self._taken([values for _, values in checked if isinstance(values, dict)])
+        valid = []
+        for line, values in checked:
+            error = values if isinstance(values, str) else self._clash(values, taken)
+            if error:
+                self.reject(line, error)
+                continue
+            valid.append(values)
+        return valid
+
+    def _check(self, row) -> Union[dict, str]:
+        """Satırı şemayla doğrular; geçerliyse yazılacak değerleri, değilse hata metnini döner"""
+        if isinstance(row, json.JSONDecodeError):
+            return f"geçersiz JSON: {row.msg}"
+        try:
+            item = self.schema.model_validate(row)
+        except ValidationError as e:
+            return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+        values = item.model_dump()
+        # Verilmeyen id/oluşturma zamanı veritabanı tarafından üretilir
+        for key in ("id", "created_at"):
+            if key in values and values[key] is None:
+                del values[key]
+        if self.dataset == "transactions":
+            if values["customer_id"] and values["customer_id"] not in self.customer_ids:
+                return f"customer_id {values['customer_id']} bulunamadı"
+            if values["product_id"] and values["product_id"] not in self.product_ids:
+                return f"product_id {values['product_id']} bulunamadı"
+            if values["total_price"] is None:
+                values["total_price"] = values["qty"] * values["unit_price"]
+        return values
+
+    def _taken(self, rows: List[dict]) -> Dict[str, set]:
+        """Parçadaki tekil kolon değerlerinden veritabanında zaten olanlar (parça başına kolon başına tek sorgu)"""
+        taken = {}
+        for key in self.unique:
+            values = {r[key] for r in rows if r.get(key) is not None}
+            column = self.model.__table__.c[key]
+            taken[key] = {v for (v,) in self.db.query(column).filter(column.in_(values))} if values else set()
+        return taken
+
+    def _clash(self, values: dict, taken: Dict[str, set]) -> Optional[str]:
+        # Tekil kolon çakışması INSERT'te tüm aktarımı düşürmesin, satır olarak reddedilsin
+        for key in self.unique:
+            value = values.get(key)
+            if value is None:
+                continue
+            if value in taken[key]:
+                return f"{key} {value} zaten kayıtlı"
+            if value in self.seen[key]:
+                return f"{key} {value} dosyada tekrar ediyor"
+        for key in self.unique:
+            if values.get(key) is not None:
+                self.seen[key].add(values[key])
+        return None
+
+    def insert(self, rows: List[dict]):
+        # executemany aynı kolon kümesini ister: id'li ve id'siz satırlar ayrı gruplarda yazılır
+        groups = defaultdict(list)
+        for r in rows:
+            groups[tuple(sorted(r))].append(r)
+        for group in groups.values():
+            self._insert(group)
+        self.explicit_ids = self.explicit_ids or any("id" in r for r in rows)
+
+    def _insert(self, rows: List[dict]):
+        # ORM toplu INSERT yerine tablo düzeyinde executemany: RETURNING sonuçları parça parça
+        # birleştirilmez, satır başına ORM maliyeti olmaz
+        if self.dataset != "transactions":
+            self.db.execute(insert(self.model.__table__), rows)
+            self.inserted += len(rows)
+            return
+        # id'ler defter kayıtlarını işlemlere bağlamak için satır sırasıyla geri alınır
+        T = models.Transaction.__table__
+        ids = self.db.execute(insert(T).returning(T.c.id, sort_by_parameter_order=True), rows).scalars().all()
+        entries = []
+        for tx_id, r in zip(ids, rows):
+            for account, symbol, customer_id, delta in ledger.moves(
+                    r["side"], r["symbol"], r["qty"], r["total_price"], r["payment_type"], r["customer_id"]):
+                entries.append({"ts": r["ts"], "account": account, "symbol": symbol, "customer_id": customer_id,
+                                "delta": delta, "transaction_id": tx_id, "source": "import"})
+                self.balances[(account, symbol, customer_id)] += delta
+            if self.earliest is None or r["ts"] < self.earliest:
+                self.earliest = r["ts"]
+        if entries:
+            self.db.execute(insert(models.LedgerEntry.__table__), entries)
+        self.inserted += len(rows)
+
+    def reset_sequence(self):
+        # PostgreSQL'de id'leri dosyadan gelen kayıtlardan sonra yeni kayıtlar çakışmasın
+        if self.explicit_ids and self.db.bind.dialect.name == "postgresql":
+            table = self.model.__tablename__
+            self.db.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                 f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"))
+
+    def apply_balances(self):
+        """Kasa/cari önbelleğine hesap başına tek artış (satır başına güncelleme yok)"""
+        for (account, symbol, customer_id), delta in self.balances.items():
+            if account == ledger.VAULT:
+                row = get_or_create(self.db, models.Vault, {"symbol": symbol}, balance=0.0)
+                increment(row, "balance", delta)
+            else:
+                increment(self.db.get(models.Customer, customer_id),
+                          "balance_gold" if symbol == "GA" else "balance_try", delta)
+
+
+def run(db, dataset: str, raw: IO[bytes], fmt: str = "csv", chunk_rows: int = CHUNK_ROWS) -> Dict:
+    """
+    Ürün, müşteri veya işlem dosyasını parça parça doğrular ve toplu INSERT'lerle yazar.
+    Hatalı satırlar atlanır ve raporlanır; geçerli satırların hepsi tek DB transaction'ında yazılır.
+    İşlemlerde kasa/cari bakiyeleri sonda hesap başına bir kez güncellenir, günlük özet ve pozisyonlar
+    (ürünlerde stok toplamları) en sonda bir kez yeniden üretilir. Stok adetleri ürün dosyasındakidir;
+    geçmiş satışlar stoktan tekrar düşülmez.
+    """
+    job = _Import(db, dataset)
+    try:
+        for chunk in _chunks(iter_rows(raw, fmt), chunk_rows):
+            job.insert(job.validate(chunk))
+        job.apply_balances()
+        job.reset_sequence()
+        if job.earliest is not None:
+            ledger.drop_snapshots(db, job.earliest)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    rebuilt = []
+    if job.inserted and dataset == "transactions":
+        rollup.rebuild(db)
+        pnl.rebuild_positions(db)
+        rebuilt = ["daily_rollups", "positions", "ledger_snapshots"]
+        ledger.snapshot(db)
+    elif job.inserted and dataset == "products":
+        inventory.rebuild(db)
+        rebuilt = ["inventory_aggregates"]
+    return {"dataset": dataset, "inserted": job.inserted, "rejected": job.rejected,
+            "errors": job.errors, "rebuilt": rebuilt}
+
+
+if __name__ == "__main__":
+    # Kullanım: python -m backend.services.importer <products|customers|transactions> <dosya> [csv|ndjson]
+    import sys
+
+    try:
+        from backend.database import SessionLocal, begin_write, write_lock
+    except ImportError:
+        from database import SessionLocal, begin_write, write_lock
+    dataset, path = sys.argv[1], sys.argv[2]
+    fmt = sys.argv[3] if len(sys.argv) > 3 else ("ndjson" if ".ndjson" in path or ".jsonl" in path else "csv")
+    session = SessionLocal()
+    try:
+        with open(path, "rb") as f, write_lock():
+            begin_write(session)
+            report = run(session, dataset, f, fmt)
+        for err in report["errors"]:
+            print(f"line {err['line']}: {err['error']}")
+        print(f"{dataset}: {report['inserted']} inserted, {report['rejected']} rejected")
+    finally:
+        session.close()
@@ -0,0 +1,91 @@
+from typing import Dict, Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+try:
+    from backend import models
+    from backend.services.atomic import get_or_create, increment
+except ImportError:
+    import models
+    from services.atomic import get_or_create, increment
+
+
+def _group(db, category, purity) -> "models.InventoryAggregate":
+    category = category or ""
+    db.flush()
+    return get_or_create(db, models.InventoryAggregate, {"category": category, "purity": purity},
+                         qty=0, weight_has=0.0, labor_tl=0.0)
+
+
+def adjust(db, product: "models.Product", old_qty: int, new_qty: int):
+    """
+    Ürün stoğu old_qty'den new_qty'ye değiştiğinde toplamları günceller. Commit çağıranındır.
+    Kasa raporu sadece pozitif stoğu saydığı için eksiye düşen stok sıfır kabul edilir.
+    """
+    delta = max(new_qty or 0, 0) - max(old_qty or 0, 0)
+    if not delta:
+        return
+    row = _group(db, product.category, product.purity or 0.0)
+    increment(row, "qty", delta)
+    increment(row, "weight_has", (product.weight or 0.0) * (product.purity or 0.0) * delta)
+    increment(row, "labor_tl", (product.labor_cost or 0.0) * delta)
+
+
+def move_stock(db, product: "models.Product", delta: int) -> Optional[int]:
+    """
+    Ürün stoğunu tek bir koşullu UPDATE ile değiştirir ve toplamları günceller; yeni stoğu döner.
+    Çıkışta (delta < 0) stok yetmiyorsa hiçbir şey yazılmaz ve None döner (fazla satış koruması).
+    Kontrol ve düşüm aynı ifadede olduğu için eşzamanlı iki satış son ürünü ikisi birden satamaz.
+    """
+    P = models.Product
+    stmt = update(P).where(P.id == product.id)
+    if delta < 0:
+        stmt = stmt.where(P.stock_qty >= -delta)
+    new_qty = db.execute(stmt.values(stock_qty=P.stock_qty + delta).returning(P.stock_qty)
+                         .execution_options(synchronize_session=False)).scalar()
+    if new_qty is None:
+        return None
+    set_committed_value(product, "stock_qty", new_qty)
+    adjust(db, product, new_qty - delta, new_qty)
+    return new_qty
+
+
+def rebuild(db) -> int:
+    """Toplamları ürün tablosundan baştan hesaplar (mutabakat); grup sayısını döner"""
+    P = models.Product
+    category = func.coalesce(P.category, "")
+    rows = db.query(
+        category, P.purity, func.sum(P.stock_qty),
+        func.sum(P.weight * P.purity * P.stock_qty), func.sum(P.labor_cost * P.stock_qty),
+    ).filter(P.stock_qty > 0).group_by(category, P.purity).all()
+
+    db.query(models.InventoryAggregate).delete()
+    db.add_all(models.InventoryAggregate(category=c, purity=pur, qty=q or 0, weight_has=w or 0.0, labor_tl=l or 0.0)
+               for c, pur, q, w, l in rows)
+    db.commit()
+    return len(rows)
+
+
+def totals(db) -> Dict:
+    """Stoktaki toplam has ağırlık, işçilik ve kategori/ayar kırılımı"""
+    groups = db.query(models.InventoryAggregate).filter(models.InventoryAggregate.qty != 0).all()
+    return {
+        "total_weight_has": sum(g.weight_has for g in groups),
+        "total_labor_tl": sum(g.labor_tl for g in groups),
+        "groups": [{"category": g.category or "Ürün", "purity": g.purity, "qty": g.qty,
+                    "weight_has": round(g.weight_has, 3), "labor_tl": round(g.labor_tl, 2)} for g in groups],
+    }
+
+
+if __name__ == "__main__":
+    # Kullanım: python -m backend.services.inventory
+    try:
+        from backend.database import SessionLocal
+    except ImportError:
+        from database import SessionLocal
+    session = SessionLocal()
+    try:
+        print(f"inventory_aggregates rebuilt: {rebuild(session)} groups")
+    finally:
+        session.close()
@@ -0,0 +1,244 @@
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, insert
+
+try:
+    from backend import models
+    from backend.services.atomic import increment
+except ImportError:
+    import models
+    from services.atomic import increment
+
+VAULT = "vault"
+CUSTOMER = "customer"
+# Bu kadar saniyede bir (yeni kayıt varsa) snapshot alınır; geçmiş sorgusu en fazla bu aralığı toplar
+SNAPSHOT_INTERVAL = float(os.getenv("LEDGER_SNAPSHOT_INTERVAL", "3600"))
+
+_E = models.LedgerEntry
+_S = models.LedgerSnapshot
+
+Key = Tuple[str, str, Optional[int]]
+
+
+def _post(db, account: str, symbol: str, delta: float, customer_id: Optional[int],
+          transaction: Optional["models.Transaction"], source: str):
+    entry = models.LedgerEntry(account=account, symbol=symbol, customer_id=customer_id, delta=delta,
+                               transaction=transaction, source=source)
+    db.add(entry)
+    return entry
+
+
+def vault(db, row: "models.Vault", delta: float, transaction=None, source: str = "tx"):
+    """Kasa hareketini deftere ekler ve önbellekteki bakiyeyi atomik artışla günceller. Commit çağıranındır."""
+    if delta == 0:
+        return None
+    increment(row, "balance", delta)
+    return _post(db, VAULT, row.symbol, delta, None, transaction, source)
+
+
+def customer(db, cust: "models.Customer", symbol: str, delta: float, transaction=None, source: str = "tx"):
+    """Cari hareketini ("TRY" veya "GA") deftere ekler ve müşterinin bakiyesini günceller"""
+    if delta == 0:
+        return None
+    increment(cust, "balance_gold" if symbol == "GA" else "balance_try", delta)
+    return _post(db, CUSTOMER, "GA" if symbol == "GA" else "TRY", delta, cust.id, transaction, source)
+
+
+def moves(side: str, symbol: Optional[str], qty: float, total_price: Optional[float],
+          payment_type: Optional[str], customer_id: Optional[int]) -> List[Tuple[str, str, Optional[int], float]]:
+    """
+    Bir işlemin hesaplara etkisi: (hesap, sembol, müşteri, değişim) listesi. Kurallar add_tx ile
+    aynıdır (veresiye: cari + mal kasası, peşin: TL kasası + mal kasası); toplu aktarım bakiyeleri
+    satır satır nesne yüklemeden bununla hesaplar.
+    """
+    out = []
+    if payment_type == "Debt" and customer_id:
+        multiplier = 1 if side == "sell" else -1
+        if symbol == "GA":
+            out.append((CUSTOMER, "GA", customer_id, qty * multiplier))
+        else:
+            out.append((CUSTOMER, "TRY", customer_id, total_price * multiplier))
+        if symbol and symbol != "ÜRÜN" and symbol != "TRY":
+            out.append((VAULT, symbol, None, qty * (-multiplier)))
+    elif symbol and symbol != "ÜRÜN":
+        if side == "sell":
+            out += [(VAULT, "TRY", None, total_price), (VAULT, symbol, None, -qty)]
+        elif side == "buy":
+            out += [(VAULT, "TRY", None, -total_price), (VAULT, symbol, None, qty)]
+    elif symbol == "ÜRÜN" and side in ("buy", "sell"):
+        out.append((VAULT, "TRY", None, total_price if side == "sell" else -total_price))
+    return [m for m in out if m[3] != 0]
+
+
+def _sums(db, after_id: int = 0, upto_id: Optional[int] = None, at: Optional[datetime] = None) -> Dict[Key, float]:
+    q = db.query(_E.account, _E.symbol, _E.customer_id, func.sum(_E.delta)).filter(_E.id > after_id)
+    if upto_id is not None:
+        q = q.filter(_E.id <= upto_id)
+    if at is not None:
+        q = q.filter(_E.ts <= at)
+    return {(a, s, c): total or 0.0 for a, s, c, total in q.group_by(_E.account, _E.symbol, _E.customer_id)}
+
+
+def _snapshot_rows(db, entry_id: Optional[int]) -> Dict[Key, float]:
+    """
+    entry_id'deki snapshot'ın bakiyeleri. Snapshot'lar yalnızca değişen hesapları yazdığı için her
+    hesabın o snapshot'a kadarki en son satırı alınır.
+    """
+    if entry_id is None:
+        return {}
+    latest = (db.query(_S.account, _S.symbol, _S.customer_id, func.max(_S.entry_id).label("entry_id"))
+              .filter(_S.entry_id <= entry_id)
+              .group_by(_S.account, _S.symbol, _S.customer_id).subquery())
+    q = db.query(_S.account, _S.symbol, _S.customer_id, _S.balance).join(latest, and_(
+        _S.account == latest.c.account, _S.symbol == latest.c.symbol,
+        func.coalesce(_S.customer_id, 0) == func.coalesce(latest.c.customer_id, 0),
+        _S.entry_id == latest.c.entry_id))
+    return {(a, s, c): b for a, s, c, b in q}
+
+
+def _merge(base: Dict[Key, float], tail: Dict[Key, float]) -> Dict[Key, float]:
+    out = dict(base)
+    for key, delta in tail.items():
+        out[key] = out.get(key, 0.0) + delta
+    return out
+
+
+def snapshot(db) -> int:
+    """
+    Son snapshot'a ondan sonraki kayıtları ekleyerek yeni bir snapshot yazar (commit eder). Sadece
+    bakiyesi değişen hesaplar yazılır; diğerleri önceki snapshot'lardaki satırlarıyla geçerlidir.
+    Yeni kayıt yoksa bir şey yapmaz; yazılan hesap sayısını döner.
+    """
+    last = db.query(func.max(_S.entry_id)).scalar()
+    head = db.query(func.max(_E.id)).scalar()
+    if head is None or head == last:
+        return 0
+    # Geriye tarihli kayıtlar (toplu aktarım) olabileceği için snapshot zamanı kayıtların en yenisidir;
+    # böylece T anı sorgusu yalnızca tamamı T'den önce olan bir snapshot'tan başlar (ts indeksinden okunur)
+    ts = db.query(func.max(_E.ts)).scalar()
+    changed = _sums(db, after_id=last or 0, upto_id=head)
+    previous = _snapshot_rows(db, last)
+    balances = {key: previous.get(key, 0.0) + delta for key, delta in changed.items()}
+    db.execute(insert(models.LedgerSnapshot), [
+        {"entry_id": head, "ts": ts, "account": a, "symbol": s, "customer_id": c, "balance": b}
+        for (a, s, c), b in balances.items()
+    ])
+    db.commit()
+    return len(balances)
+
+
+def balances_at(db, at: datetime) -> Dict[Key, float]:
+    """
+    T anındaki tüm hesap bakiyeleri: T'den önceki son snapshot (indeksten tek arama) + ondan sonra
+    yazılmış, zamanı T'ye kadar olan kayıtlar. Taranan aralık bir sonraki snapshot'ta biter: onun
+    zamanı T'den sonradır ve ondan sonraki kayıtlar da daha yenidir (geriye tarihli aktarım
+    etkilenen snapshot'ları drop_snapshots ile siler).
+    """
+    checkpoint = db.query(func.max(_S.entry_id)).filter(_S.ts <= at).scalar()
+    upto = db.query(func.min(_S.entry_id)).filter(_S.entry_id > (checkpoint or 0)).scalar()
+    return _merge(_snapshot_rows(db, checkpoint), _sums(db, after_id=checkpoint or 0, upto_id=upto, at=at))
+
+
+def drop_snapshots(db, since: datetime) -> int:
+    """
+    Zamanı since ve sonrası olan snapshot'ları siler (commit çağıranındır). Geriye tarihli kayıt
+    yazan toplu aktarım bunu çağırır; yoksa o kayıtlar sonraki snapshot'larla sınırlanan geçmiş
+    sorgularında görünmezdi. Silinen satır sayısını döner.
+    """
+    return db.query(_S).filter(_S.ts >= since).delete(synchronize_session=False)
+
+
+def group(balances: Dict[Key, float]) -> Dict:
+    """balances_at çıktısını API biçimine çevirir: kasa sembolleri ve müşteri bazlı TL/has altın"""
+    out = {"vault": {}, "customers": {}}
+    for (account, symbol, customer_id), balance in sorted(balances.items(), key=lambda kv: (kv[0][0], kv[0][1], kv[0][2] or 0)):
+        if account == VAULT:
+            out["vault"][symbol] = round(balance, 6)
+        else:
+            out["customers"].setdefault(str(customer_id), {"TRY": 0.0, "GA": 0.0})[symbol] = round(balance, 6)
+    return out
+
+
+def bootstrap(db) -> int:
+    """
+    Defter boşken (eski veritabanı) mevcut bakiyeleri "opening" kaydı olarak yazar; böylece
+    defter toplamı önbellekle başlangıçtan itibaren tutarlıdır. Yazılan kayıt sayısını döner.
+    """
+    if db.query(_E.id).first():
+        return 0
+    rows = [{"account": VAULT, "symbol": v.symbol, "customer_id": None, "delta": v.balance}
+            for v in db.query(models.Vault).filter(models.Vault.balance != 0)]
+    for c in db.query(models.Customer).filter((models.Customer.balance_try != 0) | (models.Customer.balance_gold != 0)):
+        for symbol, balance in (("TRY", c.balance_try), ("GA", c.balance_gold)):
+            if balance:
+                rows.append({"account": CUSTOMER, "symbol": symbol, "customer_id": c.id, "delta": balance})
+    if rows:
+        now = datetime.now()
+        db.execute(insert(models.LedgerEntry), [dict(r, ts=now, source="opening") for r in rows])
+    db.commit()
+    return len(rows)
+
+
+def _cached(db) -> Dict[Key, float]:
+    out = {(VAULT, v.symbol, None): v.balance or 0.0 for v in db.query(models.Vault)}
+    for c in db.query(models.Customer):
+        out[(CUSTOMER, "TRY", c.id)] = c.balance_try or 0.0
+        out[(CUSTOMER, "GA", c.id)] = c.balance_gold or 0.0
+    return out
+
+
+def verify(db, tolerance: float = 1e-6) -> List[Dict]:
+    """Önbellekteki bakiyeleri defter toplamıyla karşılaştırır; uyuşmayan hesapları döner"""
+    ledger = _sums(db)
+    cached = _cached(db)
+    diffs = []
+    for key in sorted(set(ledger) | set(cached), key=lambda k: (k[0], k[1], k[2] or 0)):
+        expected, actual = ledger.get(key, 0.0), cached.get(key, 0.0)
+        if abs(expected - actual) > tolerance:
+            diffs.append({"account": key[0], "symbol": key[1], "customer_id": key[2],
+                          "ledger": expected, "cached": actual})
+    return diffs
+
+
+def rebuild_cache(db) -> int:
+    """Vault/Customer bakiyelerini defterden yeniden yazar (commit eder); düzeltilen hesap sayısını döner"""
+    diffs = verify(db)
+    for d in diffs:
+        if d["account"] == VAULT:
+            row = db.query(models.Vault).filter(models.Vault.symbol == d["symbol"]).first()
+            if row is None:
+                row = models.Vault(symbol=d["symbol"])
+                db.add(row)
+            row.balance = d["ledger"]
+        else:
+            cust = db.get(models.Customer, d["customer_id"])
+            if cust is not None:
+                setattr(cust, "balance_gold" if d["symbol"] == "GA" else "balance_try", d["ledger"])
+    db.commit()
+    return len(diffs)
+
+
+if __name__ == "__main__":
+    # Kullanım: python -m backend.services.ledger [snapshot|verify|rebuild]
+    import sys
+
+    try:
+        from backend.database import SessionLocal
+    except ImportError:
+        from database import SessionLocal
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    session = SessionLocal()
+    try:
+        if command == "snapshot":
+            print(f"ledger snapshot: {snapshot(session)} accounts")
+        elif command == "rebuild":
+            print(f"balance cache rebuilt: {rebuild_cache(session)} accounts corrected")
+        else:
+            diffs = verify(session)
+            for d in diffs:
+                print(d)
+            print(f"ledger verify: {len(diffs)} mismatches")
+    finally:
+        session.close()
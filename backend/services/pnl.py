@@ -1,3 +1,16 @@
+from itertools import islice
+from typing import Dict, Optional, Tuple
+
+try:
+    from backend import models
+    from backend.services import costbasis
+    from backend.services.atomic import get_or_create
+except ImportError:
+    import models
+    from services import costbasis
+    from services.atomic import get_or_create
+
+
 def calc_aom(transactions):
     """Average Opening Method ile P&L hesaplama"""
     qty_total = 0
@@ -25,3 +38,101 @@ def calc_aom(transactions):
         "cost_basis": cost_basis,
         "realized_pnl": realized_pnl
     }
+
+
+def apply_trade(qty: float, avg_cost: float, side: str, trade_qty: float, price: float) -> Tuple[float, float, float]:
+    """
+    Tek bir işlemi ortalama maliyet pozisyonuna uygular; (yeni miktar, yeni ortalama maliyet, gerçekleşen kar) döner.
+    Eldekinden fazla satışta sadece eldeki miktar kadar kar yazılır ve pozisyon sıfırlanır.
+    """
+    if side == "buy":
+        new_qty = qty + trade_qty
+        if new_qty > 0:
+            avg_cost = (qty * avg_cost + trade_qty * price) / new_qty
+        return new_qty, avg_cost, 0.0
+    if side == "sell":
+        matched = min(qty, trade_qty)
+        realized = matched * (price - avg_cost)
+        new_qty = qty - matched
+        return new_qty, (avg_cost if new_qty > 0 else 0.0), realized
+    return qty, avg_cost, 0.0
+
+
+def position_symbol(tx) -> str:
+    # Eski P&L raporuyla aynı eşleme: sembolsüz işlemler gram altın sayılır
+    return tx.symbol or "GA"
+
+
+def update_position(db, tx) -> Optional["models.Position"]:
+    """İşlemi sembolün pozisyonuna işler. Commit çağıranındır; işlemle aynı DB transaction'ında yazılır."""
+    if tx.side not in ("buy", "sell"):
+        return None
+    symbol = position_symbol(tx)
+    db.flush()
+    pos = get_or_create(db, models.Position, {"symbol": symbol}, qty=0.0, avg_cost=0.0, realized_pnl=0.0)
+    pos.qty, pos.avg_cost, realized = apply_trade(pos.qty, pos.avg_cost, tx.side, tx.qty or 0.0, tx.unit_price or 0.0)
+    pos.realized_pnl += realized
+    return pos
+
+
+def rebuild_positions(db, batch_size: int = 50000) -> int:
+    """
+    Pozisyon tablosunu işlem geçmişinden baştan üretir (denetim); hesap vektörel motorla yapılır.
+    Geçmiş yield_per ile parça parça okunur: her parça, önceki parçaların bıraktığı pozisyon
+    ortalama maliyetten bir açılış alışı olarak başına eklenerek hesaplanır.
+    """
+    T = models.Transaction
+    rows = iter(db.query(T.symbol, T.side, T.qty, T.unit_price)
+                .filter(T.side.in_(("buy", "sell"))).order_by(T.ts, T.id).yield_per(batch_size))
+    state: Dict[str, Dict[str, float]] = {}
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        opening = [(s, r["qty"], r["avg_cost"]) for s, r in state.items() if r["qty"] > 0]
+        symbol, side, qty, price = zip(*([(s, "buy", q, c) for s, q, c in opening] + [
+            (s or "GA", d, q or 0.0, p or 0.0) for s, d, q, p in batch]))
+        # Sorgu zaten zaman sırasında; motor aynı sırayı korur
+        for s, r in costbasis.compute(symbol, side, qty, price).items():
+            realized = state[s]["realized_avg"] if s in state else 0.0
+            state[s] = {"qty": r["qty"], "avg_cost": r["avg_cost"], "realized_avg": realized + r["realized_avg"]}
+
+    db.query(models.Position).delete()
+    db.add_all(models.Position(symbol=s, qty=r["qty"], avg_cost=r["avg_cost"], realized_pnl=r["realized_avg"])
+               for s, r in state.items())
+    db.commit()
+    return len(state)
+
+
+def position_report(positions, prices: Optional[Dict[str, Dict[str, float]]] = None) -> Dict:
+    """Pozisyonlardan gerçekleşen ve (fiyat verilirse) güncel alış fiyatına göre gerçekleşmemiş kar/zarar"""
+    rows = []
+    realized_total = unrealized_total = 0.0
+    for p in positions:
+        row = {"symbol": p.symbol, "qty": round(p.qty, 4), "avg_cost": round(p.avg_cost, 2),
+               "realized": round(p.realized_pnl, 2)}
+        realized_total += p.realized_pnl
+        if prices is not None:
+            m = prices.get(p.symbol, prices.get("GA", {"buy": 0}))
+            ref = m.get("buy") or 0
+            unrealized = p.qty * (ref - p.avg_cost)
+            row.update({"price": ref, "unrealized": round(unrealized, 2)})
+            unrealized_total += unrealized
+        rows.append(row)
+    report = {"realized": round(realized_total, 2), "positions": rows}
+    if prices is not None:
+        report["unrealized"] = round(unrealized_total, 2)
+    return report
+
+
+if __name__ == "__main__":
+    # Kullanım: python -m backend.services.pnl
+    try:
+        from backend.database import SessionLocal
+    except ImportError:
+        from database import SessionLocal
+    session = SessionLocal()
+    try:
+        print(f"positions rebuilt: {rebuild_positions(session)} symbols")
+    finally:
+        session.close()
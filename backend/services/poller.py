@@ -0,0 +1,60 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+
+from . import prices
+
+# Fiyat çekme aralığı, rastgele sapma ve hata sonrası bekleme ayarları (saniye)
+PRICE_POLL_INTERVAL = float(os.getenv("PRICE_POLL_INTERVAL", "60"))
+PRICE_POLL_JITTER = float(os.getenv("PRICE_POLL_JITTER", "5"))
+PRICE_POLL_BACKOFF = float(os.getenv("PRICE_POLL_BACKOFF", "5"))
+PRICE_POLL_MAX_BACKOFF = float(os.getenv("PRICE_POLL_MAX_BACKOFF", "600"))
+
+
+class PricePoller:
+    """
+    TCMB kurlarını sabit aralıklarla çekip snapshot olarak yayınlar.
+    İstek işleyicileri yayınlanan snapshot'ı okur, hiçbir istek TCMB'yi beklemez.
+    """
+
+    JOB_ID = "price_poll"
+
+    def __init__(self, interval: float = PRICE_POLL_INTERVAL, jitter: float = PRICE_POLL_JITTER,
+                 backoff: float = PRICE_POLL_BACKOFF, max_backoff: float = PRICE_POLL_MAX_BACKOFF):
+        self.interval = interval
+        self.jitter = jitter
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.scheduler = AsyncIOScheduler(timezone=timezone.utc)
+
+    def start(self):
+        # İlk çekim hemen yapılır, sonrası sabit aralıkla devam eder
+        self.scheduler.add_job(
+            self.tick, IntervalTrigger(seconds=self.interval, jitter=self.jitter or None),
+            id=self.JOB_ID, next_run_time=datetime.now(timezone.utc),
+            max_instances=1, coalesce=True,
+        )
+        self.scheduler.start()
+        prices.set_push_mode(True)
+
+    def shutdown(self):
+        prices.set_push_mode(False)
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+    def next_delay(self) -> float:
+        """Art arda hatalarda bekleme süresi üstel olarak büyür"""
+        return min(self.backoff * (2 ** (self.failures - 1)), self.max_backoff)
+
+    async def tick(self):
+        if await prices.refresh_snapshot():
+            self.failures = 0
+            return
+        self.failures += 1
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=self.next_delay())
+        job = self.scheduler.get_job(self.JOB_ID)
+        if job:
+            job.modify(next_run_time=retry_at)
@@ -1,96 +1,415 @@
 import httpx
 import xml.etree.ElementTree as ET
 import asyncio
-from typing import Dict, Any
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+from . import pricing
+from .breaker import CircuitBreaker
+
+try:
+    from backend import models
+    from backend.database import begin_write, write_lock
+except ImportError:
+    import models
+    from database import begin_write, write_lock
 
 TCMB_URL = "https://www.tcmb.gov.tr/kurlar/today.xml"
 
-async def fetch_prices_async() -> Dict[str, Any]:
+# Fiyat önbelleğinin geçerlilik süresi (saniye). .env içinden değiştirilebilir.
+PRICE_CACHE_TTL = float(os.getenv("PRICE_CACHE_TTL", "30"))
+TCMB_TIMEOUT = float(os.getenv("TCMB_TIMEOUT", "10"))
+# Art arda bu kadar hatadan sonra TCMB'ye istek atılmaz, son iyi fiyatlar kullanılır
+TCMB_BREAKER_THRESHOLD = int(os.getenv("TCMB_BREAKER_THRESHOLD", "3"))
+TCMB_BREAKER_RESET = float(os.getenv("TCMB_BREAKER_RESET", "60"))
+
+LAST_GOOD_KEY = "prices_last_good"
+# Son iyi fiyatlar tek bir arka plan thread'inde, sırayla yazılır; fiyat okuyucuları DB yazarlarını beklemez
+_store = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prices-last-good")
+
+
+@dataclass(frozen=True)
+class PriceSnapshot:
+    """Belirli bir anda çekilmiş kur/altın fiyatlarının değişmez kopyası"""
+    prices: Dict[str, Any]
+    fetched_at: datetime
+    monotonic_ts: float
+    source: str = "live"  # "live" | "last_good" | "fallback"
+    stale: bool = False
+
+    @property
+    def age(self) -> float:
+        """Snapshot'ın saniye cinsinden yaşı"""
+        return max(0.0, time.monotonic() - self.monotonic_ts)
+
+    def as_dict(self) -> Dict[str, Any]:
+        # Çağıranlar önbellekteki veriyi bozmasın diye kopya döner
+        return {sym: dict(p) for sym, p in self.prices.items()}
+
+
+# Süreç genelinde paylaşılan önbellek ve o an devam eden indirme
+_snapshot: Optional[PriceSnapshot] = None
+_inflight: Optional[asyncio.Task] = None
+# Arka plan poller'ı çalışırken istekler ağa hiç çıkmaz, yayınlanan snapshot'ı okur
+_push_mode = False
+# TCMB kesintisinde sunulacak son başarılı snapshot ve kalıcı saklama için DB oturumu
+_last_good: Optional[PriceSnapshot] = None
+_session_factory = None
+breaker = CircuitBreaker(TCMB_BREAKER_THRESHOLD, TCMB_BREAKER_RESET)
+
+# Uygulama ömrü boyunca açık kalan (keep-alive) HTTP istemcisi ve koşullu GET doğrulayıcıları
+_client: Optional[httpx.AsyncClient] = None
+_validators: Dict[str, str] = {}
+# Yeni fiyat geldiğinde haber verilecek dinleyiciler (geçmiş kaydı, terminal yayını vb.)
+_listeners: list = []
+# Son ayrıştırılan ham kur listesi (304 geldiğinde türev fiyatlar bundan yeniden hesaplanır)
+_last_raw: Optional[Dict[str, Any]] = None
+# Her çekimin süre ölçümleri (bağlantı, ilk bayt, XML ayrıştırma) grafik için saklanır
+fetch_metrics: deque = deque(maxlen=int(os.getenv("PRICE_METRICS_SIZE", "500")))
+
+
+def _fallback_prices() -> Dict[str, Any]:
+    # Fallback (Hata durumunda son fiyatlar veya sabitler)
+    return {
+        "USD": {"buy": 34.0, "sell": 34.5},
+        "EUR": {"buy": 37.0, "sell": 37.5},
+        "GA": {"buy": 3000.0, "sell": 3050.0}
+    }
+
+
+async def open_client():
+    """Lifespan başında çağrılır; tüm TCMB istekleri aynı bağlantı havuzunu kullanır"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=TCMB_TIMEOUT,
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=2, keepalive_expiry=300),
+        )
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class _FetchTimer:
+    """httpx trace olaylarından bağlantı ve ilk bayt (TTFB) sürelerini toplar"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+
+    async def __call__(self, event_name: str, info: dict):
+        self.marks[event_name] = time.perf_counter()
+
+    def span(self, started: str, complete: str) -> Optional[float]:
+        if started in self.marks and complete in self.marks:
+            return round((self.marks[complete] - self.marks[started]) * 1000, 2)
+        return None
+
+    def metrics(self) -> Dict[str, Any]:
+        tcp = self.span("connection.connect_tcp.started", "connection.connect_tcp.complete")
+        tls = self.span("connection.start_tls.started", "connection.start_tls.complete")
+        headers_done = [v for k, v in self.marks.items() if k.endswith("receive_response_headers.complete")]
+        return {
+            # Havuzdan hazır bağlantı kullanıldıysa connect_ms None olur
+            "connect_ms": round((tcp or 0) + (tls or 0), 2) if tcp is not None else None,
+            "ttfb_ms": round((headers_done[0] - self.start) * 1000, 2) if headers_done else None,
+        }
+
+
+async def _download_prices() -> Optional[Dict[str, Any]]:
     """
-    TCMB'den döviz kurlarını çeker ve altın fiyatını hesaplar.
-    Gelecekte buraya gerçek zamanlı altın API'leri entegre edilebilir.
+    TCMB'den ham döviz kurlarını çeker.
+    Dosya değişmediyse (304) ayrıştırma yapılmaz ve None döner.
     """
+    headers = {}
+    if _validators.get("etag"):
+        headers["If-None-Match"] = _validators["etag"]
+    if _validators.get("last_modified"):
+        headers["If-Modified-Since"] = _validators["last_modified"]
+
+    timer = _FetchTimer()
+    metric = {"ts": datetime.now(timezone.utc).isoformat(), "status": None, "parse_ms": None}
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(TCMB_URL, timeout=10.0)
-            resp.raise_for_status()
-            
-        root = ET.fromstring(resp.content)
-        prices = {}
-        
-        for currency in root.findall("Currency"):
-            code = currency.get("CurrencyCode")
-            buy = currency.find("ForexBuying")
-            sell = currency.find("ForexSelling")
+        if _client is not None:
+            resp = await _client.get(TCMB_URL, timeout=TCMB_TIMEOUT, headers=headers, extensions={"trace": timer})
+        else:
+            # Lifespan dışında (testler, senkron wrapper) tek seferlik istemci
+            async with httpx.AsyncClient() as client:
+                resp = await client.get(TCMB_URL, timeout=TCMB_TIMEOUT, headers=headers, extensions={"trace": timer})
+        metric["status"] = resp.status_code
+        if resp.status_code == 304:
+            return None
+        resp.raise_for_status()
+
+        parse_start = time.perf_counter()
+        prices = _parse_prices(resp.content)
+        metric["parse_ms"] = round((time.perf_counter() - parse_start) * 1000, 2)
+        _validators["etag"] = resp.headers.get("ETag")
+        _validators["last_modified"] = resp.headers.get("Last-Modified")
+        return prices
+    except Exception as e:
+        metric["error"] = str(e)
+        raise
+    finally:
+        metric.update(timer.metrics())
+        metric["total_ms"] = round((time.perf_counter() - timer.start) * 1000, 2)
+        fetch_metrics.append(metric)
+
+
+def _parse_prices(content: bytes) -> Dict[str, Any]:
+    root = ET.fromstring(content)
+    prices = {}
+
+    for currency in root.findall("Currency"):
+        code = currency.get("CurrencyCode")
+        buy = currency.find("ForexBuying")
+        sell = currency.find("ForexSelling")
+
+        try:
+            buy_val = float(buy.text.replace(",", ".")) if buy is not None and buy.text else None
+            sell_val = float(sell.text.replace(",", ".")) if sell is not None and sell.text else None
+        except Exception:
+            buy_val, sell_val = None, None
+
+        prices[code] = {"buy": buy_val, "sell": sell_val}
+
+    return prices
+
+
+def _make_snapshot(prices: Dict[str, Any], source: str = "live", fetched_at: Optional[datetime] = None) -> PriceSnapshot:
+    # Snapshot yayınlandıktan sonra hiçbir işleyici fiyatları değiştiremesin
+    frozen = MappingProxyType({sym: MappingProxyType(dict(p)) for sym, p in prices.items()})
+    now = datetime.now(timezone.utc)
+    fetched_at = fetched_at or now
+    # Kalıcı kayıttan gelen snapshot'ın yaşı gerçek çekilme zamanına göre hesaplanır
+    monotonic_ts = time.monotonic() - (now - fetched_at).total_seconds()
+    return PriceSnapshot(prices=frozen, fetched_at=fetched_at, monotonic_ts=monotonic_ts,
+                         source=source, stale=source != "live")
+
+
+def publish_snapshot(snap: PriceSnapshot):
+    """Yeni snapshot'ı tüm istek işleyicilerine görünür yapar"""
+    global _snapshot
+    _snapshot = snap
+
+
+def add_listener(callback):
+    """Fiyatlar değiştiğinde callback(snapshot) çağrılır"""
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+
+def remove_listener(callback):
+    if callback in _listeners:
+        _listeners.remove(callback)
 
+
+def _notify(snap: PriceSnapshot):
+    for callback in list(_listeners):
+        try:
+            callback(snap)
+        except Exception as e:
+            print(f"Price listener error: {e}")
+
+
+# --- SON İYİ FİYATLARIN KALICI SAKLANMASI (configs tablosu) ---
+def configure_store(session_factory):
+    """Son iyi fiyatların saklanacağı DB oturumunu bağlar ve varsa kayıtlı snapshot'ı yükler"""
+    global _session_factory, _last_good, _last_raw
+    _session_factory = session_factory
+    if session_factory is not None and _last_good is None:
+        _last_good = _load_last_good()
+        if _last_good is not None:
+            _last_raw = _last_good.as_dict()
+
+
+def _load_last_good() -> Optional[PriceSnapshot]:
+    db = _session_factory()
+    try:
+        cfg = db.query(models.Config).filter(models.Config.key == LAST_GOOD_KEY).first()
+        if not cfg or not cfg.value:
+            return None
+        data = json.loads(cfg.value)
+        _validators.update(data.get("validators") or {})
+        return _make_snapshot(data["prices"], fetched_at=datetime.fromisoformat(data["fetched_at"]))
+    except Exception as e:
+        print(f"Last good prices could not be loaded: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def _save_last_good(snap: PriceSnapshot):
+    db = _session_factory()
+    try:
+        with write_lock():
             try:
-                buy_val = float(buy.text.replace(",", ".")) if buy is not None and buy.text else None
-                sell_val = float(sell.text.replace(",", ".")) if sell is not None and sell.text else None
-            except Exception:
-                buy_val, sell_val = None, None
-
-            prices[code] = {"buy": buy_val, "sell": sell_val}
-
-        # Altın Fiyatı Hesaplama (Ons üzerinden simüle, 
-        # gerçekte bir altın API'sinden çekilmeli)
-        # Mevcut ons fiyatını varsayalım (Örn: 2750 USD)
-        current_ons_usd = 2750.00 
-        
-        if "USD" in prices and prices["USD"]["sell"]:
-            usd_try = prices["USD"]["sell"]
-            # 1 Ons = 31.1034768 gram
-            gram_has_gold = (current_ons_usd * usd_try) / 31.1034768
-            
-            # Farklı altın türleri için hesaplamalar
-            prices["GA"] = { # Gram Altın (24 Ayar)
-                "buy": round(gram_has_gold * 0.995, 2), # %0.5 makas
-                "sell": round(gram_has_gold * 1.005, 2)
-            }
-            prices["C22"] = { # 22 Ayar Bilezik (0.916 saflık)
-                "buy": round(gram_has_gold * 0.916 * 0.98, 2),
-                "sell": round(gram_has_gold * 0.916 * 1.02, 2)
-            }
-            prices["C14"] = { # 14 Ayar (0.585 saflık)
-                "buy": round(gram_has_gold * 0.585 * 0.97, 2),
-                "sell": round(gram_has_gold * 0.585 * 1.05, 2)
-            }
-
-            # --- ZİYNET ALTINLARI ---
-            # Ziynet altınları adet başı satılır. Ortalamaları Has altına endekslenir.
-            # Çeyrek (1.75g 22k -> 1.6065g Has)
-            base_ceyek_has = 1.6065
-            prices["CEYREK"] = {
-                "buy": round(gram_has_gold * base_ceyek_has * 0.98, 2),
-                "sell": round(gram_has_gold * base_ceyek_has * 1.02, 2)
-            }
-            # Yarım (2x Çeyrek = 3.213g Has)
-            prices["YARIM"] = {
-                "buy": round(gram_has_gold * base_ceyek_has * 2 * 0.98, 2),
-                "sell": round(gram_has_gold * base_ceyek_has * 2 * 1.02, 2)
-            }
-            # Tam - Ziynet Lira (4x Çeyrek = 6.426g Has)
-            prices["TAM"] = {
-                "buy": round(gram_has_gold * base_ceyek_has * 4 * 0.98, 2),
-                "sell": round(gram_has_gold * base_ceyek_has * 4 * 1.02, 2)
-            }
-            # Ata / Cumhuriyet (7.216g 22k -> 6.61g Has)
-            base_ata_has = 6.61
-            prices["ATA"] = {
-                "buy": round(gram_has_gold * base_ata_has * 0.98, 2),
-                "sell": round(gram_has_gold * base_ata_has * 1.02, 2)
-            }
+                begin_write(db)
+                _write_last_good(db, snap)
+            finally:
+                # Transaction kilit bırakılmadan kapanır (sıradaki yazar SQLITE_BUSY almaz)
+                db.close()
+    except Exception as e:
+        print(f"Last good prices could not be saved: {e}")
 
-        return prices
 
+def flush_store(timeout: Optional[float] = None):
+    """Kuyruktaki son iyi fiyat yazımının bitmesini bekler (testler ve kapanış için)"""
+    _store.submit(lambda: None).result(timeout)
+
+
+def _write_last_good(db, snap: PriceSnapshot):
+    cfg = db.query(models.Config).filter(models.Config.key == LAST_GOOD_KEY).first()
+    if not cfg:
+        cfg = models.Config(key=LAST_GOOD_KEY)
+        db.add(cfg)
+    cfg.value = json.dumps({"fetched_at": snap.fetched_at.isoformat(), "prices": snap.as_dict(),
+                            "validators": dict(_validators)})
+    db.commit()
+
+
+def _stale_snapshot() -> PriceSnapshot:
+    """TCMB'ye ulaşılamadığında son iyi fiyatları, o da yoksa sabit fiyatları döner"""
+    if _last_good is not None:
+        return replace(_last_good, source="last_good", stale=True)
+    return _make_snapshot(_fallback_prices(), source="fallback")
+
+
+async def _refresh() -> PriceSnapshot:
+    global _last_good, _last_raw
+    # Devre açıksa TCMB zaman aşımı beklenmez, anında eldeki fiyatlar sunulur
+    if not breaker.allow():
+        return _publish_stale()
+    try:
+        fresh = await _download_prices()
     except Exception as e:
         print(f"Error fetching prices: {e}")
-        # Fallback (Hata durumunda son fiyatlar veya sabitler)
-        return {
-            "USD": {"buy": 34.0, "sell": 34.5},
-            "EUR": {"buy": 37.0, "sell": 37.5},
-            "GA": {"buy": 3000.0, "sell": 3050.0}
-        }
+        breaker.record_failure()
+        return _publish_stale()
+    breaker.record_success()
+    changed = fresh is not None
+    if fresh is None:
+        if _last_raw is None:
+            # Elimizde içerik yokken 304 geldiyse doğrulayıcılar geçersizdir, tam indirme yapılır
+            _validators.clear()
+            return await _refresh()
+        # 304: dosya değişmedi, son kurlar yeniden doğrulanmış olarak kullanılır
+        fresh = _last_raw
+    _last_raw = fresh
+    # Altın ürünleri her güncellemede ürün tablosundan tek geçişte fiyatlanır
+    snap = _make_snapshot(pricing.derive(fresh))
+    publish_snapshot(snap)
+    _last_good = snap
+    if changed:
+        _notify(snap)
+        # Kalıcı kopya beklenmez: ortak indirmeyi bekleyen okuyucular yazar kuyruğuna (örn. uzun bir
+        # aktarım) takılmasın. 304'te içerik aynı olduğu için tekrar yazılmaz.
+        if _session_factory is not None:
+            _store.submit(_save_last_good, snap)
+    return snap
+
+
+def _publish_stale() -> PriceSnapshot:
+    snap = _stale_snapshot()
+    # Sabit (fallback) fiyatlar önbelleğe yazılmaz, bir sonraki istek tekrar dener
+    if snap.source == "last_good":
+        publish_snapshot(snap)
+    return snap
+
+
+def _clear_inflight(task: asyncio.Task):
+    global _inflight
+    if _inflight is task:
+        _inflight = None
+
+
+async def get_price_snapshot(max_age: Optional[float] = None) -> PriceSnapshot:
+    """
+    Önbellekteki snapshot taze ise ağa çıkmadan döner.
+    Aynı anda gelen istekler tek bir TCMB indirmesini paylaşır (single-flight).
+    """
+    ttl = PRICE_CACHE_TTL if max_age is None else max_age
+    snap = _snapshot
+    if snap is not None and (_push_mode or snap.age < ttl):
+        return snap
+    return await _shared_refresh()
+
+
+async def _shared_refresh() -> PriceSnapshot:
+    global _inflight
+    loop = asyncio.get_running_loop()
+    # fetch_prices() her çağrıda yeni bir event loop açar; başka loop'a ait görev beklenemez
+    if _inflight is None or _inflight.get_loop() is not loop:
+        _inflight = loop.create_task(_refresh())
+        _inflight.add_done_callback(_clear_inflight)
+    # Bekleyen istemci iptal edilse bile ortak indirme yarıda kalmasın
+    return await asyncio.shield(_inflight)
+
+
+def reprice():
+    """Ürün tablosu veya ons fiyatı değişince mevcut kurlarla altın fiyatlarını yeniden yayınlar"""
+    global _last_good
+    snap = _snapshot
+    if snap is None or _last_raw is None:
+        return
+    repriced = replace(_make_snapshot(pricing.derive(_last_raw), source=snap.source, fetched_at=snap.fetched_at),
+                       stale=snap.stale)
+    publish_snapshot(repriced)
+    if snap is _last_good:
+        _last_good = repriced
+    _notify(repriced)
+
+
+async def refresh_snapshot() -> bool:
+    """Poller için: TCMB'den yeni snapshot çeker, başarılıysa True döner"""
+    return (await _shared_refresh()).source == "live"
+
+
+def set_push_mode(enabled: bool):
+    global _push_mode
+    _push_mode = enabled
+
+
+def reset_cache():
+    """Önbelleği boşaltır (testler ve bakım işleri için)"""
+    global _snapshot, _inflight, _push_mode, _last_good, _session_factory, _last_raw
+    _snapshot = None
+    _last_raw = None
+    _inflight = None
+    _push_mode = False
+    _last_good = None
+    _session_factory = None
+    _validators.clear()
+    _listeners.clear()
+    fetch_metrics.clear()
+    breaker.reset()
+
+
+def status() -> Dict[str, Any]:
+    snap = _snapshot
+    return {
+        "breaker": breaker.status(),
+        "source": snap.source if snap else None,
+        "stale": snap.stale if snap else None,
+        "age": round(snap.age, 1) if snap else None,
+        "fetched_at": snap.fetched_at.isoformat() if snap else None,
+    }
+
+
+async def fetch_prices_async() -> Dict[str, Any]:
+    return (await get_price_snapshot()).as_dict()
 
 # Senkron wrapper (Geriye dönük uyumluluk için)
 def fetch_prices():
-    return asyncio.run(fetch_prices_async())
\ No newline at end of file
+    return asyncio.run(fetch_prices_async())
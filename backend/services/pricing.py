@@ -0,0 +1,107 @@
+import os
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Any, Iterable, Optional
+
+try:
+    from backend import models
+except ImportError:
+    import models
+
+# 1 Ons = 31.1034768 gram
+GRAMS_PER_OUNCE = 31.1034768
+ONS_CONFIG_KEY = "ons_usd"
+
+
+@dataclass(frozen=True)
+class InstrumentSpec:
+    symbol: str
+    name: str
+    has_gram: float     # Birim başına gram (ziynette has karşılığı)
+    purity: float       # Saflık (0.916 - 22k, 0.585 - 14k, has için 1.0)
+    buy_spread: float   # Alış makası (0.02 = %2 aşağı)
+    sell_spread: float  # Satış makası (0.02 = %2 yukarı)
+
+
+# Varsayılan ürün tablosu; ilk açılışta instruments tablosuna yazılır
+DEFAULT_INSTRUMENTS = (
+    InstrumentSpec("GA", "Gram Altın (24 Ayar)", 1.0, 1.0, 0.005, 0.005),
+    InstrumentSpec("C22", "22 Ayar Bilezik", 1.0, 0.916, 0.02, 0.02),
+    InstrumentSpec("C14", "14 Ayar", 1.0, 0.585, 0.03, 0.05),
+    # Ziynet altınları adet başı satılır. Ortalamaları Has altına endekslenir.
+    InstrumentSpec("CEYREK", "Çeyrek", 1.6065, 1.0, 0.02, 0.02),  # 1.75g 22k -> 1.6065g Has
+    InstrumentSpec("YARIM", "Yarım", 3.213, 1.0, 0.02, 0.02),     # 2x Çeyrek
+    InstrumentSpec("TAM", "Tam", 6.426, 1.0, 0.02, 0.02),         # 4x Çeyrek
+    InstrumentSpec("ATA", "Ata", 6.61, 1.0, 0.02, 0.02),          # 7.216g 22k -> 6.61g Has
+)
+
+
+class PricingTable:
+    """
+    Türev altın ürünlerini sütun bazlı tutar. Çarpanlar tablo yüklenirken bir kez hesaplanır,
+    her fiyat güncellemesinde tüm ürünler tek geçişte fiyatlanır.
+    """
+
+    def __init__(self, specs: Iterable[InstrumentSpec]):
+        specs = list(specs)
+        self.symbols = tuple(s.symbol for s in specs)
+        self.buy_factors = array("d", (s.has_gram * s.purity * (1 - s.buy_spread) for s in specs))
+        self.sell_factors = array("d", (s.has_gram * s.purity * (1 + s.sell_spread) for s in specs))
+
+    def price(self, gram_has_gold: float) -> Dict[str, Dict[str, float]]:
+        buys = [round(gram_has_gold * f, 2) for f in self.buy_factors]
+        sells = [round(gram_has_gold * f, 2) for f in self.sell_factors]
+        return {sym: {"buy": b, "sell": s} for sym, b, s in zip(self.symbols, buys, sells)}
+
+
+_table = PricingTable(DEFAULT_INSTRUMENTS)
+# Gerçek zamanlı altın API'si bağlanana kadar ons fiyatı ayardan okunur (Örn: 2750 USD)
+_ons_usd = float(os.getenv("GOLD_ONS_USD", "2750"))
+
+
+def ons_usd() -> float:
+    return _ons_usd
+
+
+def derive(prices: Dict[str, Any]) -> Dict[str, Any]:
+    """Kur listesine altın ürünlerinin alış/satış fiyatlarını ekleyip yeni bir sözlük döner"""
+    out = dict(prices)
+    usd = prices.get("USD") or {}
+    if usd.get("sell"):
+        gram_has_gold = (_ons_usd * usd["sell"]) / GRAMS_PER_OUNCE
+        out.update(_table.price(gram_has_gold))
+    return out
+
+
+def spec_from_row(row) -> InstrumentSpec:
+    return InstrumentSpec(row.symbol, row.name or row.symbol, row.has_gram, row.purity or 1.0,
+                          row.buy_spread or 0.0, row.sell_spread or 0.0)
+
+
+def load_table(db):
+    """instruments tablosunu okuyup fiyatlama tablosunu yeniler; eksik varsayılanları ekler"""
+    global _table, _ons_usd
+    rows = {r.symbol: r for r in db.query(models.Instrument).all()}
+    added = False
+    for spec in DEFAULT_INSTRUMENTS:
+        if spec.symbol not in rows:
+            row = models.Instrument(symbol=spec.symbol, name=spec.name, has_gram=spec.has_gram, purity=spec.purity,
+                                    buy_spread=spec.buy_spread, sell_spread=spec.sell_spread)
+            db.add(row)
+            rows[spec.symbol] = row
+            added = True
+    if added:
+        db.commit()
+
+    # has_gram tanımlı olmayan kayıtlar (örn. döviz) türev ürün değildir
+    _table = PricingTable(spec_from_row(r) for r in rows.values() if r.has_gram)
+
+    cfg = db.query(models.Config).filter(models.Config.key == ONS_CONFIG_KEY).first()
+    if cfg and cfg.value:
+        _ons_usd = float(cfg.value)
+
+
+def set_ons_usd(value: Optional[float]):
+    global _ons_usd
+    if value:
+        _ons_usd = float(value)
@@ -0,0 +1,125 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, insert
+
+try:
+    from backend import models
+    from backend.services.atomic import get_or_create, increment
+    from backend.services.shopday import shop_day
+except ImportError:
+    import models
+    from services.atomic import get_or_create, increment
+    from services.shopday import shop_day
+
+
+def _key(day: date, symbol: Optional[str], side: str, payment_type: Optional[str]):
+    # NULL'lar tekil anahtarı bozmasın diye boş metin olarak saklanır
+    return day, symbol or "", side, payment_type or ""
+
+
+def apply(db, tx: "models.Transaction"):
+    """İşlemi günlük özete ekler. Commit çağıranındır; işlemle aynı DB transaction'ında yazılır."""
+    day, symbol, side, payment_type = _key(shop_day(tx.ts), tx.symbol, tx.side, tx.payment_type)
+    # Aynı oturumda henüz yazılmamış özet satırları da bulunsun (oturumlar autoflush=False)
+    db.flush()
+    row = get_or_create(db, models.DailyRollup,
+                        {"day": day, "symbol": symbol, "side": side, "payment_type": payment_type},
+                        qty=0.0, total_price=0.0, count=0)
+    increment(row, "qty", tx.qty or 0.0)
+    increment(row, "total_price", tx.total_price or 0.0)
+    increment(row, "count", 1)
+    return row
+
+
+def rebuild(db, batch_size: int = 5000) -> int:
+    """Özet tablosunu işlem geçmişinden baştan üretir; yazılan satır sayısını döner"""
+    T = models.Transaction
+    sums: Dict[tuple, list] = defaultdict(lambda: [0.0, 0.0, 0])
+    rows = db.query(T.ts, T.symbol, T.side, T.payment_type, T.qty, T.total_price).yield_per(batch_size)
+    for ts, symbol, side, payment_type, qty, total_price in rows:
+        if ts is None:
+            continue
+        acc = sums[_key(shop_day(ts), symbol, side, payment_type)]
+        acc[0] += qty or 0.0
+        acc[1] += total_price or 0.0
+        acc[2] += 1
+
+    db.execute(delete(models.DailyRollup))
+    if sums:
+        db.execute(insert(models.DailyRollup), [
+            {"day": day, "symbol": symbol, "side": side, "payment_type": payment_type,
+             "qty": qty, "total_price": total, "count": count}
+            for (day, symbol, side, payment_type), (qty, total, count) in sums.items()
+        ])
+    db.commit()
+    return len(sums)
+
+
+def volume(db, start: date, end: Optional[date] = None) -> Dict[str, float]:
+    """[start, end] günleri arasındaki alış/satış hacmi (TL)"""
+    R = models.DailyRollup
+    q = db.query(R.side, func.sum(R.total_price)).filter(R.day >= start)
+    if end is not None:
+        q = q.filter(R.day <= end)
+    return {side: total or 0.0 for side, total in q.group_by(R.side)}
+
+
+def symbol_sales(db, start: date, end: Optional[date] = None) -> Dict[str, float]:
+    """Sembol bazlı satış tutarları (vitrin ürünleri hariç)"""
+    R = models.DailyRollup
+    q = db.query(R.symbol, func.sum(R.total_price)).filter(
+        R.side == "sell", R.day >= start, R.symbol != "", R.symbol != "ÜRÜN")
+    if end is not None:
+        q = q.filter(R.day <= end)
+    return {symbol: total or 0.0 for symbol, total in q.group_by(R.symbol)}
+
+
+def daily_series(db, start: date, end: date) -> List[Dict]:
+    """Gün gün alış/satış tutarları ve işlem adedi (işlem olmayan günler 0)"""
+    R = models.DailyRollup
+    rows = db.query(R.day, R.side, func.sum(R.total_price), func.sum(R.count)) \
+        .filter(R.day >= start, R.day <= end).group_by(R.day, R.side).all()
+    by_day = {}
+    for day, side, total, count in rows:
+        d = by_day.setdefault(day, {"buy": 0.0, "sell": 0.0, "count": 0})
+        if side in ("buy", "sell"):
+            d[side] += total or 0.0
+        d["count"] += count or 0
+    out = []
+    for i in range((end - start).days + 1):
+        day = start + timedelta(days=i)
+        d = by_day.get(day, {"buy": 0.0, "sell": 0.0, "count": 0})
+        out.append({"day": day.isoformat(), "buy": round(d["buy"], 2), "sell": round(d["sell"], 2), "count": d["count"]})
+    return out
+
+
+def day_summary(db, day: date, prices: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    """Günün işlem adedi ve güncel alış fiyatına göre kar/zararı (/reports/daily ile aynı formül)"""
+    R = models.DailyRollup
+    rows = db.query(R.symbol, R.side, func.sum(R.qty), func.sum(R.total_price), func.sum(R.count)) \
+        .filter(R.day == day).group_by(R.symbol, R.side).all()
+    profit = 0.0
+    count = 0
+    for symbol, side, qty, total, n in rows:
+        m = prices.get(symbol or "GA", prices.get("GA", {"buy": 0}))
+        ref = m.get("buy") or 0
+        # Satış: tutar - referans değer, alış: referans değer - tutar
+        diff = (total or 0.0) - ref * (qty or 0.0)
+        profit += diff if side == "sell" else -diff
+        count += n or 0
+    return {"profit": round(profit, 2), "tx_count": count}
+
+
+if __name__ == "__main__":
+    # Kullanım: python -m backend.services.rollup
+    try:
+        from backend.database import SessionLocal
+    except ImportError:
+        from database import SessionLocal
+    session = SessionLocal()
+    try:
+        print(f"daily_rollups rebuilt: {rebuild(session)} rows")
+    finally:
+        session.close()
@@ -0,0 +1,129 @@
+from typing import Dict, List
+
+from sqlalchemy import and_, bindparam, event, or_, select, text, update
+
+try:
+    from backend import models
+    from backend.services.turkish import customer_key, query_terms
+except ImportError:
+    import models
+    from services.turkish import customer_key, query_terms
+
+FTS_TABLE = "customers_fts"
+SEARCH_LIMIT = 20
+
+_C = models.Customer
+
+# SQLite: search_key üzerinde dış içerikli (veriyi tekrar saklamayan) FTS5 indeksi; tetikleyicilerle güncel tutulur.
+# prefix seçeneği 1-3 harflik önekleri ayrıca indeksler, yazarken yapılan aramalar tam taramaya düşmez.
+_SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "search_key, content='customers', content_rowid='id', prefix='1 2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON customers BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, search_key) VALUES (new.id, new.search_key); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON customers BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_key) VALUES ('delete', old.id, old.search_key); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_key ON customers BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_key) VALUES ('delete', old.id, old.search_key); "
+    f"INSERT INTO {FTS_TABLE}(rowid, search_key) VALUES (new.id, new.search_key); END",
+]
+# PostgreSQL: trigram GIN indeksi kelime içi LIKE aramalarını da indeksten karşılar
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_customers_search_trgm ON customers USING gin (search_key gin_trgm_ops)",
+]
+
+
+def _fts5_available(connection) -> bool:
+    options = {row[0] for row in connection.exec_driver_sql("PRAGMA compile_options")}
+    return "ENABLE_FTS5" in options
+
+
+def _has_fts(connection) -> bool:
+    return connection.exec_driver_sql(
+        f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{FTS_TABLE}'").first() is not None
+
+
+@event.listens_for(models.Customer.__table__, "after_create")
+def _create_index(table, connection, **kw):
+    # Yeni veritabanı: tablo boş olduğu için indeksin yeniden üretilmesi gerekmez
+    if connection.dialect.name == "sqlite" and _fts5_available(connection):
+        for ddl in _SQLITE_DDL:
+            connection.exec_driver_sql(ddl)
+
+
+@event.listens_for(models.Customer.__table__, "before_drop")
+def _drop_index(table, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def _backfill(connection) -> int:
+    """Arama anahtarı olmayan (kolondan önce eklenmiş) müşterileri doldurur"""
+    T = _C.__table__
+    rows = [{"_id": i, "_key": customer_key(name, phone)}
+            for i, name, phone in connection.execute(
+                select(T.c.id, T.c.full_name, T.c.phone).where(T.c.search_key.is_(None)))]
+    if rows:
+        connection.execute(update(T).where(T.c.id == bindparam("_id")).values(search_key=bindparam("_key")), rows)
+    return len(rows)
+
+
+def setup(engine) -> str:
+    """
+    Mevcut veritabanında arama indeksini hazırlar (açılışta çağrılır, tekrar çağrılması zararsızdır).
+    Kullanılacak yöntemi döner: "fts5", "trigram" veya (indeks kurulamazsa) "like".
+    """
+    with engine.begin() as conn:
+        _backfill(conn)
+        if conn.dialect.name == "sqlite" and _fts5_available(conn):
+            created = not _has_fts(conn)
+            for ddl in _SQLITE_DDL:
+                conn.exec_driver_sql(ddl)
+            if created:
+                # Dış içerikli tablo mevcut müşterilerden doldurulur
+                conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            return "fts5"
+    if engine.dialect.name == "postgresql":
+        try:
+            with engine.begin() as conn:
+                for ddl in _POSTGRES_DDL:
+                    conn.exec_driver_sql(ddl)
+            return "trigram"
+        except Exception as e:
+            # Örn. pg_trgm eklentisini kurma yetkisi yok: arama indekssiz LIKE ile çalışır
+            print(f"Customer search index could not be created: {e}")
+    return "like"
+
+
+def _row(r) -> Dict:
+    return {"id": r.id, "full_name": r.full_name, "phone": r.phone,
+            "balance_try": r.balance_try, "balance_gold": r.balance_gold}
+
+
+def customers(db, q: str, limit: int = SEARCH_LIMIT) -> List[Dict]:
+    """
+    Ad veya telefonla müşteri arar: her terim bir kelimenin başıyla eşleşmeli (sırası önemsiz),
+    Türkçe harf ve büyük/küçük farkı gözetilmez ("işık" = "IŞIK" = "isik").
+    Boş aramada ada göre ilk kayıtlar döner.
+    """
+    terms = query_terms(q)
+    cols = (_C.id, _C.full_name, _C.phone, _C.balance_try, _C.balance_gold)
+    if not terms:
+        return [_row(r) for r in db.query(*cols).order_by(_C.full_name, _C.id).limit(limit)]
+
+    if db.bind.dialect.name == "sqlite" and _has_fts(db.connection()):
+        # Terimler fold() sonrası sadece harf/rakamdır; FTS sorgu sözdizimine karışamaz.
+        # Geniş öneklerde (örn. "a") tüm eşleşmeleri puanlayıp sıralamak yerine ilk `limit` eşleşme alınır
+        # ve ada göre sıralanır; kullanıcı yazmaya devam ettikçe liste zaten daralır.
+        match = " ".join(f'"{t}"*' for t in terms)
+        rows = db.execute(text(
+            f"SELECT c.id, c.full_name, c.phone, c.balance_try, c.balance_gold "
+            f"FROM {FTS_TABLE} JOIN customers c ON c.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :match LIMIT :limit"), {"match": match, "limit": limit})
+        return sorted((_row(r) for r in rows), key=lambda r: (r["full_name"] or "", r["id"]))
+
+    # PostgreSQL'de pg_trgm indeksinden, diğerlerinde tarayarak: kelime başı = anahtarın başı veya boşluktan sonrası
+    K = _C.search_key
+    cond = and_(*(or_(K.like(f"{t}%"), K.like(f"% {t}%")) for t in terms))
+    return [_row(r) for r in db.query(*cols).filter(cond).order_by(_C.full_name, _C.id).limit(limit)]
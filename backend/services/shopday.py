@@ -0,0 +1,26 @@
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+# Gün sınırları dükkanın saat dilimine göre çizilir (sunucu UTC'de çalışsa bile)
+SHOP_TZ = ZoneInfo(os.getenv("SHOP_TZ", "Europe/Istanbul"))
+
+
+def today() -> date:
+    return datetime.now(SHOP_TZ).date()
+
+
+def shop_day(ts: datetime) -> date:
+    """Sunucu yerel saatiyle (naive) saklanan işlem zamanının dükkan günü"""
+    return ts.astimezone(SHOP_TZ).date()
+
+
+def shop_day_bounds(day: Optional[date] = None):
+    """Dükkan gününün [başlangıç, bitiş) aralığını işlemlerin saklandığı yerel saatle döner"""
+    if day is None:
+        day = today()
+    start = datetime.combine(day, time.min, tzinfo=SHOP_TZ)
+    end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=SHOP_TZ)
+    # Transaction.ts sunucunun yerel saatiyle (datetime.now) naive saklanır
+    return start.astimezone().replace(tzinfo=None), end.astimezone().replace(tzinfo=None)
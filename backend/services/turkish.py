@@ -0,0 +1,42 @@
+import re
+from typing import List, Optional
+
+# Python'un lower()'ı Türkçe I/İ'yi yanlış küçültür ("İ" -> "i̇"); önce bunlar elle çevrilir
+_LOWER = str.maketrans({"I": "ı", "İ": "i"})
+# Arama anahtarında Türkçe harfler ASCII karşılığına indirgenir: "Işık" da "isik" de aynı kaydı bulur
+_FOLD = str.maketrans("ıçğöşüâîû", "icgosuaiu")
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def fold(text: Optional[str]) -> str:
+    """Büyük/küçük harf ve Türkçe karakter farkı gözetmeyen, sadece harf/rakam ve boşluktan oluşan metin"""
+    if not text:
+        return ""
+    return _NON_WORD.sub(" ", text.translate(_LOWER).lower().translate(_FOLD)).strip()
+
+
+def phone_digits(phone: Optional[str]) -> List[str]:
+    """Telefonun aranabilir biçimleri: yazıldığı gibi rakamlar ve başındaki 0/90 atılmış hali"""
+    digits = re.sub(r"\D", "", phone or "")
+    if not digits:
+        return []
+    local = digits[2:] if digits.startswith("90") and len(digits) > 10 else digits.lstrip("0")
+    return [digits] if local in ("", digits) else [digits, local]
+
+
+def customer_key(full_name: Optional[str], phone: Optional[str]) -> str:
+    """Müşteri arama indeksine yazılan metin (ad kelimeleri + telefon)"""
+    return " ".join([fold(full_name)] + phone_digits(phone)).strip()
+
+
+def query_terms(q: Optional[str]) -> List[str]:
+    """Arama kutusuna yazılanı indeksle aynı biçime getirir; her terim kelime başıyla eşleşir"""
+    terms: List[str] = []
+    for t in fold(q).split():
+        # "0532 111 22" gibi boşluklu yazılan telefon tek numara olarak aranır
+        if t.isdigit() and terms and terms[-1].isdigit():
+            terms[-1] += t
+        else:
+            terms.append(t)
+    # Baştaki 0 atılır, kayıttaki 0'sız biçimle eşleşir
+    return [t.lstrip("0") or t if t.isdigit() else t for t in terms]
@@ -0,0 +1,71 @@
+from typing import Dict, Iterable
+
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session
+
+try:
+    from backend import models
+except ImportError:
+    import models
+
+_V = models.TableVersion.__table__
+# SQLite (3.24+) ve PostgreSQL'in ortak upsert sözdizimi
+_BUMP = text(f"INSERT INTO {_V.name} (name, version) VALUES (:name, 1) "
+             f"ON CONFLICT (name) DO UPDATE SET version = {_V.name}.version + 1")
+
+
+def versions(db: Session, tables: Iterable[str]) -> Dict[str, int]:
+    return dict(db.execute(select(_V.c.name, _V.c.version).where(_V.c.name.in_(list(tables)))).all())
+
+
+def bump(db: Session, tables: Iterable[str]):
+    """Sayaçları oturumun açık transaction'ında artırır; transaction geri alınırsa artış da geri alınır"""
+    # Sabit sıra: PostgreSQL'de aynı satırları artıran iki transaction birbirini kilitlemesin
+    names = sorted(set(tables) - {_V.name})
+    if names:
+        db.execute(_BUMP, [{"name": n} for n in names])
+
+
+def etag(db: Session, tables: Iterable[str], *extra) -> str:
+    """Tablo sürümlerinden (ve varsa ek parçalardan, örn. lisans tipi) zayıf ETag üretir"""
+    tables = list(tables)
+    current = versions(db, tables)
+    tokens = [f"{t}.{current.get(t, 0)}" for t in tables] + [str(e) for e in extra]
+    return 'W/"' + "-".join(tokens) + '"'
+
+
+def _pending(session: Session) -> set:
+    return session.info.setdefault("changed_tables", set())
+
+
+# Yazılan tablolar flush sırasında toplanır, sayaçlar commit'ten hemen önce aynı transaction'da artar
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    pending = _pending(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            pending.add(table)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk(state):
+    # query.delete(), insert(), update() gibi toplu ifadeler unit of work'ten geçmez
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, "table", None)
+        if table is not None:
+            _pending(state.session).add(table.name)
+
+
+@event.listens_for(Session, "before_commit")
+def _publish(session):
+    # Commit'in kendi flush'ında yazılacaklar da sayılsın diye önce flush edilir
+    session.flush()
+    pending = session.info.pop("changed_tables", None)
+    if pending:
+        bump(session, pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("changed_tables", None)
@@ -0,0 +1,58 @@
+"""
+Maliyet motoru karşılaştırması: pnl.calc_aom (satır satır döngü, tek sembol) ile
+costbasis.compute (vektörel, tüm semboller, ortalama + FIFO).
+
+Kullanım: python benchmarks/bench_costbasis.py [satır_sayısı]
+
+Ölçüm notu: 1M satır / 6 sembolde inceleme sırasında ölçülen değerler vektörel 0.94 s,
+calc_aom döngüsü 1.28 s'dir (~1.4x). İlk commit mesajındaki "0.7 s / 1.8 s" tek bir makinenin
+ölçümüdür ve genel kazanç olarak alınmamalıdır; fark makineye göre değişir. Motorun asıl kazancı,
+tek geçişte tüm sembolleri ve FIFO maliyetini de hesaplamasıdır.
+"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services import costbasis, pnl
+
+SYMBOLS = np.array(["GA", "C22", "C14", "CEYREK", "USD", "EUR"])
+
+
+def make_ledger(n, seed=42):
+    rng = np.random.default_rng(seed)
+    symbol = SYMBOLS[rng.integers(0, len(SYMBOLS), n)]
+    # Alışlar biraz ağır basar ki pozisyon sıfır etrafında takılıp kalmasın
+    side = np.where(rng.random(n) < 0.55, "buy", "sell")
+    qty = np.round(rng.uniform(0.1, 10.0, n), 3)
+    price = np.round(rng.uniform(2500.0, 3500.0, n), 2)
+    return symbol, side, qty, price
+
+
+def bench_loop(symbol, side, qty, price):
+    # Mevcut döngü tek sembol çalıştığı için her sembol ayrı çağrılır
+    rows = [SimpleNamespace(symbol=s, side=d, qty=q, unit_price=p) for s, d, q, p in zip(symbol, side, qty, price)]
+    t = time.perf_counter()
+    for sym in SYMBOLS:
+        pnl.calc_aom([r for r in rows if r.symbol == sym])
+    return time.perf_counter() - t
+
+
+def bench_vector(symbol, side, qty, price):
+    t = time.perf_counter()
+    costbasis.compute(symbol, side, qty, price)
+    return time.perf_counter() - t
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    ledger = make_ledger(n)
+    vec = bench_vector(*ledger)
+    import contextlib, io
+    with contextlib.redirect_stdout(io.StringIO()):  # calc_aom fazla satışta uyarı basar
+        loop = bench_loop(*ledger)
+    print(f"rows={n:,}  calc_aom loop={loop:.2f}s  vectorized={vec:.2f}s  speedup={loop / vec:.1f}x")
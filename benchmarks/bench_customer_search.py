@@ -0,0 +1,57 @@
+"""
+Müşteri arama gecikmesi: N müşterili veritabanında yazarken arama (önek) sorgularının p50/p99 süresi.
+FTS5 indeksiyle search.customers ile indekssiz LIKE taramasını (eski tam liste yerine en iyi
+ihtimalle yapılabilecek) karşılaştırır.
+
+Kullanım: python benchmarks/bench_customer_search.py [müşteri_sayısı]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("TESTING", "1")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import sessionmaker
+
+from backend import database, models
+from backend.services import search
+
+FIRST = ["Ahmet", "Mehmet", "Ayşe", "Fatma", "İsmail", "Işıl", "Çağrı", "Gül", "Şükrü", "Özge", "Ümit", "Ali"]
+LAST = ["Yılmaz", "Kaya", "Demir", "Şahin", "Çelik", "Yıldız", "Öztürk", "Aydın", "Özdemir", "Arslan", "Doğan"]
+QUERIES = ["ah", "ahm", "işı", "ISIL", "çağ", "yıl", "ayşe ka", "öz", "özdem", "0532", "5321", "mehmet dem", "zz"]
+
+
+def timed(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        for q in QUERIES:
+            t = time.perf_counter()
+            fn(q)
+            samples.append(time.perf_counter() - t)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.99)] * 1000
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    eng = database.make_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    database.Base.metadata.create_all(eng)
+    Session = sessionmaker(bind=eng, autoflush=False)
+    rnd = random.Random(1)
+    with Session() as db:
+        db.execute(insert(models.Customer.__table__), [
+            {"full_name": f"{rnd.choice(FIRST)} {rnd.choice(LAST)} {i}", "phone": f"0532{i:07d}"} for i in range(n)])
+        db.commit()
+
+    with Session() as db:
+        p50, p99 = timed(lambda q: search.customers(db, q), 20)
+        print(f"{n} müşteri, FTS5:      p50 {p50:6.2f} ms  p99 {p99:6.2f} ms")
+        db.execute(text(f"DROP TABLE {search.FTS_TABLE}"))
+        p50, p99 = timed(lambda q: search.customers(db, q), 3)
+        print(f"{n} müşteri, LIKE tarama: p50 {p50:6.2f} ms  p99 {p99:6.2f} ms")
+    eng.dispose()
@@ -0,0 +1,75 @@
+"""
+Satış yazma yolu: istek başına commit ile toplu commit (GroupCommitter) karşılaştırması.
+1, 8 ve 32 eşzamanlı yazar için p50/p99 gecikme ve saniyedeki işlem sayısını raporlar.
+
+Ölçüm endpoint'lerin kullandığı main._commit_txs üzerinden yapılır (HTTP katmanı hariç).
+Her commit'in diske yazıldığı (fsync) durumu ölçmek için varsayılan SQLITE_SYNCHRONOUS=FULL'dur.
+
+Kullanım: python benchmarks/bench_group_commit.py [yazar_başına_satış]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+
+os.environ.setdefault("SQLITE_SYNCHRONOUS", "FULL")
+os.environ.setdefault("TESTING", "1")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy.orm import sessionmaker
+
+import backend.main as main
+from backend import database, schemas
+
+WRITERS = (1, 8, 32)
+SALE = schemas.TransactionCreate(side="sell", symbol="CEYREK", qty=1.0, unit_price=5000.0,
+                                 total_price=5000.0, payment_type="Cash")
+
+
+def run(group, writers, per_writer):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    eng = database.make_engine(f"sqlite:///{path}", pool_size=writers + 2)
+    database.Base.metadata.create_all(eng)
+    Session = sessionmaker(bind=eng, autoflush=False)
+    if group:
+        main.start_group_commit(Session)
+    latencies = []
+
+    def writer():
+        own = []
+        for _ in range(per_writer):
+            t = time.perf_counter()
+            with Session() as db:
+                # get_tx_db ile aynı: toplu commit kapalıyken istek yazar kuyruğunu kendisi tutar
+                with (database.write_lock() if main.committer is None else nullcontext()):
+                    main._commit_txs(db, [SALE], [None])
+            own.append(time.perf_counter() - t)
+        latencies.extend(own)
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    commits = main.committer.commits if group else len(latencies)
+    main.stop_group_commit()
+    eng.dispose()
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return statistics.median(latencies) * 1000, p99 * 1000, len(latencies) / elapsed, commits
+
+
+if __name__ == "__main__":
+    per_writer = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    print(f"yazar başına {per_writer} satış, synchronous={database.SQLITE_SYNCHRONOUS}")
+    print(f"{'mod':10s} {'yazar':>5s} {'p50 ms':>8s} {'p99 ms':>8s} {'işlem/sn':>9s} {'commit':>7s}")
+    for writers in WRITERS:
+        for name, group in (("istek", False), ("toplu", True)):
+            p50, p99, tps, commits = run(group, writers, per_writer)
+            print(f"{name:10s} {writers:5d} {p50:8.2f} {p99:8.2f} {tps:9.0f} {commits:7d}")
@@ -0,0 +1,67 @@
+"""
+Toplu aktarım hızı: N satırlık geçmiş işlem dosyası (NDJSON) üretilip importer.run ile yazılır.
+Saniyedeki satır sayısını ve süreç boyunca en yüksek bellek kullanımını (RSS) raporlar;
+dosya parça parça okunduğu için bellek satır sayısıyla büyümemelidir.
+
+Kullanım: python benchmarks/bench_import.py [satır_sayısı]
+"""
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("TESTING", "1")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy.orm import sessionmaker
+
+from backend import database, models
+from backend.services import importer
+
+
+def write_history(path, n, customers):
+    start = datetime(2024, 1, 1)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            debt = i % 5 == 0
+            f.write(json.dumps({
+                "ts": (start + timedelta(minutes=7 * i)).isoformat(),
+                "side": "sell" if i % 3 else "buy",
+                "symbol": ("GA", "CEYREK", "USD")[i % 3],
+                "qty": 1.0 + i % 4,
+                "unit_price": 3000.0,
+                "payment_type": "Debt" if debt else "Cash",
+                "customer_id": 1 + i % customers if debt else None,
+            }) + "\n")
+
+
+def peak_rss_mb():
+    # Linux'ta KB, macOS'ta bayt cinsinden
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    tmp = tempfile.mkdtemp()
+    eng = database.make_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+    database.Base.metadata.create_all(eng)
+    Session = sessionmaker(bind=eng, autoflush=False)
+
+    with Session() as db:
+        db.add_all([models.Customer(full_name=f"Müşteri {i}", phone=f"555-{i}") for i in range(100)])
+        db.commit()
+    path = os.path.join(tmp, "history.ndjson")
+    write_history(path, n, 100)
+    print(f"{n} satır, dosya {os.path.getsize(path) / 1e6:.1f} MB, başlangıç RSS {peak_rss_mb():.0f} MB")
+
+    with Session() as db, open(path, "rb") as f:
+        t = time.perf_counter()
+        report = importer.run(db, "transactions", f, "ndjson")
+        elapsed = time.perf_counter() - t
+    print(f"{report['inserted']} satır {elapsed:.1f} sn ({report['inserted'] / elapsed:.0f} satır/sn), "
+          f"en yüksek RSS {peak_rss_mb():.0f} MB")
+    eng.dispose()
@@ -0,0 +1,89 @@
+"""
+Eşzamanlı terminal yükü altında SQLite yazma hızı: varsayılan profil (rollback journal,
+synchronous=FULL, kuyruk yok) ile üretim profili (WAL + pragma'lar + tek yazar kuyruğu).
+
+Her yazar thread'i bir satış yazar (işlem + kasa güncellemesi, tek commit); okuyucular aynı
+anda kasa toplamını okur. "locked" sütunu "database is locked" ile düşen yazma sayısıdır.
+
+Kullanım: python benchmarks/bench_sqlite_writes.py [yazar_sayısı] [yazar_başına_satış]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend import database, models
+
+READERS = 2
+
+
+def run(tuned, writers, per_writer):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    eng = database.make_engine(f"sqlite:///{path}", tuned=tuned, pool_size=writers + READERS)
+    if not tuned:
+        # Eski profil: pysqlite'ın varsayılan 5 sn beklemesi yerine kilitte hemen hata
+        database.event.listen(eng, "connect", lambda c, r: c.execute("PRAGMA busy_timeout=100"))
+    database.Base.metadata.create_all(eng)
+    Session = sessionmaker(bind=eng, autoflush=False)
+    with Session() as db:
+        db.add(models.Vault(symbol="TRY", balance=0.0))
+        db.commit()
+
+    lock = database.write_lock if tuned else nullcontext
+    counts = {"ok": 0, "locked": 0, "reads": 0}
+    done = threading.Event()
+
+    def writer():
+        for _ in range(per_writer):
+            with lock(), Session() as db:
+                try:
+                    db.add(models.Transaction(side="sell", symbol="GA", qty=1.0, unit_price=3000.0,
+                                              total_price=3000.0, payment_type="Cash", ts=datetime.now()))
+                    v = db.query(models.Vault).filter(models.Vault.symbol == "TRY").first()
+                    v.balance += 3000.0
+                    db.commit()
+                    counts["ok"] += 1
+                except OperationalError:
+                    db.rollback()
+                    counts["locked"] += 1
+
+    def reader():
+        while not done.is_set():
+            with Session() as db:
+                db.query(func.sum(models.Vault.balance)).scalar()
+                counts["reads"] += 1
+
+    readers = [threading.Thread(target=reader) for _ in range(READERS)]
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    for t in readers:
+        t.start()
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for t in readers:
+        t.join()
+    eng.dispose()
+    return counts, elapsed
+
+
+if __name__ == "__main__":
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_writer = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(f"{writers} yazar x {per_writer} satış, {READERS} okuyucu")
+    for name, tuned in (("varsayılan", False), ("üretim (WAL + kuyruk)", True)):
+        counts, elapsed = run(tuned, writers, per_writer)
+        print(f"{name:24s} {counts['ok'] / elapsed:8.0f} yazma/sn  locked={counts['locked']:5d}  "
+              f"{counts['reads'] / elapsed:8.0f} okuma/sn  ({elapsed:.2f} sn)")
@@ -17,7 +17,43 @@ if os.path.exists(db_path):
         print("Added net_try column")
     except sqlite3.OperationalError as e:
         print(f"net_try error: {e}")
+
+    # Sonradan eklenen kolonlar (tablo, kolon, tip)
+    new_columns = [
+        ("instruments", "has_gram", "FLOAT"),
+        ("instruments", "purity", "FLOAT DEFAULT 1.0"),
+        ("instruments", "buy_spread", "FLOAT DEFAULT 0.0"),
+        ("instruments", "sell_spread", "FLOAT DEFAULT 0.0"),
+        ("transactions", "idempotency_key", "VARCHAR"),
+        ("positions", "version", "INTEGER NOT NULL DEFAULT 1"),
+        ("customers", "search_key", "VARCHAR"),
+    ]
+    for table, column, ddl in new_columns:
+        try:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+            print(f"Added {table}.{column} column")
+        except sqlite3.OperationalError as e:
+            print(f"{table}.{column} error: {e}")
         
+    # Sonradan eklenen indeksler (mevcut tablolarda create_all bunları oluşturmaz)
+    new_indexes = [
+        ("ix_prices_instrument_ts", "prices", "instrument_id, price_type, ts"),
+        ("ix_transactions_ts_id", "transactions", "ts, id"),
+        ("ix_transactions_symbol_ts", "transactions", "symbol, ts"),
+        ("ix_transactions_customer_ts", "transactions", "customer_id, ts"),
+        ("ix_transactions_product_ts", "transactions", "product_id, ts"),
+        ("ix_ledger_snapshots_entry", "ledger_snapshots", "entry_id"),
+    ]
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_transactions_idempotency_key ON transactions (idempotency_key)")
+    # (ts, id) indeksiyle gereksizleşen eski indeks
+    cur.execute("DROP INDEX IF EXISTS ix_transactions_ts")
+    for name, table, cols in new_indexes:
+        try:
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})")
+            print(f"Index {name} ready")
+        except sqlite3.OperationalError as e:
+            print(f"{name} error: {e}")
+
     conn.commit()
     conn.close()
     print("DB migration check complete.")
@@ -7,6 +7,8 @@ import requests, threading, time
 from tkinter import messagebox, ttk
 
 from frontend.core.config import API_URL, apply_theme
+from frontend.core.stream import iter_events
+from frontend.core.outbox import Outbox
 from frontend.views.dashboard import DashboardMixin
 from frontend.views.boss import BossMixin
 from frontend.views.analytics import AnalyticsMixin
@@ -77,6 +79,8 @@ class KuyumcuProApp(ctk.CTk, DashboardMixin, BossMixin, AnalyticsMixin, Inventor
         self.customers_list = []
         self.cust_map = {}
         self.boss_unlocked = False
+        # Kapanan satışlar önce yerel kuyruğa yazılır, sunucuya arka planda gönderilir
+        self.outbox = Outbox()
         self.sidebar = ctk.CTkFrame(self, width=220, corner_radius=0)
         self.sidebar.grid(row=0, column=0, sticky='nsew')
         ctk.CTkLabel(self.sidebar, text='KUYUMCU PRO AI', font=ctk.CTkFont(size=22, weight='bold')).pack(pady=30)
@@ -225,18 +229,50 @@ class KuyumcuProApp(ctk.CTk, DashboardMixin, BossMixin, AnalyticsMixin, Inventor
             pass
 
     def start_loops(self):
-    
+        # Fiyat ve kasa değişiklikleri sunucudan itilir (SSE); akış koparsa
+        # bir kez yoklayıp artan beklemeyle yeniden bağlanılır.
+
+        def poll_once():
+            raw_prices = requests.get(f'{API_URL}/prices', timeout=2).json()
+            self.after(0, lambda: self.update_price_widgets(raw_prices))
+            self.after(0, self.refresh_valuation)
+            self.after(0, self.check_ai)
+
+        def on_event(event, data):
+            if event == 'prices':
+                self.after(0, lambda: self.update_price_widgets(data))
+                # Kasa değerlemesi fiyatla değişir: fiyat olayında da yenilenir
+                self.after(0, self.refresh_valuation)
+                self.after(0, self.check_ai)
+            elif event in ('vault', 'transaction', 'stock', 'margins'):
+                self.after(0, self.refresh_valuation)
+                self.after(0, self.check_ai)
+
         def loop():
+            delay = 1
             while True:
                 try:
-                    raw_prices = requests.get(f'{API_URL}/prices', timeout=2).json()
-                    self.after(0, lambda: self.update_price_widgets(raw_prices))
-                    self.after(0, self.refresh_valuation)
-                    self.after(0, self.check_ai)
+                    for event, data in iter_events(f'{API_URL}/events/stream'):
+                        delay = 1
+                        on_event(event, data)
                 except Exception as e:
-                    print(f'Background loop error: {e}')
-                time.sleep(15)
+                    print(f'Event stream error: {e}')
+                    try:
+                        poll_once()
+                    except Exception as e:
+                        print(f'Background loop error: {e}')
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
         threading.Thread(target=loop, daemon=True).start()
+        self.outbox.run(on_sent=lambda: self.after(0, self.refresh_after_sale),
+                        on_failed=lambda n: self.after(0, lambda: self.refresh_outbox_badge(n, warn=True)))
+
+    def refresh_after_sale(self):
+        self.refresh_boss_data()
+        self.refresh_vault()
+        self.refresh_stock()
+        self.refresh_repo_tx()
+        self.refresh_cust()
 
     def update_price_widgets(self, prices):
         for s, (lb, ls) in self.p_widgets.items():
@@ -0,0 +1,29 @@
+import threading
+
+import requests
+
+# url -> (ETag, son gövde, başlıklar); sunucu 304 dönerse liste yeniden indirilmez
+_cache = {}
+_lock = threading.Lock()
+
+
+def cached_get(url, params=None, timeout=5, with_headers=False):
+    """ETag/If-None-Match ile GET; veri değişmediyse önceki JSON'u döner"""
+    key = (url, tuple(sorted((params or {}).items())))
+    with _lock:
+        etag, body, resp_headers = _cache.get(key, (None, None, {}))
+    headers = {'If-None-Match': etag} if etag else {}
+    r = requests.get(url, params=params, headers=headers, timeout=timeout)
+    if not (r.status_code == 304 and body is not None):
+        body = r.json()
+        resp_headers = r.headers
+        new_tag = r.headers.get('ETag')
+        if isinstance(new_tag, str):
+            with _lock:
+                _cache[key] = (new_tag, body, resp_headers)
+    return (body, resp_headers) if with_headers else body
+
+
+def clear():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,129 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import requests
+
+from frontend.core.config import API_URL
+
+# Sunucu hatasıyla (5xx) bu kadar kez reddedilen sepet kuyruğu tıkamasın diye kenara alınır
+MAX_SERVER_ERRORS = 20
+# Terminal kapansa bile bekleyen sepetler kaybolmasın diye yerel SQLite dosyasında tutulur
+OUTBOX_PATH = os.getenv('KUYUMCU_OUTBOX', os.path.join(os.path.expanduser('~'), '.kuyumcu_pro', 'outbox.db'))
+
+
+class Outbox:
+    """
+    Kapanmış satışların sunucuya gönderim kuyruğu. Kasiyer ağı beklemez: sepet önce diske yazılır,
+    arka planda sırayla gönderilir. Her sepetin sabit bir Idempotency-Key'i olduğu için tekrar
+    gönderim kasada çift hareket oluşturmaz.
+    """
+
+    def __init__(self, path=OUTBOX_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._draining = threading.Lock()
+        self._wake = threading.Event()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS outbox ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE, payload TEXT, '
+                         'created_at REAL, attempts INTEGER DEFAULT 0, last_error TEXT, failed INTEGER DEFAULT 0)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:  # başarıda commit, hatada rollback
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, items):
+        key = uuid.uuid4().hex
+        with self._lock, self._connect() as conn:
+            conn.execute('INSERT INTO outbox (key, payload, created_at) VALUES (?, ?, ?)',
+                         (key, json.dumps({'items': items}), time.time()))
+        self._wake.set()
+        return key
+
+    def pending(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM outbox WHERE failed = 0').fetchone()[0]
+
+    def failed(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT key, payload, last_error FROM outbox WHERE failed = 1 ORDER BY id').fetchall()
+
+    def failed_count(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM outbox WHERE failed = 1').fetchone()[0]
+
+    def retry(self, key):
+        """Reddedilen sepeti (örn. eksik bilgi sunucuda düzeltildikten sonra) yeniden gönderim sırasına alır"""
+        with self._lock, self._connect() as conn:
+            conn.execute('UPDATE outbox SET failed = 0, attempts = 0, last_error = NULL WHERE key = ?', (key,))
+        self._wake.set()
+
+    def discard(self, key):
+        with self._lock, self._connect() as conn:
+            conn.execute('DELETE FROM outbox WHERE key = ?', (key,))
+
+    def drain(self, timeout=5):
+        """Bekleyenleri sırayla gönderir; sunucuya ulaşılamazsa durur. Gönderilen sepet sayısını döner."""
+        sent = 0
+        # Aynı anda tek gönderim döngüsü çalışır (aynı sepet iki kez yollanmasın). Dosya kilidi ise sadece
+        # SQLite okuma/yazmaları boyunca tutulur: ağ beklerken kasiyerin enqueue'su bloklanmaz.
+        with self._draining:
+            with self._lock, self._connect() as conn:
+                rows = conn.execute('SELECT id, key, payload, attempts FROM outbox WHERE failed = 0 ORDER BY id').fetchall()
+            for row_id, key, payload, attempts in rows:
+                try:
+                    r = requests.post(f'{API_URL}/transactions/batch', data=payload, timeout=timeout,
+                                      headers={'Idempotency-Key': key, 'Content-Type': 'application/json'})
+                except requests.RequestException as e:
+                    self._mark(row_id, str(e))
+                    break
+                if r.status_code == 200:
+                    with self._lock, self._connect() as conn:
+                        conn.execute('DELETE FROM outbox WHERE id = ?', (row_id,))
+                    sent += 1
+                elif 400 <= r.status_code < 500:
+                    # Tekrar denemekle düzelmeyecek hata: kuyruğu tıkamasın, incelemek için saklanır
+                    self._mark(row_id, f'{r.status_code}: {r.text}', failed=True)
+                else:
+                    self._mark(row_id, f'{r.status_code}: {r.text}', failed=attempts + 1 >= MAX_SERVER_ERRORS)
+                    break
+        return sent
+
+    def _mark(self, row_id, error, failed=False):
+        with self._lock, self._connect() as conn:
+            conn.execute('UPDATE outbox SET attempts = attempts + 1, last_error = ?, failed = ? WHERE id = ?',
+                         (error, int(failed), row_id))
+
+    def run(self, on_sent=None, on_failed=None, interval=10):
+        """
+        Arka plan döngüsü: yeni sepet gelince hemen, yoksa aralıklarla gönderir.
+        Reddedilen sepet sayısı değiştikçe on_failed(sayı) çağrılır (açılışta bir kez de mevcut sayıyla).
+        """
+        def loop():
+            failed = None
+            while True:
+                try:
+                    if self.drain() and on_sent:
+                        on_sent()
+                    n = self.failed_count()
+                    if n != failed:
+                        failed = n
+                        if on_failed:
+                            on_failed(n)
+                except Exception as e:
+                    print(f'Outbox error: {e}')
+                self._wake.wait(interval)
+                self._wake.clear()
+        threading.Thread(target=loop, daemon=True).start()
@@ -0,0 +1,26 @@
+import json
+
+import requests
+
+
+def iter_events(url, timeout=(3, 60)):
+    """Sunucunun /events/stream akışını (SSE) okur; (olay, veri) çiftleri üretir.
+    Bağlantı koparsa istisna fırlatır, yeniden bağlanmak çağıranın işidir."""
+    with requests.get(url, stream=True, timeout=timeout,
+                      headers={"Accept": "text/event-stream"}) as r:
+        r.raise_for_status()
+        event, data = "message", []
+        for line in r.iter_lines(decode_unicode=True):
+            if line is None:
+                continue
+            if line == "":
+                # Boş satır bir olayı bitirir
+                if data:
+                    yield event, json.loads("\n".join(data))
+                event, data = "message", []
+            elif line.startswith(":"):
+                continue  # keepalive / yorum satırı
+            elif line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].lstrip())
@@ -16,6 +16,9 @@ class AnalyticsMixin:
         self.lbl_a_buy.pack(side='left', padx=20)
         self.lbl_a_sell = ctk.CTkLabel(summary_fr, text='Satış: -- ₺', font=ctk.CTkFont(size=18, weight='bold'), text_color='#2ecc71')
         self.lbl_a_sell.pack(side='left', padx=20)
+        self.a_window = ctk.CTkSegmentedButton(summary_fr, values=['7', '30', '90', '365'], command=lambda _: self.refresh_analiz_data())
+        self.a_window.set('30')
+        self.a_window.pack(side='left', padx=10)
         ctk.CTkButton(summary_fr, text='Yenile', command=self.refresh_analiz_data).pack(side='left', padx=20)
         self.chart_frame = ctk.CTkFrame(pg)
         self.chart_frame.pack(fill='both', expand=True, padx=20, pady=20)
@@ -26,7 +29,8 @@ class AnalyticsMixin:
 
     def refresh_analiz_data(self):
         try:
-            r = requests.get(f'{API_URL}/reports/analytics').json()
+            days = int(self.a_window.get() or 30)
+            r = requests.get(f'{API_URL}/reports/analytics', params={'days': days}).json()
             vol = r.get('volume', {})
             cats = r.get('category_sales', {})
             for widget in self.chart_frame.winfo_children():
@@ -39,7 +43,7 @@ class AnalyticsMixin:
             bar_labels = ['Alış', 'Satış']
             bar_values = [vol.get('buy', 0), vol.get('sell', 0)]
             ax1.bar(bar_labels, bar_values, color=['#e74c3c', '#2ecc71'])
-            ax1.set_title('Son 30 Günlük İşlem Hacmi (TL)', color='white')
+            ax1.set_title(f'Son {days} Günlük İşlem Hacmi (TL)', color='white')
             ax2 = fig.add_subplot(122)
             ax2.set_facecolor('#2b2b2b')
             labels = cats.get('labels', [])
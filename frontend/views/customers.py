@@ -4,6 +4,7 @@ from tkinter import messagebox
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from frontend.core.config import API_URL
+from frontend.core.http import cached_get
 
 class CustomersMixin:
     def setup_cust(self):
@@ -56,7 +57,7 @@ class CustomersMixin:
 
     def refresh_cust(self):
         try:
-            self.fill_tree(self.tree_cu, requests.get(f'{API_URL}/customers').json(), ['id', 'full_name', 'phone', 'balance_try', 'balance_gold'])
+            self.fill_tree(self.tree_cu, cached_get(f'{API_URL}/customers'), ['id', 'full_name', 'phone', 'balance_try', 'balance_gold'])
         except:
             pass
 
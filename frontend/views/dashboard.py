@@ -1,9 +1,16 @@
+import json
 import customtkinter as ctk
-import requests, time
+import requests, threading, time
 from tkinter import messagebox
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from frontend.core.config import API_URL
+from frontend.core.http import cached_get
+
+RETAIL = 'Müşteri Yok (Perakende)'
+# Yazma durduktan bu kadar sonra sunucuda aranır (her tuşta istek atılmaz)
+CUST_SEARCH_DELAY_MS = 250
+CUST_SEARCH_LIMIT = 20
 
 class DashboardMixin:
     def setup_dash(self):
@@ -56,8 +63,15 @@ class DashboardMixin:
         c_row = ctk.CTkFrame(f_bot, fg_color='transparent')
         c_row.pack(pady=5)
         ctk.CTkLabel(c_row, text='Müşteri:').pack(side='left', padx=5)
-        self.dash_cust = ctk.CTkOptionMenu(c_row, values=['Müşteri Yok (Perakende)'], width=200)
+        # Müşteri adı/telefonu yazıldıkça sunucuda aranır; tüm cari listesi indirilmez
+        self.dash_cust = ctk.CTkComboBox(c_row, values=[RETAIL], width=240)
+        self.dash_cust.set(RETAIL)
         self.dash_cust.pack(side='left', padx=5)
+        self.dash_cust.bind('<KeyRelease>', self.on_cust_typed)
+        self.dash_cust.bind('<Return>', self.pick_first_cust)
+        self.cust_map = {}
+        self.cust_results = []
+        self._cust_search_job = None
         ctk.CTkLabel(c_row, text='Ödeme/Bakiye Durumu:').pack(side='left', padx=(15, 5))
         self.dash_pay = ctk.CTkOptionMenu(c_row, values=['Peşin / Kredi Kartı (Kasa)', 'Açık Hesap / Veresiye (Cari)'], width=200)
         self.dash_pay.pack(side='left', padx=5)
@@ -65,6 +79,10 @@ class DashboardMixin:
         btn_box.pack(pady=10)
         ctk.CTkButton(btn_box, text='TEMİZLE', fg_color='#e74c3c', width=100, command=self.clear_terazi).pack(side='left', padx=10)
         ctk.CTkButton(btn_box, text='İŞLEMİ BİTİR', fg_color='#2ecc71', width=200, height=40, command=self.finish_transaction).pack(side='left', padx=10)
+        # Sunucunun reddettiği (4xx) sepetler kuyrukta bekler; varsa görünür, tıklanınca incelenir
+        self.btn_outbox = ctk.CTkButton(btn_box, text='', fg_color='#c0392b', hover_color='#a93226', width=160, height=40, command=self.show_failed_baskets)
+        self.outbox_failed_seen = 0
+        self.refresh_outbox_badge()
         self.update_quick_buttons('buy')
         self.update_quick_buttons('sell')
 
@@ -75,18 +93,44 @@ class DashboardMixin:
         self.check_ai()
         self.refresh_cust_list_dash()
 
+    def on_cust_typed(self, event=None):
+        if event is not None and event.keysym in ('Return', 'Up', 'Down', 'Left', 'Right', 'Tab'):
+            return
+        if self._cust_search_job is not None:
+            self.after_cancel(self._cust_search_job)
+        self._cust_search_job = self.after(CUST_SEARCH_DELAY_MS, self.refresh_cust_list_dash)
+
     def refresh_cust_list_dash(self):
-        try:
-            r = requests.get(f'{API_URL}/customers').json()
-            self.customers_list = ['Müşteri Yok (Perakende)']
-            self.cust_map = {}
-            for c in r:
-                name = f'{c['full_name']} - {c['phone']}'
-                self.customers_list.append(name)
-                self.cust_map[name] = c['id']
-            self.dash_cust.configure(values=self.customers_list)
-        except:
-            pass
+        self._cust_search_job = None
+        q = self.dash_cust.get().strip()
+        if q == RETAIL or q in self.cust_map:
+            q = ''
+
+        def work():
+            try:
+                rows = requests.get(f'{API_URL}/customers/search', params={'q': q, 'limit': CUST_SEARCH_LIMIT}, timeout=2).json()
+            except Exception as e:
+                print(f'Customer search error: {e}')
+                return
+            self.after(0, lambda: self.show_cust_results(q, rows))
+        threading.Thread(target=work, daemon=True).start()
+
+    def show_cust_results(self, q, rows):
+        # Yanıt gelene kadar yazı değiştiyse eski aramanın sonucu gösterilmez
+        if q and self.dash_cust.get().strip() != q:
+            return
+        self.cust_results = []
+        for c in rows:
+            name = f'{c['full_name']} - {c['phone']}'
+            self.cust_results.append(name)
+            self.cust_map[name] = c['id']
+        self.customers_list = [RETAIL] + self.cust_results
+        self.dash_cust.configure(values=self.customers_list)
+
+    def pick_first_cust(self, event=None):
+        # Enter: yazılanla eşleşen ilk müşteri seçilir
+        if self.cust_results and self.dash_cust.get() not in self.cust_map:
+            self.dash_cust.set(self.cust_results[0])
 
     def on_sym_change(self, side):
         sym = self.b_sym.get() if side == 'buy' else self.s_sym.get()
@@ -208,14 +252,14 @@ class DashboardMixin:
                 if cid:
                     i['customer_id'] = cid
                 i['payment_type'] = pay_type
-                requests.post(f'{API_URL}/transactions', json=i)
-            messagebox.showinfo('Tamam', 'İşlem bitti.')
+            # Sepet önce yerel kuyruğa yazılır; satış ağ beklenmeden kapanır, gönderim arka planda yapılır
+            self.outbox.enqueue(self.buy_basket + self.sell_basket)
             self.clear_terazi()
-            self.after(0, self.refresh_boss_data)
-            self.after(0, self.refresh_vault)
-            self.after(0, self.refresh_stock)
-            self.after(0, self.refresh_repo_tx)
-            self.after(0, self.refresh_cust)
+            pending = self.outbox.pending()
+            if pending > 1:
+                messagebox.showinfo('Tamam', f'İşlem kaydedildi. Sunucuya gönderilmeyi bekleyen {pending} işlem var.')
+            else:
+                messagebox.showinfo('Tamam', 'İşlem bitti.')
         except Exception as e:
             messagebox.showerror('Hata', f'İşlem tamamlanamadı: {e}')
 
@@ -223,7 +267,7 @@ class DashboardMixin:
         self.buy_basket = []
         self.sell_basket = []
         self.update_terazi_display()
-        self.dash_cust.set('Müşteri Yok (Perakende)')
+        self.dash_cust.set(RETAIL)
         self.dash_pay.set('Peşin / Kredi Kartı (Kasa)')
 
     def remove_item(self, side):
@@ -244,7 +288,7 @@ class DashboardMixin:
         win.geometry('500x400')
         win.attributes('-topmost', True)
         tree = self.create_tree(win, ('id', 'name', 'weight', 'purity', 'labor'), ('ID', 'Ürün', 'Gram', 'Ayar', 'İşçilik'), height=10)
-        prods = requests.get(f'{API_URL}/products').json()
+        prods = cached_get(f'{API_URL}/products')
         self.fill_tree(tree, prods, ['id', 'name', 'weight', 'purity', 'labor_cost'])
     
         def select():
@@ -268,3 +312,47 @@ class DashboardMixin:
             win.destroy()
         ctk.CTkButton(win, text='SEÇ VE DOLDUR', command=select).pack(pady=10)
 
+    def refresh_outbox_badge(self, count=None, warn=False):
+        n = self.outbox.failed_count() if count is None else count
+        if n:
+            self.btn_outbox.configure(text=f'⚠️ GÖNDERİLEMEYEN ({n})')
+            self.btn_outbox.pack(side='left', padx=10)
+        else:
+            self.btn_outbox.pack_forget()
+        if warn and n > self.outbox_failed_seen:
+            messagebox.showwarning('Gönderilemedi', f'Sunucu {n} işlemi kabul etmedi. Kontrol edip tekrar gönderin veya silin.')
+        self.outbox_failed_seen = n
+
+    def show_failed_baskets(self):
+        win = ctk.CTkToplevel(self)
+        win.title('Gönderilemeyen İşlemler')
+        win.geometry('700x400')
+        win.attributes('-topmost', True)
+        tree = self.create_tree(win, ('key', 'items', 'total', 'error'), ('Kayıt', 'Kalem', 'Tutar', 'Hata'), height=8)
+
+        def fill():
+            for i in tree.get_children():
+                tree.delete(i)
+            for key, payload, error in self.outbox.failed():
+                items = json.loads(payload)['items']
+                total = sum(i.get('total_price') or 0 for i in items)
+                tree.insert('', 'end', iid=key, values=(key[:8], len(items), f'{total:,.2f}', error or ''))
+            self.refresh_outbox_badge()
+
+        def retry():
+            for key in tree.selection():
+                self.outbox.retry(key)
+            fill()
+
+        def discard():
+            sel = tree.selection()
+            if sel and messagebox.askyesno('Sil', f'{len(sel)} işlem sunucuya hiç gönderilmeden silinecek. Emin misiniz?'):
+                for key in sel:
+                    self.outbox.discard(key)
+                fill()
+
+        row = ctk.CTkFrame(win, fg_color='transparent')
+        row.pack(pady=10)
+        ctk.CTkButton(row, text='TEKRAR GÖNDER', fg_color='#2ecc71', command=retry).pack(side='left', padx=10)
+        ctk.CTkButton(row, text='SİL', fg_color='#e74c3c', command=discard).pack(side='left', padx=10)
+        fill()
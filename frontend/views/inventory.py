@@ -4,6 +4,7 @@ from tkinter import messagebox
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from frontend.core.config import API_URL
+from frontend.core.http import cached_get
 
 class InventoryMixin:
     def setup_repo(self):
@@ -20,6 +21,9 @@ class InventoryMixin:
         ctk.CTkButton(r1, text='İŞLE', fg_color='#8e44ad', command=self.set_inventory).pack(side='left', padx=10)
         self.tree_vault = self.create_tree(re, ('sym', 'bal', 'upd'), ('Varlık', 'Bakiye', 'Son Güncelleme'), height=5)
         self.tree_tx = self.create_tree(re, ('side', 'symbol', 'qty', 'unit_price', 'total_price', 'ts'), ('Tür', 'Birim', 'Mkt', 'Fyt', 'Top', 'Tarih'))
+        self.tx_cursor = None
+        self.btn_tx_more = ctk.CTkButton(re, text='Daha Fazla', command=self.load_more_tx, state='disabled')
+        self.btn_tx_more.pack(pady=5)
 
     def setup_stock(self):
         st = self.pages['stock']
@@ -72,19 +76,42 @@ class InventoryMixin:
 
     def refresh_vault(self):
         try:
-            self.fill_tree(self.tree_vault, requests.get(f'{API_URL}/vault').json(), ['symbol', 'balance', 'last_updated'])
+            self.fill_tree(self.tree_vault, cached_get(f'{API_URL}/vault'), ['symbol', 'balance', 'last_updated'])
         except:
             pass
 
+    TX_PAGE = 200
+    TX_KEYS = ['side', 'symbol', 'qty', 'unit_price', 'total_price', 'ts']
+
     def refresh_repo_tx(self):
+        # Sadece ilk sayfa çekilir; eskiler 'Daha Fazla' ile imleçten devam eder
+        try:
+            rows, headers = cached_get(f'{API_URL}/transactions', params={'limit': self.TX_PAGE}, with_headers=True)
+            self.fill_tree(self.tree_tx, rows, self.TX_KEYS)
+            self.set_tx_cursor(headers.get('X-Next-Cursor'))
+        except:
+            pass
+
+    def load_more_tx(self):
+        if not self.tx_cursor:
+            return
         try:
-            self.fill_tree(self.tree_tx, requests.get(f'{API_URL}/transactions').json(), ['side', 'symbol', 'qty', 'unit_price', 'total_price', 'ts'])
+            r = requests.get(f'{API_URL}/transactions', params={'limit': self.TX_PAGE, 'cursor': self.tx_cursor}, timeout=5)
+            for row in r.json():
+                vals = [row.get(k, '') for k in self.TX_KEYS]
+                vals[-1] = str(vals[-1])[:16].replace('T', ' ')
+                self.tree_tx.insert('', 'end', values=vals)
+            self.set_tx_cursor(r.headers.get('X-Next-Cursor'))
         except:
             pass
 
+    def set_tx_cursor(self, cursor):
+        self.tx_cursor = cursor if isinstance(cursor, str) else None
+        self.btn_tx_more.configure(state='normal' if self.tx_cursor else 'disabled')
+
     def refresh_stock(self):
         try:
-            self.fill_tree(self.tree_st, requests.get(f'{API_URL}/products').json(), ['name', 'weight', 'purity', 'labor_cost', 'stock_qty'])
+            self.fill_tree(self.tree_st, cached_get(f'{API_URL}/products'), ['name', 'weight', 'purity', 'labor_cost', 'stock_qty'])
         except:
             pass
 
@@ -4,6 +4,7 @@ from tkinter import messagebox
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from frontend.core.config import API_URL
+from frontend.core.http import cached_get
 
 class SettingsMixin:
     def setup_set(self):
@@ -70,7 +71,7 @@ class SettingsMixin:
 
     def refresh_margins(self):
         try:
-            for m in requests.get(f'{API_URL}/settings/margins').json():
+            for m in cached_get(f'{API_URL}/settings/margins'):
                 if m['symbol'] in self.m_ins:
                     b, s = self.m_ins[m['symbol']]
                     b.delete(0, 'end')
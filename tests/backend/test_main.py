@@ -1,8 +1,10 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
-from sqlalchemy.pool import StaticPool
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool, NullPool
+from sqlalchemy.ext.asyncio import async_sessionmaker
+import tempfile
 import warnings
 import sys, os
 os.environ["TESTING"] = "1"
@@ -13,22 +15,26 @@ from datetime import datetime, timedelta
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 # Uygulama modüllerini içe aktar
-from backend.main import app, get_db
+from backend.main import app, get_db, get_async_db
 import backend.main
 
-from backend.database import Base
+from backend.database import Base, make_async_engine
 
 from backend import models, schemas
 
 
-# Testler için bellekte geçici bir veritabanı oluşturalım (SQLite In-Memory)
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Testler için geçici bir SQLite dosyası: senkron ve async motor aynı veritabanını görmeli
+# (bellek içi veritabanı bağlantıya özeldir, iki sürücü arasında paylaşılamaz)
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
     connect_args={"check_same_thread": False},
     poolclass=StaticPool
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# TestClient her istekte ayrı event loop açar; aiosqlite bağlantıları loop'lar arasında havuzlanmamalı
+async_engine = make_async_engine(SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
 # Endpoint'lerdeki veritabanı bağımlılığını (Depends) geçici veritabanımızla ezelim
 # Endpoint'lerdeki veritabanı bağımlılığını (Depends) geçici veritabanımızla ezelim
@@ -39,7 +45,12 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 client = TestClient(app)
 
 # Pytest fixture'ı: Her testten önce tabloları sıfırdan oluşturup test bitince siler
@@ -48,6 +59,9 @@ def setup_database():
     # import models to ensure Base has all metadata registered
     from backend.database import Base
     from backend import models
+    from backend.services import prices
+    # Fiyat önbelleği testler arasında taşınmasın
+    prices.reset_cache()
     Base.metadata.create_all(bind=engine)
     yield
     Base.metadata.drop_all(bind=engine)
@@ -315,6 +329,29 @@ def test_system_activation(monkeypatch):
     assert res_ok.status_code == 200
     assert backend.main.LICENSE_TIER == "PREMIUM"
 
+def test_cloud_sync_uses_async_client(monkeypatch):
+    """Bulut senkronu web merkezini async istemciyle çağırmalı (event loop'ta bloklayan requests.post yok)"""
+    from unittest.mock import AsyncMock, patch
+    import httpx
+
+    monkeypatch.setattr("requests.get", lambda *args, **kwargs: type("R", (), {"status_code": 200})())
+    assert client.post("/system/activate", json={"license_key": "PRO-SYNC-TEST"}).status_code == 200
+
+    def blocking(*args, **kwargs):
+        raise AssertionError("requests.post event loop'u bloklar")
+    monkeypatch.setattr("requests.post", blocking)
+    sent = AsyncMock(return_value=httpx.Response(200, json={"status": "synced"}))
+    with patch("backend.main.fetch_prices_async", AsyncMock(return_value={"GA": {"buy": 3000.0, "sell": 3100.0}})), \
+            patch.object(httpx.AsyncClient, "post", sent):
+        res = client.post("/system/sync")
+        assert res.status_code == 200 and res.json() == {"status": "synced"}
+        assert "key=PRO-SYNC-TEST" in sent.await_args.args[0]
+        assert set(sent.await_args.kwargs["json"]) == {"kasa", "daily_profit", "tx_count"}
+
+        # Web merkezinin hata kodu 503'e dönüşmeden iletilir
+        sent.return_value = httpx.Response(500)
+        assert client.post("/system/sync").status_code == 500
+
 # ------------- EXTRA THOROUGH TESTS -------------
 
 def test_invalid_vault_update_parameters():
@@ -474,3 +511,807 @@ def test_price_fetch_failure():
         # Fallback GA fiyatı 3000 olmalı
         assert res.json()["GA"]["buy"] == 3000.0
 
+
+def test_price_cache_single_flight():
+    """Eşzamanlı fiyat istekleri tek indirmeyi paylaşmalı, taze önbellek ağa çıkmamalı"""
+    import asyncio
+    from unittest.mock import patch
+    from backend.services import prices
+
+    calls = []
+
+    async def fake_download():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"USD": {"buy": 40.0, "sell": 40.5}}
+
+    async def scenario():
+        snaps = await asyncio.gather(*(prices.get_price_snapshot() for _ in range(10)))
+        again = await prices.get_price_snapshot()
+        return snaps, again
+
+    with patch("backend.services.prices._download_prices", side_effect=fake_download):
+        snaps, again = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert all(s is snaps[0] for s in snaps)
+    assert again is snaps[0]
+
+    # /prices yanıtı snapshot yaşını başlıkta bildirmeli
+    res = client.get("/prices")
+    assert res.status_code == 200
+    assert res.json()["USD"]["buy"] == 40.0
+    assert "age" in res.headers
+    assert "x-prices-fetched-at" in res.headers
+
+def test_ons_update_with_price_history_does_not_deadlock(monkeypatch):
+    """Yazar kilidini tutan istek fiyatı yeniden yayınlarken geçmiş yazımı aynı kilidi beklememeli"""
+    import threading
+    from unittest.mock import patch
+    from backend.services import history, pricing, prices
+
+    monkeypatch.setattr(pricing, "_ons_usd", pricing._ons_usd)
+
+    async def fake_download():
+        return {"USD": {"buy": 34.0, "sell": 34.5}}
+
+    with patch("backend.services.prices._download_prices", side_effect=fake_download):
+        client.get("/prices")
+    history.configure(TestingSessionLocal)
+    prices.add_listener(history.on_snapshot)
+    try:
+        result = {}
+        worker = threading.Thread(target=lambda: result.update(
+            res=client.post("/settings/ons", params={"ons_usd": 2600.0})), daemon=True)
+        worker.start()
+        worker.join(5)
+        assert not worker.is_alive(), "/settings/ons yazar kilidinde takıldı"
+        assert result["res"].status_code == 200
+        history.flush(5)
+    finally:
+        prices.remove_listener(history.on_snapshot)
+        history.configure(None)
+
+    db = TestingSessionLocal()
+    try:
+        assert db.query(models.Price).count() > 0
+    finally:
+        db.close()
+
+def test_instrument_table_adds_new_ziynet_product(monkeypatch):
+    """Yeni bir ziynet ürünü kod değişikliği olmadan fiyat listesine girmeli"""
+    from unittest.mock import patch
+    from backend.services import pricing
+    # Tablo test sonunda varsayılanlara dönsün (diğer testler etkilenmesin)
+    monkeypatch.setattr(pricing, "_table", pricing._table)
+
+    db = TestingSessionLocal()
+    pricing.load_table(db)
+    db.close()
+
+    res = client.post("/instruments", json={"symbol": "RESAT", "name": "Reşat", "has_gram": 6.61,
+                                            "purity": 1.0, "buy_spread": 0.03, "sell_spread": 0.06})
+    assert res.status_code == 200
+
+    async def fake_download():
+        return {"USD": {"buy": 34.0, "sell": 34.5}}
+
+    with patch("backend.services.prices._download_prices", side_effect=fake_download):
+        live = client.get("/prices").json()
+    gram = (pricing.ons_usd() * 34.5) / 31.1034768
+    assert live["RESAT"]["sell"] == round(gram * 6.61 * 1.06, 2)
+    assert "CEYREK" in live
+    assert len(client.get("/instruments").json()) == len(pricing.DEFAULT_INSTRUMENTS) + 1
+
+def test_price_history_ohlc_rollups():
+    """Fiyat tick'leri toplu yazılmalı, OHLC özetleri artımlı güncellenmeli"""
+    from datetime import timezone
+    from backend.services import history
+
+    db = TestingSessionLocal()
+    t0 = datetime(2026, 3, 2, 10, 15, 5, tzinfo=timezone.utc)
+    for i, price in enumerate([3000.0, 3050.0, 2990.0, 3020.0]):
+        history.record_snapshot(db, {"GA": {"buy": price, "sell": price + 30}, "USD": {"buy": 34.0, "sell": 34.5}},
+                                ts=t0 + timedelta(minutes=20 * i))
+    assert db.query(models.Price).count() == 16
+    db.close()
+
+    res = client.get("/prices/history", params={"symbol": "GA", "bucket": "hour",
+                                                "from": "2026-03-02T00:00:00", "to": "2026-03-03T00:00:00"})
+    assert res.status_code == 200
+    bars = res.json()["bars"]
+    # 10:15, 10:35, 10:55 -> 10:00 saati; 11:15 -> 11:00 saati
+    assert [b["count"] for b in bars] == [3, 1]
+    assert bars[0]["open"] == 3000.0 and bars[0]["high"] == 3050.0
+    assert bars[0]["low"] == 2990.0 and bars[0]["close"] == 2990.0
+
+    day = client.get("/prices/history", params={"symbol": "GA", "bucket": "day", "price_type": "sell",
+                                                "from": "2026-03-01T00:00:00", "to": "2026-03-05T00:00:00"}).json()["bars"]
+    assert len(day) == 1 and day[0]["close"] == 3050.0 and day[0]["count"] == 4
+
+    assert client.get("/prices/history", params={"bucket": "week"}).status_code == 400
+
+
+def test_daily_report_date_range_uses_index():
+    """Günlük rapor istenen günü yarı açık aralıkla süzmeli ve ts indeksini kullanmalı"""
+    from datetime import date
+    from sqlalchemy import text
+    from backend.services.shopday import shop_day_bounds
+
+    start, end = shop_day_bounds(date(2026, 3, 2))
+    db = TestingSessionLocal()
+    for ts, price in [(start - timedelta(seconds=1), 1.0), (start, 2.0),
+                      (end - timedelta(seconds=1), 3.0), (end, 4.0)]:
+        db.add(models.Transaction(side="sell", symbol="GA", qty=1.0, unit_price=price,
+                                  total_price=price, payment_type="Cash", ts=ts))
+    db.commit()
+    db.close()
+
+    res = client.get("/reports/daily", params={"date": "2026-03-02"}).json()
+    assert res["date"] == "2026-03-02"
+    assert sorted(t["unit_price"] for t in res["transactions"]) == [2.0, 3.0]
+
+    with engine.connect() as conn:
+        plan = conn.execute(text("EXPLAIN QUERY PLAN SELECT * FROM transactions WHERE ts >= :s AND ts < :e"),
+                            {"s": start.isoformat(" "), "e": end.isoformat(" ")}).fetchall()
+    assert "ix_transactions_ts_id" in " ".join(str(row) for row in plan)
+
+
+def test_daily_rollup_maintained_and_rebuilt():
+    """Her işlem günlük özeti aynı transaction'da güncellemeli; rebuild aynı sonucu üretmeli"""
+    from unittest.mock import AsyncMock, patch
+    from backend.services import rollup, shopday
+
+    for side, qty, price in [("sell", 2.0, 3000.0), ("sell", 1.0, 3100.0), ("buy", 1.5, 2900.0)]:
+        client.post("/transactions", json={"side": side, "qty": qty, "unit_price": price,
+                                           "total_price": qty * price, "symbol": "GA", "payment_type": "Cash"})
+
+    db = TestingSessionLocal()
+    def snapshot():
+        return sorted((r.symbol, r.side, r.payment_type, r.qty, r.total_price, r.count)
+                      for r in db.query(models.DailyRollup))
+    live = snapshot()
+    assert live == [("GA", "buy", "Cash", 1.5, 4350.0, 1), ("GA", "sell", "Cash", 3.0, 9100.0, 2)]
+    assert rollup.rebuild(db) == 2
+    assert snapshot() == live
+
+    today = shopday.today()
+    assert rollup.volume(db, today) == {"buy": 4350.0, "sell": 9100.0}
+    assert rollup.symbol_sales(db, today) == {"GA": 9100.0}
+    prices = {"GA": {"buy": 2950.0, "sell": 3050.0}}
+    with patch("backend.main.fetch_prices_async", AsyncMock(return_value=prices)):
+        daily = client.get("/reports/daily").json()
+    summary = rollup.day_summary(db, today, prices)
+    assert summary == {"profit": daily["profit"], "tx_count": 3}
+    db.close()
+
+
+def test_positions_average_cost_pnl(monkeypatch):
+    """Pozisyon tablosu ortalama maliyetle güncellenmeli, rebuild ile aynı sonucu vermeli"""
+    from unittest.mock import AsyncMock, patch
+    from backend.services import pnl
+
+    monkeypatch.setattr(backend.main, "LICENSE_TIER", "PREMIUM")
+    for side, qty, price in [("buy", 2.0, 3000.0), ("buy", 2.0, 3200.0), ("sell", 3.0, 3300.0), ("sell", 5.0, 3400.0)]:
+        client.post("/transactions", json={"side": side, "qty": qty, "unit_price": price,
+                                           "total_price": qty * price, "symbol": "GA", "payment_type": "Cash"})
+
+    # Ortalama maliyet 3100; 3 gr 3300'den -> 600, kalan 1 gr 3400'den (fazla satış kırpılır) -> 300
+    realized = client.get("/reports/pnl/realized").json()
+    assert realized["realized"] == 900.0
+    assert realized["positions"][0]["qty"] == 0.0
+
+    client.post("/transactions", json={"side": "buy", "qty": 1.0, "unit_price": 3000.0,
+                                       "total_price": 3000.0, "symbol": "GA", "payment_type": "Cash"})
+    with patch("backend.main.fetch_prices_async", AsyncMock(return_value={"GA": {"buy": 3050.0, "sell": 3100.0}})):
+        report = client.get("/reports/pnl").json()
+    assert report["unrealized"] == 50.0
+    assert report["profit"] == 950.0
+
+    db = TestingSessionLocal()
+    before = [(p.symbol, p.qty, p.avg_cost, p.realized_pnl) for p in db.query(models.Position)]
+    assert client.post("/reports/pnl/rebuild").json() == {"symbols": 1}
+    db.expire_all()
+    assert [(p.symbol, p.qty, p.avg_cost, p.realized_pnl) for p in db.query(models.Position)] == before
+    # Geçmiş parça parça okunduğunda da (her parça önceki pozisyondan devam eder) sonuç aynı
+    assert pnl.rebuild_positions(db, batch_size=1) == 1
+    [(symbol, qty, avg_cost, realized)] = before
+    p = db.query(models.Position).one()
+    assert (p.symbol, p.qty) == (symbol, qty)
+    assert (p.avg_cost, p.realized_pnl) == (pytest.approx(avg_cost), pytest.approx(realized))
+    db.close()
+    assert pnl.apply_trade(0.0, 0.0, "sell", 1.0, 100.0) == (0.0, 0.0, 0.0)
+
+
+def test_vectorized_cost_basis_matches_loop():
+    """Vektörel motor satır satır ortalama maliyet döngüsüyle aynı sonucu vermeli; FIFO lot sırasını izlemeli"""
+    import random
+    from backend.services import costbasis, pnl
+
+    fifo = costbasis.compute(["GA"] * 4, ["buy", "buy", "sell", "sell"], [1.0, 1.0, 1.5, 5.0],
+                             [100.0, 200.0, 300.0, 400.0])["GA"]
+    # İlk 1.5 birim: 1x100 + 0.5x200; kalan 0.5 birim (fazla satış kırpılır) 200'den
+    assert fifo["realized_fifo"] == pytest.approx(300 * 1.5 - 200 + 400 * 0.5 - 100)
+    assert fifo["qty"] == 0.0 and fifo["fifo_cost"] == 0.0
+
+    rng = random.Random(7)
+    rows = [(rng.choice(["GA", "USD", "C22"]), rng.choice(["buy", "sell", "initial"]),
+             round(rng.uniform(0, 5), 3), round(rng.uniform(100, 200), 2)) for _ in range(2000)]
+    expected = {}
+    for sym, side, qty, price in rows:
+        if side in ("buy", "sell"):
+            acc = expected.setdefault(sym, [0.0, 0.0, 0.0])
+            acc[0], acc[1], realized = pnl.apply_trade(acc[0], acc[1], side, qty, price)
+            acc[2] += realized
+
+    result = costbasis.compute(*zip(*rows))
+    for sym, (qty, avg_cost, realized) in expected.items():
+        assert result[sym]["qty"] == pytest.approx(qty, abs=1e-9)
+        assert result[sym]["avg_cost"] == pytest.approx(avg_cost)
+        assert result[sym]["realized_avg"] == pytest.approx(realized)
+
+
+def test_analytics_fixed_query_count(monkeypatch):
+    """Analiz raporu satış sayısından bağımsız olarak sabit sayıda sorgu çalıştırmalı"""
+    from sqlalchemy import event
+
+    monkeypatch.setattr(backend.main, "LICENSE_TIER", "PREMIUM")
+    # Yüzük iki kez satılır; fazla satış koruması yüzünden stokta iki adet olmalı
+    for name, cat, qty in [("Yüzük", "Yüzük", 2), ("Kolye", "Kolye", 1), ("Küpe", "", 1)]:
+        client.post("/products", json={"name": name, "weight": 2.0, "purity": 0.585, "labor_cost": 100.0,
+                                       "category": cat, "stock_qty": qty})
+    for pid in (1, 1, 2, 3):
+        client.post("/transactions", json={"side": "sell", "qty": 1, "unit_price": 5000.0, "total_price": 5000.0,
+                                           "symbol": "ÜRÜN", "product_id": pid, "payment_type": "Cash"})
+    client.post("/transactions", json={"side": "sell", "qty": 1, "unit_price": 3000.0, "total_price": 3000.0,
+                                       "symbol": "GA", "payment_type": "Cash"})
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        res = client.get("/reports/analytics", params={"days": 7, "series": True})
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert res.status_code == 200
+    data = res.json()
+    assert len(statements) == 4
+    assert dict(zip(data["category_sales"]["labels"], data["category_sales"]["values"])) == \
+        {"Yüzük": 10000.0, "Kolye": 5000.0, "Ürün": 5000.0}
+    assert data["symbol_sales"] == {"labels": ["GA"], "values": [3000.0]}
+    assert data["volume"]["sell"] == 23000.0
+    assert len(data["series"]) == 7 and data["series"][-1]["count"] == 5
+
+    assert client.get("/reports/analytics", params={"days": 12}).status_code == 400
+    custom = client.get("/reports/analytics", params={"start": "2020-01-01", "end": "2020-01-31"}).json()
+    assert custom["volume"] == {"buy": 0.0, "sell": 0.0}
+
+
+def test_inventory_aggregates_track_stock():
+    """Kasa raporundaki stok toplamları ürün eklenince ve satılınca artımlı güncellenmeli"""
+    from backend.services import inventory
+
+    client.post("/products", json={"name": "Künye", "weight": 10.0, "purity": 0.585, "labor_cost": 200.0,
+                                   "category": "Künye", "stock_qty": 3})
+    client.post("/products", json={"name": "Yüzük", "weight": 4.0, "purity": 0.916, "labor_cost": 150.0,
+                                   "category": "Yüzük", "stock_qty": 1})
+    codes = [client.post("/transactions", json={"side": "sell", "qty": qty, "unit_price": 100.0, "total_price": 100.0 * qty,
+                                                "symbol": "ÜRÜN", "product_id": 2, "payment_type": "Cash"}).status_code
+             for qty in (1, 2)]
+    # Tek yüzük ilk satışta bitti; stok eksiye düşmez, ikinci satış 409 ile reddedilir
+    assert codes == [200, 409]
+
+    stock = client.get("/reports/kasa").json()["product_stock"]
+    # Künye 3 adet kaldı; stoğu biten yüzük toplamlara girmiyor
+    assert stock["total_weight_has"] == round(10.0 * 0.585 * 3, 3)
+    assert stock["total_labor_tl"] == 600.0
+    assert [g["category"] for g in stock["groups"]] == ["Künye"]
+
+    db = TestingSessionLocal()
+    assert inventory.rebuild(db) == 1
+    db.close()
+    assert client.get("/reports/kasa").json()["product_stock"] == stock
+
+
+def test_read_endpoints_answer_304_until_data_changes():
+    """Veri değişmediyse If-None-Match ile gelen istek gövdesiz 304 almalı; yazma ETag'i değiştirmeli"""
+    client.post("/customers", json={"full_name": "Ayşe", "phone": "555"})
+    first = client.get("/customers")
+    tag = first.headers["ETag"]
+    assert first.status_code == 200 and len(first.json()) == 1
+
+    again = client.get("/customers", headers={"If-None-Match": tag})
+    assert again.status_code == 304 and again.content == b""
+    # Başka tabloya yazmak müşteri listesini geçersiz kılmaz
+    client.post("/vault/update", params={"symbol": "TRY", "amount": 100})
+    assert client.get("/customers", headers={"If-None-Match": tag}).status_code == 304
+    vault_tag = client.get("/vault").headers["ETag"]
+
+    client.post("/transactions", json={"side": "sell", "qty": 1.0, "unit_price": 3000.0, "total_price": 3000.0,
+                                       "symbol": "GA", "payment_type": "Debt", "customer_id": 1})
+    changed = client.get("/customers", headers={"If-None-Match": tag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != tag
+    assert client.get("/vault", headers={"If-None-Match": vault_tag}).status_code == 200
+
+    # Sürümler veritabanında: API'den geçmeyen yazma (CLI aracı, başka süreç) da ETag'i değiştirir
+    tag = changed.headers["ETag"]
+    db = TestingSessionLocal()
+    db.add(models.Customer(full_name="Aktarılan", phone="556"))
+    db.commit()
+    db.close()
+    assert client.get("/customers", headers={"If-None-Match": tag}).status_code == 200
+
+    # Etiket sorguya özgü; hatalı parametre eldeki etiketten önce doğrulanır
+    tx = client.get("/transactions")
+    assert client.get("/transactions", headers={"If-None-Match": tx.headers["ETag"]}).status_code == 304
+    assert client.get("/transactions", params={"side": "buy"}, headers={"If-None-Match": tx.headers["ETag"]}).status_code == 200
+    assert client.get("/transactions", params={"cursor": "bozuk"}, headers={"If-None-Match": tx.headers["ETag"]}).status_code == 400
+
+
+def test_transactions_keyset_pagination_and_filters(monkeypatch):
+    """İşlem listesi (ts, id) imleciyle tekrarsız sayfalanmalı ve filtrelenebilmeli"""
+    monkeypatch.setattr(backend.main, "LICENSE_TIER", "PREMIUM")
+    base = datetime(2026, 3, 2, 12, 0)
+    db = TestingSessionLocal()
+    for i in range(7):
+        # Aynı saniyeye düşen işlemler id ile ayrışmalı
+        db.add(models.Transaction(side="sell" if i % 2 else "buy", symbol="GA" if i < 5 else "USD", qty=1.0,
+                                  unit_price=100.0 + i, total_price=100.0 + i, payment_type="Cash",
+                                  ts=base + timedelta(minutes=i // 2)))
+    db.commit()
+    db.close()
+
+    seen, cursor = [], None
+    while True:
+        res = client.get("/transactions", params={"limit": 3, **({"cursor": cursor} if cursor else {})})
+        assert res.status_code == 200
+        seen += [t["id"] for t in res.json()]
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [7, 6, 5, 4, 3, 2, 1]
+
+    gold_sells = client.get("/transactions", params={"symbol": "GA", "side": "sell"}).json()
+    assert [t["id"] for t in gold_sells] == [4, 2]
+    assert client.get("/transactions", params={"start": "2026-03-03"}).json() == []
+    assert client.get("/transactions", params={"cursor": "bozuk"}).status_code == 400
+    assert client.get("/transactions", params={"limit": 5000}).status_code == 422
+
+
+def test_export_streams_csv_ndjson_gzip_and_parquet(monkeypatch):
+    """Dökümler parça parça akıtılmalı; gzip ve parquet çıktıları geri okunabilmeli"""
+    import csv, gzip, io, json
+    from backend.services import export
+
+    monkeypatch.setattr(backend.main, "LICENSE_TIER", "PREMIUM")
+    monkeypatch.setattr(export, "CHUNK_ROWS", 2)
+    client.post("/customers", json={"full_name": "Ali", "phone": "1"})
+    for i in range(5):
+        client.post("/transactions", json={"side": "sell", "qty": 1.0, "unit_price": 100.0 + i, "total_price": 100.0 + i,
+                                           "symbol": "GA", "payment_type": "Debt", "customer_id": 1 if i % 2 else None})
+
+    res = client.get("/export/transactions")
+    assert res.headers["content-disposition"] == 'attachment; filename="transactions.csv"'
+    rows = list(csv.DictReader(io.StringIO(res.text)))
+    assert [float(r["unit_price"]) for r in rows] == [100.0, 101.0, 102.0, 103.0, 104.0]
+
+    gz = client.get("/export/customer_ledger", params={"format": "ndjson", "compress": "gzip"})
+    ledger = [json.loads(line) for line in gzip.decompress(gz.content).decode().splitlines()]
+    assert [(r["full_name"], r["unit_price"]) for r in ledger] == [("Ali", 101.0), ("Ali", 103.0)]
+
+    assert client.get("/export/users").status_code == 404
+    assert client.get("/export/vault", params={"format": "xlsx"}).status_code == 400
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    res = client.get("/export/transactions", params={"format": "parquet"})
+    parquet = pq.ParquetFile(io.BytesIO(res.content))
+    assert parquet.metadata.num_rows == 5 and parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.column("unit_price").to_pylist()[-1] == 104.0
+
+
+def test_transaction_batch_is_atomic():
+    """Terazi sepeti tek commit'le işlenmeli; hatalı bir kalem tüm sepeti geri almalı"""
+    client.post("/customers", json={"full_name": "Veli", "phone": "2"})
+    basket = {"items": [
+        {"side": "sell", "symbol": "GA", "qty": 10.0, "unit_price": 3100.0, "total_price": 31000.0, "payment_type": "Cash"},
+        {"side": "buy", "symbol": "USD", "qty": 100.0, "unit_price": 34.0, "total_price": 3400.0, "payment_type": "Cash"},
+        {"side": "sell", "symbol": "GA", "qty": 1.0, "unit_price": 3100.0, "total_price": 3100.0,
+         "payment_type": "Debt", "customer_id": 1},
+    ]}
+    res = client.post("/transactions/batch", json=basket)
+    assert res.status_code == 200
+    data = res.json()
+    assert len(data["transactions"]) == 3
+    assert data["vault"] == {"TRY": 27600.0, "GA": -11.0, "USD": 100.0}
+    assert data["customers"] == [{"id": 1, "balance_try": 0.0, "balance_gold": 1.0}]
+
+    # Stokta olmayan ürün kalemi 409 döner; önceki kalem de yazılmamalı
+    prod = client.post("/products", json={"name": "Künye", "category": "Bileklik", "weight": 3.0, "purity": 0.585,
+                                          "labor_cost": 50, "stock_qty": 1}).json()
+    bad = {"items": [basket["items"][0], {"side": "sell", "symbol": "ÜRÜN", "qty": 2.0, "unit_price": 10.0,
+                                          "product_id": prod["id"]}]}
+    assert client.post("/transactions/batch", json=bad).status_code == 409
+    assert len(client.get("/transactions").json()) == 3
+    assert client.post("/transactions/batch", json={"items": []}).status_code == 400
+    # Eksik kalem 422 ile reddedilir; total_price gönderilmezse adet x birim fiyattan hesaplanır
+    assert client.post("/transactions/batch", json={"items": [{"side": "sell", "qty": 1.0}]}).status_code == 422
+    res = client.post("/transactions/batch", json={"items": [{"side": "sell", "symbol": "ÜRÜN", "qty": 2.0, "unit_price": 10.0}]})
+    assert res.status_code == 200
+    assert res.json()["transactions"][0]["total_price"] == 20.0
+    assert res.json()["vault"]["TRY"] == 27620.0
+
+
+def test_idempotency_key_prevents_duplicate_vault_moves():
+    """Aynı Idempotency-Key ile tekrar gönderilen işlem/sepet kasayı ikinci kez hareket ettirmemeli"""
+    tx = {"side": "sell", "symbol": "GA", "qty": 1.0, "unit_price": 3000.0, "total_price": 3000.0, "payment_type": "Cash"}
+    first = client.post("/transactions", json=tx, headers={"Idempotency-Key": "k-1"}).json()
+    again = client.post("/transactions", json=tx, headers={"Idempotency-Key": "k-1"}).json()
+    assert again["id"] == first["id"]
+
+    basket = {"items": [tx, dict(tx, side="buy", symbol="USD", qty=10.0, unit_price=34.0, total_price=340.0)]}
+    b1 = client.post("/transactions/batch", json=basket, headers={"Idempotency-Key": "basket-1"}).json()
+    b2 = client.post("/transactions/batch", json=basket, headers={"Idempotency-Key": "basket-1"}).json()
+    assert [t["id"] for t in b2["transactions"]] == [t["id"] for t in b1["transactions"]]
+    assert b2["vault"] == b1["vault"] == {"TRY": 5660.0, "GA": -2.0, "USD": 10.0}
+    assert len(client.get("/transactions").json()) == 3
+
+
+def test_sqlite_production_profile(tmp_path):
+    """Dosya veritabanı WAL + ayarlı pragma'larla açılmalı; yazan endpoint'ler tek yazar kuyruğundan geçmeli"""
+    from sqlalchemy import text
+    from backend import database
+
+    eng = database.make_engine(f"sqlite:///{tmp_path / 'shop.db'}", tuned=True)
+    with eng.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+    eng.dispose()
+
+    # Kuyruk başka bir yazar tarafından tutulurken okuma beklemez
+    with database.write_lock():
+        assert client.get("/vault").status_code == 200
+    assert not database._write_lock.locked()
+    assert client.post("/vault/update?symbol=GA&amount=1").status_code == 200
+    assert not database._request_lock.locked()
+
+
+def test_async_endpoints_do_not_use_sync_session():
+    """async endpoint'ler event loop'u bloklayan senkron oturumu (get_db) kullanmamalı"""
+    import inspect
+
+    def calls(dependant):
+        for d in dependant.dependencies:
+            yield d.call
+            yield from calls(d)
+
+    async_routes = [r for r in app.routes if getattr(r, "dependant", None) is not None
+                    and inspect.iscoroutinefunction(r.endpoint)]
+    assert {"/reports/kasa", "/reports/daily", "/reports/pnl", "/prices/smart", "/ai/suggestions"} <= \
+        {r.path for r in async_routes}
+    for route in async_routes:
+        assert get_db not in set(calls(route.dependant)), route.path
+
+
+def test_vault_ledger_audit_and_time_travel():
+    """Her bakiye değişimi deftere yazılmalı; geçmiş bakiyeler snapshot + sonraki kayıtlarla okunmalı"""
+    from backend.services import ledger
+
+    cust = client.post("/customers", json={"full_name": "Defter Müşteri", "phone": "555-0021"}).json()
+    client.post("/vault/update?symbol=GA&amount=10")
+    sale = client.post("/transactions", json={"side": "sell", "symbol": "GA", "qty": 2.0, "unit_price": 3000.0,
+                                              "total_price": 6000.0, "payment_type": "Cash"}).json()
+    client.post("/transactions", json={"side": "sell", "symbol": "GA", "qty": 1.0, "unit_price": 3000.0,
+                                       "total_price": 3000.0, "payment_type": "Debt", "customer_id": cust["id"]})
+
+    entries = client.get("/ledger", params={"transaction_id": sale["id"]}).json()
+    assert sorted((e["symbol"], e["delta"]) for e in entries) == [("GA", -2.0), ("TRY", 6000.0)]
+
+    db = TestingSessionLocal()
+    try:
+        ledger.snapshot(db)
+        # Snapshot'tan sonra yazılan kayıt ve sonrasındaki an
+        mid = datetime.now()
+        client.post(f"/customers/{cust['id']}/payment", params={"amount": 1000.0, "p_type": "tahsilat"})
+
+        assert ledger.verify(db) == []
+        # İkinci snapshot sadece tahsilatın değiştirdiği hesapları yazar; geçmiş sorgusu ona kadar tarar
+        assert ledger.snapshot(db) == 2
+        past = ledger.group(ledger.balances_at(db, mid))
+        assert past["vault"] == {"GA": 7.0, "TRY": 6000.0}
+        assert past["customers"][str(cust["id"])] == {"TRY": 0.0, "GA": 1.0}
+        later = ledger.group(ledger.balances_at(db, datetime.now()))
+        assert later["vault"] == {"GA": 7.0, "TRY": 7000.0}
+        assert later["customers"][str(cust["id"])] == {"TRY": -1000.0, "GA": 1.0}
+    finally:
+        db.close()
+
+    now = client.get("/ledger/balances").json()
+    assert now["vault"]["TRY"] == 7000.0
+    assert now["customers"][str(cust["id"])] == {"TRY": -1000.0, "GA": 1.0}
+
+    page = client.get("/ledger", params={"limit": 2})
+    assert len(page.json()) == 2 and page.headers["X-Next-Cursor"]
+
+
+def test_concurrent_sales_keep_exact_totals(tmp_path):
+    """Binlerce eşzamanlı satıştan sonra kasa, stok, cari ve pozisyon toplamları birebir tutmalı"""
+    # Varsayılan 1000 satış; uzun yük denemesi için STRESS_SALES=10000 gibi artırılabilir
+    n = int(os.getenv("STRESS_SALES", "1000"))
+    n_cash, n_debt, n_bracelet = n * 6 // 10, n * 2 // 10, n * 2 // 10
+    stock = n_bracelet * 3 // 4
+    WRITERS = 64
+    import queue, threading, time
+    from backend import database
+    from backend.services import ledger
+
+    # Thread'ler arası gerçek eşzamanlılık için bağlantı havuzlu, WAL'lı dosya veritabanı
+    file_engine = database.make_engine(f"sqlite:///{tmp_path / 'stress.db'}", tuned=True, pool_size=WRITERS)
+    Base.metadata.create_all(bind=file_engine)
+    FileSession = sessionmaker(autocommit=False, autoflush=False, bind=file_engine)
+
+    def file_db():
+        db = FileSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = file_db
+    try:
+        client.post("/customers", json={"full_name": "Yoğun Müşteri", "phone": "555-0022"})
+        client.post("/products", json={"name": "Bilezik", "category": "Bilezik", "weight": 10.0,
+                                       "purity": 0.916, "labor_cost": 100.0, "stock_qty": stock})
+        client.post("/vault/update?symbol=GA&amount=5000")
+
+        cash = {"side": "sell", "symbol": "GA", "qty": 1.0, "unit_price": 3000.0, "total_price": 3000.0, "payment_type": "Cash"}
+        debt = dict(cash, payment_type="Debt", customer_id=1)
+        bracelet = {"side": "sell", "symbol": "ÜRÜN", "qty": 1.0, "unit_price": 9000.0, "total_price": 9000.0,
+                    "payment_type": "Cash", "product_id": 1}
+        jobs = [cash] * n_cash + [debt] * n_debt + [bracelet] * n_bracelet  # bilezik denemeleri stoktan fazla
+
+        # Tek event loop üzerinden (context manager'lı istemci) tüm thread'ler aynı uygulamaya yüklenir.
+        # Eşzamanlı istek sayısı sunucunun thread havuzundan (40) fazla: yazar kuyruğu havuzu tüketmemeli
+        todo, codes = queue.SimpleQueue(), []
+        for body in jobs:
+            todo.put(body)
+
+        def writer(shared):
+            while True:
+                try:
+                    body = todo.get_nowait()
+                except queue.Empty:
+                    return
+                codes.append(shared.post("/transactions", json=body).status_code)
+
+        with TestClient(app) as shared:
+            threads = [threading.Thread(target=writer, args=(shared,), daemon=True) for _ in range(WRITERS)]
+            for t in threads:
+                t.start()
+            deadline = time.monotonic() + 120
+            for t in threads:
+                t.join(max(0.0, deadline - time.monotonic()))
+            assert not any(t.is_alive() for t in threads), f"{len(codes)}/{len(jobs)} istek bitti, kalanlar asılı"
+
+        sold = n_cash + n_debt + stock
+        assert codes.count(200) == sold and codes.count(409) == n_bracelet - stock
+        vault = {v["symbol"]: v["balance"] for v in client.get("/vault").json()}
+        assert vault == {"GA": 5000.0 - n_cash - n_debt, "TRY": n_cash * 3000.0 + stock * 9000.0}
+        assert client.get("/customers").json()[0]["balance_gold"] == float(n_debt)
+
+        db = FileSession()
+        try:
+            assert db.get(models.Product, 1).stock_qty == 0
+            assert db.query(models.Transaction).count() == sold
+            assert db.query(models.InventoryAggregate).one().qty == 0
+            # Açık pozisyon olmadan satılan altında pozisyon sıfırda kalır (fazla satış kırpılır)
+            assert db.query(models.Position).filter(models.Position.symbol == "GA").one().qty == 0.0
+            assert ledger.verify(db) == []
+        finally:
+            db.close()
+    finally:
+        app.dependency_overrides[get_db] = override_get_db
+        file_engine.dispose()
+
+
+def test_first_aggregate_row_race_reuses_winner(monkeypatch):
+    """İlk özet/kasa satırını başka terminal araya girip yazdıysa IntegrityError yerine o satır kullanılmalı"""
+    from sqlalchemy.orm import Query
+    from backend.services.atomic import get_or_create
+
+    db = TestingSessionLocal()
+    try:
+        db.add(models.Vault(symbol="USD", balance=5.0))
+        db.commit()
+        # Diğer terminalin satırı bu oturumun ilk okumasından sonra commit edilmiş gibi: ilk sorgu boş döner
+        real_first, calls = Query.first, []
+        monkeypatch.setattr(Query, "first", lambda q: None if not calls.append(1) and len(calls) == 1 else real_first(q))
+        row = get_or_create(db, models.Vault, {"symbol": "USD"}, balance=0.0)
+        assert row.balance == 5.0
+        assert db.query(models.Vault).count() == 1
+    finally:
+        db.rollback()
+        db.close()
+
+
+def test_position_version_check_rejects_stale_write():
+    """Ortalama maliyet pozisyonu eski sürümden hesaplanıp yazılamamalı (iyimser kilit)"""
+    from sqlalchemy.orm.exc import StaleDataError
+
+    tx = {"side": "buy", "symbol": "GA", "qty": 1.0, "unit_price": 3000.0, "total_price": 3000.0, "payment_type": "Cash"}
+    client.post("/transactions", json=tx)
+    db = TestingSessionLocal()
+    try:
+        stale = db.query(models.Position).filter(models.Position.symbol == "GA").one()
+        seen = stale.version
+        # Başka bir terminal araya girer
+        client.post("/transactions", json=tx)
+        assert db.query(models.Position.version).filter(models.Position.symbol == "GA").scalar() == seen + 1
+        stale.qty += 1
+        with pytest.raises(StaleDataError):
+            db.commit()
+    finally:
+        db.rollback()
+        db.close()
+
+
+def test_group_commit_merges_concurrent_sales(tmp_path):
+    """Toplu commit modunda eşzamanlı satışlar ortak commit'lerle yazılmalı; hatalı istek grubu bozmamalı"""
+    from concurrent.futures import ThreadPoolExecutor
+    from backend import database
+
+    file_engine = database.make_engine(f"sqlite:///{tmp_path / 'group.db'}", tuned=True, pool_size=40)
+    # Sürücünün SQLite'a gerçekten gönderdiği ifadeler: commit sayısı committer'ın kendi sayacına değil buna bakar
+    statements = []
+    event.listen(file_engine, "connect", lambda dbapi_conn, rec: dbapi_conn.set_trace_callback(statements.append))
+    Base.metadata.create_all(bind=file_engine)
+    FileSession = sessionmaker(autocommit=False, autoflush=False, bind=file_engine)
+
+    def file_db():
+        db = FileSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = file_db
+    committer = backend.main.start_group_commit(FileSession)
+    committer.window = 0.02
+    try:
+        client.post("/products", json={"name": "Ziynet", "category": "Ziynet", "weight": 1.75,
+                                       "purity": 0.916, "labor_cost": 50.0, "stock_qty": 10})
+        sale = {"side": "sell", "symbol": "CEYREK", "qty": 1.0, "unit_price": 5000.0, "total_price": 5000.0,
+                "payment_type": "Cash"}
+        product = {"side": "sell", "symbol": "ÜRÜN", "qty": 1.0, "unit_price": 6000.0, "total_price": 6000.0,
+                   "payment_type": "Cash", "product_id": 1}
+        jobs = [sale] * 300 + [product] * 12  # 2 ürün satışı stok yetmediği için reddedilir
+
+        statements.clear()
+        with TestClient(app) as shared, ThreadPoolExecutor(max_workers=32) as pool:
+            codes = list(pool.map(lambda body: shared.post("/transactions", json=body).status_code, jobs))
+        sent = [s.split()[0].upper() for s in statements if s.strip()]
+
+        assert codes.count(200) == 310 and codes.count(409) == 2
+        vault = {v["symbol"]: v["balance"] for v in client.get("/vault").json()}
+        assert vault == {"CEYREK": -300.0, "TRY": 300 * 5000.0 + 10 * 6000.0}
+        # İstekler gruplanarak yazıldı: commit sayısı istek sayısından belirgin şekilde az
+        assert committer.requests == 312 and committer.commits < 312 // 2
+        # Savepoint'ler dış transaction içinde: her RELEASE ayrı commit değil, grup başına tek COMMIT
+        assert sent.count("COMMIT") == committer.commits
+        assert sent.count("BEGIN") >= committer.commits and sent.count("RELEASE") == 310
+    finally:
+        backend.main.stop_group_commit()
+        app.dependency_overrides[get_db] = override_get_db
+        file_engine.dispose()
+
+
+def test_bulk_import_products_customers_and_history(monkeypatch):
+    """Eski programdan aktarım: hatalı satırlar raporlanmalı, bakiyeler/defter/özetler tutarlı olmalı"""
+    import gzip, json
+    from backend.services import importer, ledger
+
+    monkeypatch.setattr(backend.main, "LICENSE_TIER", "PREMIUM")
+    # Aktarım endpoint'i kendi oturumunu açar
+    monkeypatch.setattr(backend.main, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(importer, "CHUNK_ROWS", 2)
+    customers = "id,full_name,phone,email\n7,Eski Müşteri,555-7,\n8,Diğer Müşteri,555-8,a@b.c\n,Telefonsuz,,\n"
+    res = client.post("/import/customers", content=customers.encode())
+    assert res.status_code == 200
+    assert (res.json()["inserted"], res.json()["rejected"]) == (2, 1)
+    products = "id,name,category,weight,purity,labor_cost,stock_qty\n3,Burma Bilezik,Bilezik,10,0.916,200,4\n"
+    assert client.post("/import/products", content=products.encode()).json()["rebuilt"] == ["inventory_aggregates"]
+
+    # Tekil kolon çakışmaları (telefon, id) dosya içinde de veritabanıyla da satır olarak reddedilir
+    dupes = "id,full_name,phone\n9,Aynı Telefon,555-7\n8,Aynı Id,555-9\n10,Yeni,555-10\n11,Tekrar,555-10\n10,Tekrar Id,555-11\n"
+    report = client.post("/import/customers", content=dupes.encode()).json()
+    assert (report["inserted"], report["rejected"]) == (1, 4)
+    assert [(e["line"], e["error"]) for e in report["errors"]] == [
+        (2, "phone 555-7 zaten kayıtlı"), (3, "id 8 zaten kayıtlı"),
+        (5, "phone 555-10 dosyada tekrar ediyor"), (6, "id 10 dosyada tekrar ediyor")]
+    # Doğrulamanın kaçırdığı çakışma 500 değil 409 döner ve aktarımın hiçbir satırı yazılmaz
+    with monkeypatch.context() as m:
+        m.setattr(importer._Import, "_clash", lambda self, values, taken: None)
+        res = client.post("/import/customers", content="full_name,phone\nYeni Biri,555-12\nÇakışan,555-7\n".encode())
+    assert res.status_code == 409
+    assert len(client.get("/customers").json()) == 3
+
+    # Aktarımdan önce alınmış bir snapshot: geriye tarihli kayıtlar onun geçmiş sorgularını bozmamalı
+    client.post("/vault/update?symbol=EUR&amount=5")
+    db = TestingSessionLocal()
+    try:
+        assert ledger.snapshot(db) == 1
+    finally:
+        db.close()
+
+    old = datetime(2025, 1, 10, 12, 0)
+    rows = [
+        {"ts": old.isoformat(), "side": "sell", "symbol": "GA", "qty": 2.0, "unit_price": 3000.0, "payment_type": "Cash"},
+        {"ts": old.isoformat(), "side": "sell", "symbol": "GA", "qty": 1.0, "unit_price": 3000.0,
+         "total_price": 3000.0, "payment_type": "Debt", "customer_id": 7},
+        {"ts": (old + timedelta(days=30)).isoformat(), "side": "buy", "symbol": "USD", "qty": 100.0,
+         "unit_price": 34.0, "total_price": 3400.0, "payment_type": "Cash"},
+        {"ts": old.isoformat(), "side": "sell", "symbol": "GA", "qty": 1.0, "unit_price": 3000.0, "customer_id": 99,
+         "payment_type": "Debt"},
+        {"side": "sell", "symbol": "GA", "qty": 1.0, "unit_price": 3000.0},
+    ]
+    body = "\n".join(json.dumps(r) for r in rows) + "\n{bozuk\n"
+    res = client.post("/import/transactions", params={"format": "ndjson"}, content=gzip.compress(body.encode()))
+    report = res.json()
+    assert (report["inserted"], report["rejected"]) == (3, 3)
+    assert [e["line"] for e in report["errors"]] == [4, 5, 6]
+    assert "customer_id 99" in report["errors"][0]["error"]
+
+    vault = {v["symbol"]: v["balance"] for v in client.get("/vault").json()}
+    assert vault == {"TRY": 2600.0, "GA": -3.0, "USD": 100.0, "EUR": 5.0}
+    balances = {c["id"]: c["balance_gold"] for c in client.get("/customers").json()}
+    assert balances == {7: 1.0, 8: 0.0, 10: 0.0}
+    db = TestingSessionLocal()
+    try:
+        assert ledger.verify(db) == []
+        # Aktarılan kayıtlar kendi tarihlerinde: USD alımından önceki an
+        past = ledger.group(ledger.balances_at(db, old + timedelta(days=1)))
+        assert past["vault"] == {"GA": -3.0, "TRY": 6000.0}
+        assert db.query(models.DailyRollup).count() == 3
+        assert {t.ts for t in db.query(models.Transaction)} == {old, old + timedelta(days=30)}
+    finally:
+        db.close()
+
+    assert client.post("/import/users", content=b"").status_code == 404
+    assert client.post("/import/products", params={"format": "xlsx"}, content=b"").status_code == 400
+    monkeypatch.setattr(backend.main, "LICENSE_TIER", "NORMAL")
+    assert client.post("/import/products", content=products.encode()).status_code == 402
+
+
+def test_customer_search_is_turkish_aware_prefix_match():
+    """Müşteri araması ad/telefon kelime başlarıyla eşleşmeli; Türkçe harf ve büyük/küçük farkı gözetilmemeli"""
+    from backend.services import search
+
+    for name, phone in [("Işıl Çağlar", "0532 111 22 33"), ("İsmail Şahin", "05449998877"),
+                        ("Ayşe Işık", "0555 000 11 22"), ("Ali Veli", "0212 444 55 66")]:
+        client.post("/customers", json={"full_name": name, "phone": phone})
+
+    def names(q, **params):
+        res = client.get("/customers/search", params={"q": q, **params})
+        assert res.status_code == 200
+        return [c["full_name"] for c in res.json()]
+
+    assert names("ışı") == names("ISI") == names("isi") == ["Ayşe Işık", "Işıl Çağlar"]
+    assert names("İSMA") == names("ismâ") == ["İsmail Şahin"]
+    assert names("cag isi") == ["Işıl Çağlar"]
+    # Telefon başındaki 0 olsa da olmasa da bulunur; kelime ortası eşleşmez
+    assert names("0544") == names("544 99") == ["İsmail Şahin"]
+    assert names("li") == [] and names('"a" *') == ["Ali Veli", "Ayşe Işık"]
+    assert len(names("", limit=2)) == 2
+    assert client.get("/customers/search", params={"limit": 500}).status_code == 422
+
+    # Ad değişince indeks güncellenir
+    db = TestingSessionLocal()
+    try:
+        cust = db.query(models.Customer).filter(models.Customer.full_name == "Ali Veli").one()
+        cust.full_name = "Ali Öztürk"
+        db.commit()
+        assert [c["full_name"] for c in search.customers(db, "ozt")] == ["Ali Öztürk"]
+        assert search.customers(db, "veli") == []
+    finally:
+        db.close()
@@ -0,0 +1,252 @@
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+os.environ["TESTING"] = "1"
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from backend.services import prices
+from backend.services.poller import PricePoller
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    prices.reset_cache()
+    yield
+    prices.reset_cache()
+
+
+def test_poller_publishes_snapshot_and_serves_without_io():
+    """Poller çalışırken istekler ağa çıkmadan yayınlanan snapshot'ı okumalı"""
+    calls = []
+
+    async def fake_download():
+        calls.append(1)
+        return {"USD": {"buy": 41.0, "sell": 41.5}}
+
+    async def scenario():
+        poller = PricePoller(interval=3600, jitter=0)
+        poller.start()
+        await asyncio.sleep(0.05)
+        snaps = [await prices.get_price_snapshot(max_age=0) for _ in range(5)]
+        poller.shutdown()
+        return snaps
+
+    with patch("backend.services.prices._download_prices", side_effect=fake_download):
+        snaps = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert snaps[0].prices["USD"]["buy"] == 41.0
+    assert all(s is snaps[0] for s in snaps)
+    with pytest.raises(TypeError):
+        snaps[0].prices["USD"]["buy"] = 0
+
+
+def test_poller_backoff_on_failure():
+    """Art arda hatalarda bir sonraki deneme üstel olarak ertelenmeli"""
+    async def scenario():
+        poller = PricePoller(interval=3600, jitter=0, backoff=2, max_backoff=5)
+        poller.start()
+        await asyncio.sleep(0.05)
+        first = poller.failures, poller.next_delay()
+        await poller.tick()
+        await poller.tick()
+        second = poller.failures, poller.next_delay()
+        poller.shutdown()
+        return first, second
+
+    with patch("backend.services.prices._download_prices", side_effect=Exception("TCMB down")):
+        first, second = asyncio.run(scenario())
+
+    assert first == (1, 2)
+    assert second == (3, 5)
+
+
+def test_breaker_serves_last_good_during_outage(monkeypatch):
+    """TCMB kesintisinde son iyi fiyatlar bayat işaretiyle ve beklemeden sunulmalı"""
+    monkeypatch.setattr(prices.breaker, "failure_threshold", 2)
+    calls = []
+
+    async def good():
+        return {"USD": {"buy": 42.0, "sell": 42.5}}
+
+    async def down():
+        calls.append(1)
+        raise Exception("TCMB down")
+
+    with patch("backend.services.prices._download_prices", side_effect=good):
+        live = asyncio.run(prices.get_price_snapshot())
+    assert live.source == "live" and not live.stale
+
+    with patch("backend.services.prices._download_prices", side_effect=down):
+        snaps = [asyncio.run(prices.get_price_snapshot(max_age=0)) for _ in range(5)]
+
+    # Eşik aşıldıktan sonra devre açılır, TCMB'ye artık istek gitmez
+    assert len(calls) == 2
+    assert prices.breaker.state == prices.breaker.OPEN
+    assert all(s.stale and s.source == "last_good" for s in snaps)
+    assert snaps[-1].prices["USD"]["buy"] == 42.0
+
+
+def test_breaker_half_open_probe_closes_on_success():
+    breaker = prices.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    # Bekleme süresi dolunca tek bir deneme çağrısına izin verilir
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED
+
+
+def test_last_good_persisted_in_configs():
+    """Son iyi fiyatlar configs tablosuna yazılmalı ve yeniden başlatmada yüklenmeli"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from backend.database import Base
+    from backend import models
+
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    prices.configure_store(Session)
+
+    async def good():
+        return {"GA": {"buy": 3100.0, "sell": 3120.0}}
+
+    with patch("backend.services.prices._download_prices", side_effect=good):
+        asyncio.run(prices.get_price_snapshot())
+    prices.flush_store(5)
+
+    db = Session()
+    assert db.query(models.Config).filter(models.Config.key == prices.LAST_GOOD_KEY).count() == 1
+    db.close()
+
+    # Süreç yeniden başlamış gibi: bellek boş, TCMB kapalı
+    prices.reset_cache()
+    prices.configure_store(Session)
+    with patch("backend.services.prices._download_prices", side_effect=Exception("TCMB down")):
+        snap = asyncio.run(prices.get_price_snapshot())
+    assert snap.stale and snap.source == "last_good"
+    assert snap.prices["GA"]["buy"] == 3100.0
+
+
+def test_refresh_does_not_wait_for_db_writers():
+    """Fiyat yenileme son iyi kopyayı yazmayı beklememeli; değişmeyen (304) içerik tekrar yazılmamalı"""
+    import threading
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from backend import database
+
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    prices.configure_store(sessionmaker(bind=engine))
+    saved = []
+    responses = iter([{"USD": {"buy": 41.0, "sell": 41.5}}, None])
+
+    async def download():
+        return next(responses)
+
+    with patch("backend.services.prices._download_prices", side_effect=download), \
+         patch("backend.services.prices._write_last_good", side_effect=lambda db, snap: saved.append(snap)):
+        # Uzun süren bir DB yazarı kuyruğu tutarken bile okuyucular yeni fiyatı hemen alır
+        with database.write_lock():
+            done = threading.Event()
+            threading.Thread(target=lambda: (asyncio.run(prices.get_price_snapshot(max_age=0)), done.set()),
+                             daemon=True).start()
+            assert done.wait(5)
+            assert saved == []
+        snap = asyncio.run(prices.get_price_snapshot(max_age=0))  # 304
+        prices.flush_store(5)
+    assert snap.prices["USD"]["buy"] == 41.0
+    assert len(saved) == 1
+
+
+TCMB_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Tarih_Date><Currency CurrencyCode="USD"><ForexBuying>34.10</ForexBuying><ForexSelling>34.20</ForexSelling></Currency>
+<Currency CurrencyCode="EUR"><ForexBuying>37.10</ForexBuying><ForexSelling>37.20</ForexSelling></Currency></Tarih_Date>"""
+
+
+def test_pooled_client_conditional_get():
+    """Havuzlu istemci ETag göndermeli, 304 gelince XML ayrıştırılmamalı"""
+    import httpx
+
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=TCMB_XML, headers={"ETag": '"v1"'})
+
+    async def scenario():
+        await prices.open_client()
+        prices._client._transport = httpx.MockTransport(handler)
+        first = await prices.get_price_snapshot()
+        second = await prices.get_price_snapshot(max_age=0)
+        await prices.close_client()
+        return first, second
+
+    with patch("backend.services.prices._parse_prices", wraps=prices._parse_prices) as parse:
+        first, second = asyncio.run(scenario())
+
+    assert seen == [None, '"v1"']
+    assert parse.call_count == 1
+    assert second.prices["USD"]["buy"] == first.prices["USD"]["buy"] == 34.10
+    assert not second.stale
+
+    statuses = [m["status"] for m in prices.fetch_metrics]
+    assert statuses == [200, 304]
+    assert prices.fetch_metrics[0]["parse_ms"] is not None
+    assert prices.fetch_metrics[1]["parse_ms"] is None
+
+
+def test_pricing_table_matches_legacy_formulas():
+    """Tablo tabanlı fiyatlama eski elle yazılmış formüllerle aynı sonucu vermeli"""
+    from backend.services import pricing
+
+    out = pricing.derive({"USD": {"buy": 34.0, "sell": 34.5}})
+    gram = (2750.0 * 34.5) / 31.1034768
+    assert out["GA"] == {"buy": round(gram * 0.995, 2), "sell": round(gram * 1.005, 2)}
+    assert out["C14"]["sell"] == round(gram * 0.585 * 1.05, 2)
+    assert out["TAM"]["buy"] == round(gram * 1.6065 * 4 * 0.98, 2)
+    assert out["ATA"]["sell"] == round(gram * 6.61 * 1.02, 2)
+    assert out["USD"] == {"buy": 34.0, "sell": 34.5}
+
+
+def test_event_bus_delivers_snapshot_and_thread_events():
+    """Fiyat değişimi ve thread'den yapılan kasa yayını abonenin kuyruğuna SSE olarak düşmeli"""
+    from backend.services.events import EventBus, format_sse
+
+    bus = EventBus(queue_size=2)
+
+    async def scenario():
+        q = bus.subscribe()
+        prices.add_listener(lambda snap: bus.publish("prices", snap.as_dict()))
+        await prices.refresh_snapshot()
+        # Senkron endpoint'ler thread pool'dan yayın yapar
+        await asyncio.to_thread(bus.publish, "vault", {"symbol": "TRY"})
+        first = await asyncio.wait_for(q.get(), 1)
+        second = await asyncio.wait_for(q.get(), 1)
+        # Kuyruk dolunca en eski olay atılır
+        for i in range(3):
+            bus.publish("transaction", {"id": i})
+        rest = [q.get_nowait(), q.get_nowait()]
+        bus.unsubscribe(q)
+        return first, second, rest
+
+    async def fake_download():
+        return {"USD": {"buy": 41.0, "sell": 41.5}}
+
+    with patch("backend.services.prices._download_prices", fake_download):
+        first, second, rest = asyncio.run(scenario())
+    assert first[0] == "prices" and first[1]["USD"]["sell"] == 41.5
+    assert second == ("vault", {"symbol": "TRY"})
+    assert [d["id"] for _, d in rest] == [1, 2]
+    assert bus.subscriber_count == 0
+    assert format_sse("vault", {"a": 1}) == 'event: vault\ndata: {"a": 1}\n\n'
@@ -1,10 +1,14 @@
+import json
 import pytest
 import tkinter as tk
 from unittest.mock import patch, MagicMock
 import customtkinter as ctk
 import sys
 import os
+import tempfile
 os.environ["TESTING"] = "1"
+# Terminalin işlem kuyruğu testlerde geçici dizine yazılsın
+os.environ["KUYUMCU_OUTBOX"] = os.path.join(tempfile.mkdtemp(), "outbox.db")
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
@@ -179,8 +183,18 @@ def test_checkout_peşin(app_instance, mock_messagebox, mock_requests_post):
     # Process checkout
     app_instance.finish_transaction()
     
-    # API should have been called twice (one for sell, one for buy)
-    assert mock_requests_post.call_count == 2
+    # Closing the sale never waits on the network: the basket is queued locally
+    assert mock_requests_post.call_count == 0
+    assert app_instance.outbox.pending() == 1
+
+    # Background drain sends the whole basket in one batch request with an idempotency key
+    assert app_instance.outbox.drain() == 1
+    assert mock_requests_post.call_count == 1
+    args, kwargs = mock_requests_post.call_args
+    assert args[0].endswith("/transactions/batch")
+    assert kwargs["headers"]["Idempotency-Key"]
+    assert [i["side"] for i in json.loads(kwargs["data"])["items"]] == ["buy", "sell"]
+    assert app_instance.outbox.pending() == 0
     
     # Baskets should be emptied
     assert len(app_instance.buy_basket) == 0
@@ -189,6 +203,34 @@ def test_checkout_peşin(app_instance, mock_messagebox, mock_requests_post):
     # Valuation should be reset
     assert app_instance.lbl_net.cget("text") == "HESAP BAŞABAŞ (0.00 TL)"
 
+def test_outbox_failed_baskets(app_instance, mock_messagebox, mock_requests_post, tmp_path):
+    """Rejected baskets are surfaced in the UI and can be retried or discarded."""
+    from frontend.core.outbox import Outbox
+    outbox = app_instance.outbox = Outbox(str(tmp_path / "outbox.db"))
+    first = outbox.enqueue([{"side": "sell", "total_price": 1000.0}])
+    second = outbox.enqueue([{"side": "buy", "total_price": 250.0}])
+
+    def reject(*args, **kwargs):
+        # Sending happens without the queue lock: the cashier can keep enqueueing meanwhile
+        assert not outbox._lock.locked()
+        outbox.enqueue([{"side": "sell", "total_price": 1.0}])
+        return MagicMock(status_code=422, text="invalid")
+    mock_requests_post.side_effect = reject
+
+    assert outbox.drain() == 0
+    assert outbox.failed_count() == 2
+    assert outbox.pending() == 2
+
+    app_instance.refresh_outbox_badge(warn=True)
+    assert mock_messagebox.showwarning.called
+    assert "(2)" in app_instance.btn_outbox.cget("text")
+
+    outbox.retry(first)
+    outbox.discard(second)
+    assert outbox.failed_count() == 0
+    assert outbox.pending() == 3
+    assert first not in [k for k, _, _ in outbox.failed()]
+
 def test_checkout_veresiye_error(app_instance, mock_messagebox):
     """Test processing a debt checkout without selecting a customer."""
     # We do not have a hard block on this in GUI but this tests the dropdown logic
@@ -386,6 +428,17 @@ def test_dashboard_sym_change_logic(app_instance, mock_requests_get):
     app_instance.on_sym_change("buy")
     assert app_instance.b_prc.get() == "2980"
 
+def test_dashboard_customer_typeahead(app_instance):
+    """Müşteri seçimi sunucudaki aramanın sonucuyla dolmalı; Enter ilk eşleşmeyi seçmeli."""
+    app_instance.dash_cust.set("ayş")
+    app_instance.show_cust_results("ayş", [{"id": 7, "full_name": "Ayşe Işık", "phone": "0555"}])
+    assert app_instance.dash_cust.cget("values") == ["Müşteri Yok (Perakende)", "Ayşe Işık - 0555"]
+    # Yazı değiştikten sonra gelen eski aramanın yanıtı listeyi ezmemeli
+    app_instance.show_cust_results("a", [])
+    assert app_instance.cust_results == ["Ayşe Işık - 0555"]
+    app_instance.pick_first_cust()
+    assert app_instance.cust_map[app_instance.dash_cust.get()] == 7
+
 def test_purity_selection_logic(app_instance, mock_requests_post):
     """Ürün kaydederken farklı ayar (saflık) seçimlerinin doğru eşleştiğini test eder."""
     app_instance.sn.insert(0, "14K Yüzük")